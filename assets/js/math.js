@@ -1,34 +1,127 @@
-// KaTeX auto-render initialization scoped to .md-content
+// KaTeX rendering scoped to .md-content.
+// Formulas the builder wrapped in <span class="math" data-h="..."> are typeset only as
+// they come near the viewport, from the page's .math.json sidecar, and the rendered
+// HTML is cached in IndexedDB by formula hash. Anything else uses auto-render.
+// Formulas converted to MathML at build time (--mathml) are left alone.
 (function(){
+  var DELIMITERS = [
+    {left: '$$', right: '$$', display: true},
+    {left: '$', right: '$', display: false},
+    {left: '\\(', right: '\\)', display: false},
+    {left: '\\[', right: '\\]', display: true}
+  ];
+  var MACROS = {
+    "\\R": "\\mathbb{R}",
+    "\\RR": "\\mathbb{R}",
+    "\\N": "\\mathbb{N}",
+    "\\NN": "\\mathbb{N}",
+    "\\Z": "\\mathbb{Z}",
+    "\\ZZ": "\\mathbb{Z}",
+    "\\Q": "\\mathbb{Q}",
+    "\\QQ": "\\mathbb{Q}",
+    "\\E": "\\mathbb{E}",
+    "\\Var": "\\mathrm{Var}",
+    "\\Cov": "\\mathrm{Cov}",
+    "\\Prob": "\\mathbb{P}",
+    "\\argmax": "\\mathop{\\mathrm{arg\\,max}}",
+    "\\argmin": "\\mathop{\\mathrm{arg\\,min}}",
+    "\\func": "\\operatorname{func}"
+  };
+  // Bump when MACROS change so cached output is not reused
+  var CACHE_REV = '1';
+  var DB_NAME = 'mathematical-economics-math', STORE = 'html';
+
+  function autoRender(el, skipSpans){
+    window.renderMathInElement(el, {
+      delimiters: DELIMITERS,
+      throwOnError: false,
+      ignoredClasses: skipSpans ? ['math'] : [],
+      ignoredTags: ['script', 'noscript', 'style', 'textarea', 'pre', 'code', 'option', 'math'],
+      macros: Object.assign({}, MACROS)
+    });
+  }
+
+  function openDb(){
+    return new Promise(function(resolve){
+      try {
+        var req = window.indexedDB.open(DB_NAME, 1);
+        req.onupgradeneeded = function(){ req.result.createObjectStore(STORE); };
+        req.onsuccess = function(){ resolve(req.result); };
+        req.onerror = function(){ resolve(null); };
+      } catch (e) { resolve(null); }
+    });
+  }
+
+  function readCached(db, keys){
+    // One read transaction for every formula on the page
+    return new Promise(function(resolve){
+      var out = {};
+      if (!db || !keys.length) return resolve(out);
+      try {
+        var tx = db.transaction(STORE, 'readonly'), store = tx.objectStore(STORE);
+        keys.forEach(function(key){
+          var req = store.get(key);
+          req.onsuccess = function(){ if (typeof req.result === 'string') out[key] = req.result; };
+        });
+        tx.oncomplete = tx.onerror = tx.onabort = function(){ resolve(out); };
+      } catch (e) { resolve(out); }
+    });
+  }
+
+  function writeCached(db, entries){
+    if (!db || !entries.length) return;
+    try {
+      var store = db.transaction(STORE, 'readwrite').objectStore(STORE);
+      entries.forEach(function(e){ store.put(e[1], e[0]); });
+    } catch (e) {}
+  }
+
+  function lazy(spans){
+    var url = location.pathname.replace(/\.html$/, '.math.json');
+    return fetch(url).then(function(res){
+      if (!res.ok) throw new Error('no math sidecar');
+      return res.json();
+    }).then(function(sidecar){
+      var formulas = sidecar.formulas || {};
+      var prefix = window.katex.version + ':' + CACHE_REV + ':';
+      return openDb().then(function(db){
+        var keys = Object.keys(formulas).map(function(h){ return prefix + h; });
+        return readCached(db, keys).then(function(cached){
+          var pending = [], timer = null;
+          function typeset(span){
+            var h = span.getAttribute('data-h'), key = prefix + h, f = formulas[h];
+            if (cached[key] === undefined) {
+              // Sidecar out of date with the page: render the delimited source in place
+              if (!f) return autoRender(span, false);
+              cached[key] = window.katex.renderToString(f[0], {
+                displayMode: f[1], throwOnError: false, macros: Object.assign({}, MACROS)
+              });
+              pending.push([key, cached[key]]);
+              if (!timer) timer = setTimeout(function(){ timer = null; writeCached(db, pending.splice(0)); }, 300);
+            }
+            span.innerHTML = cached[key];
+          }
+          if (!('IntersectionObserver' in window)) return spans.forEach(typeset);
+          var io = new IntersectionObserver(function(entries){
+            entries.forEach(function(e){
+              if (e.isIntersecting) { io.unobserve(e.target); typeset(e.target); }
+            });
+          }, {rootMargin: '600px 0px'});
+          spans.forEach(function(span){ io.observe(span); });
+        });
+      });
+    });
+  }
+
   function init(){
     if (!window.renderMathInElement) return;
-    document.querySelectorAll('.md-content').forEach(el => {
-      window.renderMathInElement(el, {
-        delimiters: [
-          {left: '$$', right: '$$', display: true},
-          {left: '$', right: '$', display: false},
-          {left: '\\(', right: '\\)', display: false},
-          {left: '\\[', right: '\\]', display: true}
-        ],
-        throwOnError: false,
-        macros: {
-          "\\R": "\\mathbb{R}",
-          "\\RR": "\\mathbb{R}",
-          "\\N": "\\mathbb{N}",
-          "\\NN": "\\mathbb{N}",
-          "\\Z": "\\mathbb{Z}",
-          "\\ZZ": "\\mathbb{Z}",
-          "\\Q": "\\mathbb{Q}",
-          "\\QQ": "\\mathbb{Q}",
-          "\\E": "\\mathbb{E}",
-          "\\Var": "\\mathrm{Var}",
-          "\\Cov": "\\mathrm{Cov}",
-          "\\Prob": "\\mathbb{P}",
-          "\\argmax": "\\mathop{\\mathrm{arg\\,max}}",
-          "\\argmin": "\\mathop{\\mathrm{arg\\,min}}",
-          "\\func": "\\operatorname{func}"
-        }
-      });
+    var spans = Array.prototype.slice.call(document.querySelectorAll('.md-content span.math[data-h]'));
+    // Math the builder did not tag (raw HTML lines, pages from older builds) is rendered eagerly
+    document.querySelectorAll('.md-content').forEach(function(el){ autoRender(el, spans.length > 0); });
+    if (!spans.length) return;
+    if (!window.katex || !window.fetch || !window.Promise) return spans.forEach(function(s){ autoRender(s, false); });
+    lazy(spans).catch(function(){
+      spans.forEach(function(s){ autoRender(s, false); });
     });
   }
   if (document.readyState === 'loading') {
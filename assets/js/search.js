@@ -0,0 +1,89 @@
+// Sidebar search over the sharded index in assets/search/ (written by tools/build_site.py).
+// Loaded by site-nav.js on first focus of #siteSearch. index.json (titles, paths and the
+// shard list) is fetched once; each query term then fetches only its prefix shard.
+(function(){
+  const input = document.getElementById('siteSearch');
+  const list = document.getElementById('searchResults');
+  const script = document.currentScript;
+  if (!input || !list || !script || !window.DecompressionStream) return;
+  const root = script.src.replace(/assets\/js\/search(?:\.[0-9a-f]{10})?\.js(?:\?.*)?$/, '');
+  const MAX_RESULTS = 12;
+  let meta = null;
+  const shards = {};
+
+  function fetchJson(url, gzipped){
+    return fetch(url).then(res => {
+      if (!res.ok) throw new Error(res.status + ' ' + url);
+      if (!gzipped) return res.json();
+      return new Response(res.body.pipeThrough(new DecompressionStream('gzip'))).json();
+    });
+  }
+
+  function loadShard(prefix){
+    if (!meta.shards.includes(prefix)) return Promise.resolve({});
+    if (!shards[prefix]) {
+      shards[prefix] = fetchJson(root + 'assets/search/' + prefix + '.json.gz', true).catch(() => ({}));
+    }
+    return shards[prefix];
+  }
+
+  function terms(q){
+    const stop = new Set(meta.stopwords);
+    return (q.toLowerCase().match(/[a-z0-9]+/g) || []).filter(w => w.length > 1 && !stop.has(w));
+  }
+
+  async function search(q){
+    if (!meta) meta = await fetchJson(root + 'assets/search/index.json');
+    const words = terms(q);
+    if (!words.length) return [];
+    let scores = null;
+    for (let i = 0; i < words.length; i++) {
+      const word = words[i];
+      // The last word is still being typed, so it matches as a prefix
+      const prefixMatch = i === words.length - 1;
+      const shard = await loadShard(word.slice(0, meta.prefix_len));
+      const hits = {};
+      for (const term in shard) {
+        if (term !== word && !(prefixMatch && term.startsWith(word))) continue;
+        const postings = shard[term];
+        for (let j = 0; j < postings.length; j += 2) {
+          hits[postings[j]] = (hits[postings[j]] || 0) + postings[j + 1];
+        }
+      }
+      if (scores === null) { scores = hits; continue; }
+      for (const doc in scores) {
+        if (doc in hits) scores[doc] += hits[doc]; else delete scores[doc];
+      }
+    }
+    return Object.keys(scores)
+      .sort((a, b) => scores[b] - scores[a] || a - b)
+      .slice(0, MAX_RESULTS)
+      .map(doc => meta.docs[doc]);
+  }
+
+  let seq = 0;
+  function update(){
+    const n = ++seq;
+    search(input.value).then(results => {
+      if (n !== seq) return;
+      list.textContent = '';
+      results.forEach(([title, path]) => {
+        const li = document.createElement('li');
+        const a = document.createElement('a');
+        a.href = root + path.replace(/^\//, '');
+        a.textContent = title;
+        li.appendChild(a);
+        list.appendChild(li);
+      });
+      list.hidden = !results.length;
+    }).catch(() => { list.hidden = true; });
+  }
+
+  input.addEventListener('input', update);
+  input.addEventListener('keydown', e => {
+    if (e.key !== 'Enter') return;
+    const first = list.querySelector('a');
+    if (first) location.href = first.href;
+  });
+  if (input.value) update();
+})();
@@ -1,9 +1,78 @@
 // Injects the shared sidebar and renders Prev/Next using the generated manifest.
 (function(){
   function getRoot() {
-    const script = document.currentScript || document.querySelector('script[src*="site-nav.js"]');
+    // The script may be served under a fingerprinted name (site-nav.<hash>.js)
+    const script = document.currentScript || document.querySelector('script[src*="/site-nav."]');
     const abs = new URL(script ? script.getAttribute('src') : 'assets/js/site-nav.js', document.baseURI);
-    return abs.href.replace(/assets\/js\/site-nav\.js(?:\?.*)?$/, '');
+    return abs.href.replace(/assets\/js\/site-nav(?:\.[0-9a-f]{10})?\.js(?:\?.*)?$/, '');
+  }
+
+  // Roots repo-absolute links under the site base and marks the active ones
+  function fixLinks(el){
+    const root = getRoot();
+    const basePath = new URL(root).pathname; // e.g., /mathematical-economics/
+    el.querySelectorAll('a[href^="/"]').forEach(a => {
+      const href = a.getAttribute('href');
+      if (href.startsWith(basePath)) return; // already rooted under repo base
+      a.setAttribute('href', root + href.replace(/^\//,''));
+    });
+    const currentPath = decodeURIComponent(location.pathname);
+    el.querySelectorAll('a[data-match]').forEach(a => {
+      const pat = a.getAttribute('data-match');
+      if (currentPath.endsWith(pat) || currentPath.includes(pat)) {
+        a.classList.add('active');
+      }
+    });
+    // Highlight the exact page link as active
+    el.querySelectorAll('a[href]').forEach(a => {
+      try {
+        const hrefPath = decodeURIComponent(new URL(a.getAttribute('href'), document.baseURI).pathname);
+        if (hrefPath === currentPath) a.classList.add('active');
+      } catch(e) {}
+    });
+  }
+
+  // One shard per section (assets/nav/<slug>.json): its sidebar HTML, its pages in order
+  // and the neighbouring pages across section boundaries. Fetched at most once per page.
+  const shards = {};
+  function loadShard(slug){
+    if (!(slug in shards)) {
+      shards[slug] = fetch(getRoot() + 'assets/nav/' + encodeURIComponent(slug) + '.json')
+        .then(res => res.ok ? res.json() : null)
+        .catch(() => null);
+    }
+    return shards[slug];
+  }
+
+  // The section the current page belongs to: /pages/<slug>/...
+  function currentSection(){
+    const rel = decodeURIComponent(location.pathname).slice(new URL(getRoot()).pathname.length);
+    const m = rel.match(/^pages\/([^/]+)\//);
+    return m ? m[1] : null;
+  }
+
+  async function expandSection(sec, open){
+    const btn = sec.querySelector(':scope > .nav-expand');
+    if (btn) btn.setAttribute('aria-expanded', String(open));
+    let body = sec.querySelector(':scope > .nav-shard');
+    if (open && !body) {
+      const shard = await loadShard(sec.dataset.section);
+      body = sec.querySelector(':scope > .nav-shard');
+      if (!shard || body) return;
+      body = document.createElement('div');
+      body.className = 'nav-shard';
+      body.innerHTML = shard.html;
+      fixLinks(body);
+      sec.appendChild(body);
+    }
+    if (body) body.hidden = !open;
+  }
+
+  function hookSections(container){
+    container.querySelectorAll('.nav-section').forEach(sec => {
+      const btn = sec.querySelector(':scope > .nav-expand');
+      if (btn) btn.addEventListener('click', () => expandSection(sec, btn.getAttribute('aria-expanded') !== 'true'));
+    });
   }
 
   async function injectSidebar(){
@@ -11,38 +80,34 @@
     if (!container) return;
     const root = getRoot();
     try {
-      const res = await fetch(root + 'assets/partials/sidebar.html?v=20250930');
+      // Only the skeleton (section headers) is shared; the current section's shard is added to it
+      const res = await fetch(root + 'assets/partials/sidebar.html');
       const html = await res.text();
       container.innerHTML = html;
-      const basePath = new URL(root).pathname; // e.g., /mathematical-economics/
-      container.querySelectorAll('a[href^="/"]').forEach(a => {
-        const href = a.getAttribute('href');
-        if (href.startsWith(basePath)) return; // already rooted under repo base
-        a.setAttribute('href', root + href.replace(/^\//,''));
-      });
-      const links = container.querySelectorAll('a[data-match]');
-      links.forEach(a => {
-        const pat = a.getAttribute('data-match');
-        const currentPath = decodeURIComponent(location.pathname);
-        if (currentPath.endsWith(pat) || currentPath.includes(pat)) {
-          a.classList.add('active');
-        }
-      });
-      // Highlight the exact page link as active
-      const cur = decodeURIComponent(location.pathname);
-      container.querySelectorAll('a[href]').forEach(a => {
-        try {
-          const hrefPath = decodeURIComponent(new URL(a.getAttribute('href'), document.baseURI).pathname);
-          if (hrefPath === cur) a.classList.add('active');
-        } catch(e) {}
-      });
+      fixLinks(container);
+      hookSections(container);
+      const slug = currentSection();
+      const sec = slug && Array.from(container.querySelectorAll('.nav-section')).find(s => s.dataset.section === slug);
+      if (sec) await expandSection(sec, true);
     } catch (e) {}
   }
 
+  // The search script and its index are only fetched once the box is focused
+  function hookSearch(){
+    const input = document.getElementById('siteSearch');
+    if (!input) return;
+    input.addEventListener('focus', function(){
+      if (document.querySelector('script[src*="assets/js/search.js"]')) return;
+      const s = document.createElement('script');
+      s.src = getRoot() + 'assets/js/search.js';
+      document.head.appendChild(s);
+    }, { once: true });
+  }
+
   async function loadManifest(){
     const root = getRoot();
     try {
-      const res = await fetch(root + 'assets/site.json?v=20250930');
+      const res = await fetch(root + 'assets/site.json');
       return await res.json();
     } catch (e) { return []; }
   }
@@ -52,13 +117,19 @@
     if (!el) return;
     const root = getRoot();
     const path = decodeURIComponent(location.pathname);
-    const manifest = await loadManifest();
-    const flat = [];
-    for (const sect of manifest) {
-      for (const p of sect.pages) {
-        flat.push(new URL(p.path.replace(/^\//,''), root).pathname);
+    // The section shard is enough for prev/next; sites without shards use the full manifest
+    const slug = currentSection();
+    const shard = slug ? await loadShard(slug) : null;
+    let paths;
+    if (shard) {
+      paths = [shard.prev, ...shard.pages, shard.next].filter(Boolean);
+    } else {
+      paths = [];
+      for (const sect of await loadManifest()) {
+        for (const p of sect.pages) paths.push(p.path);
       }
     }
+    const flat = paths.map(p => new URL(p.replace(/^\//,''), root).pathname);
     const idx = flat.indexOf(path);
     if (idx === -1) return;
     const prev = flat[idx-1];
@@ -74,9 +145,23 @@
     `;
   }
 
+  // Offline cache and next-page prefetch; sw.js is written by the builder
+  if ('serviceWorker' in navigator) {
+    window.addEventListener('load', function(){
+      navigator.serviceWorker.register(getRoot() + 'sw.js').catch(function(){});
+    });
+  }
+
   document.addEventListener('DOMContentLoaded', function(){
-    injectSidebar();
-    renderPrevNext();
+    // Pages built with --inline-nav already carry the sidebar and prev/next links
+    const sidebarEl = document.getElementById('sidebar');
+    if (!sidebarEl || !sidebarEl.children.length) {
+      injectSidebar().then(hookSearch);
+      renderPrevNext();
+    } else {
+      hookSections(sidebarEl);
+      hookSearch();
+    }
     // Toggle button
     const btn = document.getElementById('navToggle');
     const backdrop = document.getElementById('backdrop');
@@ -1,112 +1,67 @@
 #!/usr/bin/env python3
-import argparse, pathlib, re, html, json, shutil
+import argparse, collections, cProfile, os, pathlib, html, json
 from datetime import datetime, timezone
 
-def slugify(s: str) -> str:
-    s = s.strip().lower()
-    s = re.sub(r'[^a-z0-9]+', '-', s)
-    s = re.sub(r'-{2,}', '-', s).strip('-')
-    return s or 'index'
+from sitegen.ir import prune_irs, render_targets
+from sitegen.media import get_store
+from sitegen.publish import Stage, delta, snapshot, write_if_changed
+from sitegen.render import RenderConfig, note_title, slugify
+from sitegen.templates import load_template
+from sitegen.timing import PhaseTimer
 
-def split_num_label(name: str):
-    m = re.match(r'^(\d+(?:\.\d+)*)\s+(.+)$', name.strip())
-    if m:
-        return m.group(1), m.group(2)
-    return '', name.strip()
+TEMPLATES = pathlib.Path(__file__).resolve().parent / 'templates'
 
-def _is_abs_url(u: str) -> bool:
-    return bool(re.match(r'^(?:[a-z]+:)?//', u)) or u.startswith('data:') or u.startswith('/')
+# One output site: where it is hosted, where its pages and assets go and which page template it uses
+Target = collections.namedtuple('Target', 'asset_base out_dir assets_dir template')
 
-def inline_html(s: str, rel_dir: pathlib.Path, src_root: pathlib.Path, asset_base: str, media_root: pathlib.Path) -> str:
-    s = html.escape(s)
-    # Protect math spans from other substitutions
-    math_tokens = []
-    def protect(pattern, text):
-        def _rep(m):
-            math_tokens.append(m.group(0))
-            return f"@@MATH{len(math_tokens)-1}@@"
-        return re.sub(pattern, _rep, text, flags=re.S)
-    s = protect(r"\$\$(.+?)\$\$", s)
-    s = protect(r"\$(.+?)\$", s)
-    s = protect(r"\\\[(.+?)\\\]", s)
-    s = protect(r"\\\((.+?)\\\)", s)
-    def _img_sub(m):
-        alt = m.group(1); src = m.group(2)
-        if _is_abs_url(src):
-            new_src = src
-        else:
-            src_path = (src_root / rel_dir / src).resolve()
-            dest_path = (media_root / rel_dir / src).resolve()
-            dest_path.parent.mkdir(parents=True, exist_ok=True)
-            try:
-                if src_path.exists():
-                    dest_path.write_bytes(src_path.read_bytes())
-            except Exception:
-                pass
-            new_src = f"{asset_base}/assets/media/{rel_dir.as_posix()}/{src}"
-        return f'<img src="{new_src}" alt="{alt}">'
-    s = re.sub(r'!\[([^\]]*)\]\(([^\)]+)\)', _img_sub, s)
-    s = re.sub(r'\[([^\]]+)\]\(([^\)]+)\)', r'<a href="\2">\1</a>', s)
-    s = re.sub(r'`([^`]+)`', r'<code>\1</code>', s)
-    s = re.sub(r'\*\*([^*]+)\*\*', r'<strong>\1</strong>', s)
-    s = re.sub(r'(?<!\*)\*([^*]+)\*(?!\*)', r'<em>\1</em>', s)
-    # Restore math tokens
-    for i, tok in enumerate(math_tokens):
-        s = s.replace(f"@@MATH{i}@@", tok)
-    return s
-
-def md_to_html(md: str, rel_dir: pathlib.Path, src_root: pathlib.Path, asset_base: str, media_root: pathlib.Path) -> str:
-    lines = md.splitlines()
-    out, para = [], []
-    list_stack = []
-    bullet_re = re.compile(r'^([ \t]*)([-\*])\s+(.*)$')
-    def flush_para():
-        nonlocal para
-        if para:
-            out.append('<p>' + inline_html(' '.join(para).strip(), rel_dir, src_root, asset_base, media_root) + '</p>')
-            para = []
-    def set_list_depth(depth: int):
-        while len(list_stack) < depth:
-            out.append('<ul>'); list_stack.append('ul')
-        while len(list_stack) > depth:
-            out.append('</ul>'); list_stack.pop()
-    for raw in lines:
-        line = raw.rstrip('\n')
-        if line.lstrip().startswith('<'):
-            flush_para(); set_list_depth(0); out.append(line); continue
-        if not line.strip():
-            flush_para(); set_list_depth(0); continue
-        m = re.match(r'^(#{1,6})\s+(.*)$', line)
-        if m:
-            flush_para(); set_list_depth(0)
-            level = len(m.group(1)); text = inline_html(m.group(2), rel_dir, src_root, asset_base, media_root)
-            out.append(f'<h{level}>' + text + f'</h{level}>'); continue
-        if re.match(r'^-{3,}\s*$', line):
-            flush_para(); set_list_depth(0); out.append('<hr>'); continue
-        bm = bullet_re.match(line)
-        if bm:
-            flush_para()
-            indent = bm.group(1).replace('\t', '    ')
-            depth = min(6, len(indent)//2)
-            set_list_depth(depth+1)
-            out.append('<li>' + inline_html(bm.group(3), rel_dir, src_root, asset_base, media_root) + '</li>'); continue
-        para.append(line)
-    flush_para(); set_list_depth(0)
-    return '\n'.join(out)
-
-def render_page(template_path: pathlib.Path, asset_base: str, title: str, content_html: str) -> str:
-    tpl = template_path.read_text(encoding='utf-8')
-    return tpl.replace('{{asset_base}}', asset_base).replace('{{title}}', title).replace('{{content}}', content_html)
+def write_nav(manifest, target: Target) -> None:
+    # Manifest + sidebar + index for one target
+    asset_base, assets_dir = target.asset_base, target.assets_dir
+    write_if_changed(assets_dir / 'site.json', json.dumps(manifest, indent=2).encode('utf-8'))
+    sidebar = ['<div class="card">', '  <nav>', f'    <a href="{asset_base}/index.html" data-match="/index.html">Home</a>', '    <hr style="border:none;border-top:1px solid var(--border);margin:8px 0;">', '    <strong style="display:block;padding:4px 10px;color:var(--muted)">Sections</strong>']
+    for sect in manifest:
+      first = sect['pages'][0]['path'] if sect['pages'] else f"/pages/{sect['slug']}/"
+      sidebar.append(f'    <a href="{asset_base}{first}" data-match="/pages/{sect["slug"]}/">{html.escape(sect["label"])}</a>')
+      if sect['pages']:
+        sidebar.append('    <ul style="margin:6px 0 10px 16px; padding:0; list-style: none;">')
+        for p in sect['pages']:
+          sidebar.append(f'      <li><a href="{asset_base}{p["path"]}">{html.escape(p["title"])}</a></li>')
+        sidebar.append('    </ul>')
+    sidebar += ['  </nav>', '</div>']
+    write_if_changed(assets_dir / 'partials' / 'sidebar.html', '\n'.join(sidebar).encode('utf-8'))
 
-def build(book: pathlib.Path, out_dir: pathlib.Path, assets_dir: pathlib.Path, template_path: pathlib.Path, asset_base: str):
+    card = load_template(TEMPLATES / 'partials' / 'card.html')
+    cards = []
+    for sect in manifest:
+        link = f'{asset_base}{sect["pages"][0]["path"]}' if sect['pages'] else f'{asset_base}/index.html'
+        cards.append(card.render(title=html.escape(sect['label']), link=link))
+    index_html = load_template(TEMPLATES / 'index.html').render(
+        title='Mathematical Economics',
+        tagline='Sections generated from the book.',
+        cards='\n'.join(cards),
+        asset_base=asset_base)
+    write_if_changed(assets_dir.parent / 'index.html', index_html.encode('utf-8'))
+
+def build(book: pathlib.Path, out_dir: pathlib.Path, assets_dir: pathlib.Path, template_path: pathlib.Path, asset_base: str, jobs: int = 1,
+          targets=(), ir_dir: pathlib.Path = None):
+    # targets: further Target sites rendered from the same parse as the first
     if not book.exists():
         raise SystemExit(f'Book directory not found: {book}')
-    if out_dir.exists():
-        shutil.rmtree(out_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
-    media_root = assets_dir / 'media'
-    partials_dir = assets_dir / 'partials'
-    partials_dir.mkdir(parents=True, exist_ok=True)
+    timer = PhaseTimer()
+    targets = [Target(asset_base, out_dir, assets_dir, template_path), *targets]
+    ir_dir = ir_dir or assets_dir.parent / '.build-ir'
+    sites = []
+    for target in targets:
+        # Delta paths are relative to the common parent of the pages and the landing page
+        base = pathlib.Path(os.path.commonpath([target.out_dir, target.assets_dir.parent]))
+        outputs = [target.out_dir, target.assets_dir, target.assets_dir.parent / 'index.html']
+        records = {(target.assets_dir / name).relative_to(base).as_posix() for name in ('build-info.json', 'build-delta.json')}
+        before = snapshot(base, outputs, records)
+        # Pages are rendered into an empty staging tree and swapped in once complete; files whose
+        # bytes did not change keep their mtime
+        stage = Stage(target.out_dir, fresh=True)
+        (target.assets_dir / 'partials').mkdir(parents=True, exist_ok=True)
+        sites.append((target, base, outputs, records, before, stage))
 
     sections = {}
     for md_path in book.rglob('*.md'):
@@ -116,6 +71,7 @@ def build(book: pathlib.Path, out_dir: pathlib.Path, assets_dir: pathlib.Path, t
         sections[k] = sorted(sections[k])
 
     manifest = []
+    render_jobs, page_paths = [], {}
     for sect_label, files in sections.items():
         sect_slug = slugify(sect_label)
         entry = { 'label': sect_label, 'slug': sect_slug, 'pages': [] }
@@ -123,101 +79,76 @@ def build(book: pathlib.Path, out_dir: pathlib.Path, assets_dir: pathlib.Path, t
             rel = md_path.relative_to(book)
             out_dirs = [slugify(p) for p in rel.parts[:-1]]
             name_slug = slugify(md_path.stem)
-            out_html = out_dir.joinpath(*(out_dirs + [name_slug + '.html']))
-            out_html.parent.mkdir(parents=True, exist_ok=True)
-            md = md_path.read_text(encoding='utf-8')
-            num, label = split_num_label(md_path.stem)
-            title = (num + ' ' if num else '') + label
-            md_lines = md.splitlines()
-            if md_lines and re.match(r'^#\s+.+', md_lines[0]):
-                first = re.sub(r'^#\s+', '', md_lines[0]).strip()
-                if first.lower() == title.lower() or first.lower() == label.lower():
-                    md_lines = md_lines[1:]
-                md = '\n'.join(md_lines)
-            rel_dir = rel.parent
-            content = md_to_html(md, rel_dir, book, asset_base, media_root)
-            html_page = render_page(template_path, asset_base, title, content)
-            out_html.write_text(html_page, encoding='utf-8')
+            outs = tuple(stage.root.joinpath(*(out_dirs + [name_slug + '.html'])) for _, _, _, _, _, stage in sites)
+            for out_html in outs:
+                out_html.parent.mkdir(parents=True, exist_ok=True)
+            title, label = note_title(md_path.stem)
+            render_jobs.append((md_path, outs, title, label, {}))
             url_path = f"/pages/{'/'.join(out_dirs + [name_slug + '.html'])}"
+            page_paths[md_path] = url_path
             entry['pages'].append({ 'title': title, 'path': url_path })
-            print(f'Rendered {md_path} -> {out_html}')
         manifest.append(entry)
 
-    # Write manifest + sidebar + index
-    (assets_dir / 'site.json').write_text(json.dumps(manifest, indent=2), encoding='utf-8')
-    # Build info for traceability
-    build_info = {
-        'builder': 'build-pages',
-        'version': 'v0.1.0',
-        'built_at': datetime.now(timezone.utc).isoformat(),
-        'source': str(book),
-        'output': str(out_dir),
-        'asset_base': asset_base,
-        'counts': {
-            'sections': len(manifest),
-            'pages': sum(len(s['pages']) for s in manifest),
-        },
-    }
-    (assets_dir / 'build-info.json').write_text(json.dumps(build_info, indent=2), encoding='utf-8')
-    sidebar = ['<div class="card">', '  <nav>', f'    <a href="{asset_base}/index.html" data-match="/index.html">Home</a>', '    <hr style="border:none;border-top:1px solid var(--border);margin:8px 0;">', '    <strong style="display:block;padding:4px 10px;color:var(--muted)">Sections</strong>']
-    for sect in manifest:
-      first = sect['pages'][0]['path'] if sect['pages'] else f"/pages/{sect['slug']}/"
-      sidebar.append(f'    <a href="{asset_base}{first}" data-match="/pages/{sect["slug"]}/">{html.escape(sect["label"])}</a>')
-      if sect['pages']:
-        sidebar.append('    <ul style="margin:6px 0 10px 16px; padding:0; list-style: none;">')
-        for p in sect['pages']:
-          sidebar.append(f'      <li><a href="{asset_base}{p["path"]}">{html.escape(p["title"])}</a></li>')
-        sidebar.append('    </ul>')
-    sidebar += ['  </nav>', '</div>']
-    (partials_dir / 'sidebar.html').write_text('\n'.join(sidebar), encoding='utf-8')
-
-    cards = []
-    for sect in manifest:
-        link = f'{asset_base}{sect["pages"][0]["path"]}' if sect['pages'] else f'{asset_base}/index.html'
-        title = html.escape(sect['label'])
-        cards.append(f'''    <div class="card">
-      <h3>{title}</h3>
-      <div class="buttons">
-        <a href="{link}" class="button">Open Section</a>
-      </div>
-    </div>''')
-    index_html = f'''<!DOCTYPE html>
-<html lang="en">
-<head>
-  <script>
-    (function(){{
-      try {{ var m = localStorage.getItem('theme'); if (m === 'light' || m === 'dark') document.documentElement.setAttribute('data-theme', m); }} catch (e) {{}}
-    }})();
-  </script>
-  <meta charset="UTF-8" />
-  <meta name="viewport" content="width=device-width, initial-scale=1.0" />
-  <title>Mathematical Economics</title>
-  <link rel="stylesheet" href="{asset_base}/assets/css/style.css" />
-  <script defer src="{asset_base}/assets/js/site-nav.js"></script>
-</head>
-<body>
-  <button id="navToggle" class="hamburger" aria-label="Toggle navigation" aria-expanded="false">≡</button>
-  <button id="themeToggle" class="theme-toggle" aria-label="Toggle theme" title="Toggle light/dark">◎</button>
-  <div class="font-slider" aria-label="Font size">
-    <input id="fontSize" type="range" min="90" max="220" step="5" />
-  </div>
-  <div id="backdrop" class="backdrop" hidden></div>
-  <div class="layout">
-    <aside id="sidebar" class="sidebar"></aside>
-    <main class="content">
-  <div class="container">
-    <h1>Mathematical Economics</h1>
-    <p class="tagline">Sections generated from the book.</p>
-
-{chr(10).join(cards)}
-
-  </div>
-    </main>
-  </div>
-</body>
-</html>
-'''
-    (assets_dir.parent / 'index.html').write_text(index_html, encoding='utf-8')
+    timer.lap('scan')
+
+    # Parse each note once (or reuse its cached IR) and write it for every target; report
+    # failures per file
+    failures, live_media, live_irs, note_times = [], set(), set(), []
+    reused = 0
+    configs = [RenderConfig(src_root=book, template=t.template, asset_base=t.asset_base, media_root=t.assets_dir / 'media') for t in targets]
+    for job, (error, refs, _, _, elapsed, key, hit) in zip(render_jobs, render_targets(render_jobs, configs, ir_dir, jobs)):
+        note_times.append((job[0].relative_to(book).as_posix(), *elapsed))
+        if error:
+            print(f'Failed {job[0]}: {error}')
+            failures.append(job[0])
+        else:
+            live_media.update(refs.values())
+            live_irs.add(key)
+            reused += hit
+            for (_, _, _, _, _, stage), out_html in zip(sites, job[1]):
+                print(f'Rendered {job[0]} -> {stage.live / out_html.relative_to(stage.root)}')
+    # A page that failed has no output in the fresh tree: the nav must not link it
+    if failures:
+        missing = {page_paths[md_path] for md_path in failures}
+        for entry in manifest:
+            entry['pages'] = [p for p in entry['pages'] if p['path'] not in missing]
+    timer.lap('render')
+    if not failures:
+        for config in configs:
+            get_store(config.media_root).prune(live_media)
+        prune_irs(ir_dir, live_irs)
+    for _, _, _, _, _, stage in sites:
+        stage.publish()
+    timer.lap('prune')
+
+    for target, *_ in sites:
+        write_nav(manifest, target)
+    timer.lap('nav')
+    for target, base, outputs, records, before, stage in sites:
+        changes = delta(before, snapshot(base, outputs, records))
+        (target.assets_dir / 'build-delta.json').write_text(json.dumps(changes, indent=2), encoding='utf-8')
+        # Build info for traceability
+        build_info = {
+            'builder': 'build-pages',
+            'version': 'v0.1.0',
+            'built_at': datetime.now(timezone.utc).isoformat(),
+            'source': str(book),
+            'output': str(target.out_dir),
+            'asset_base': target.asset_base,
+            'counts': {
+                'sections': len(manifest),
+                'pages': sum(len(s['pages']) for s in manifest),
+                'targets': len(targets),
+                'parsed': len(render_jobs) - len(failures) - reused,
+                'reused_ir': reused,
+                'added': len(changes['added']),
+                'changed': len(changes['changed']),
+                'removed': len(changes['removed']),
+            },
+            'timings': timer.report(note_times),
+        }
+        (target.assets_dir / 'build-info.json').write_text(json.dumps(build_info, indent=2), encoding='utf-8')
+    return failures
 
 
 if __name__ == '__main__':
@@ -226,13 +157,35 @@ if __name__ == '__main__':
     ap.add_argument('--asset-base', default='/', help='Base path where the site is hosted, e.g., /repo-name')
     ap.add_argument('--out', default='pages', help='Output folder (default: pages)')
     ap.add_argument('--assets', default='assets', help='Assets folder (default: assets)')
-    ap.add_argument('--template', default=str(pathlib.Path(__file__).parent / 'templates' / 'section.html'), help='HTML template for pages')
+    ap.add_argument('--template', default=str(TEMPLATES / 'section.html'), help='HTML template for pages')
+    ap.add_argument('--target', action='append', nargs='+', default=[], metavar='ARG',
+                    help='Also write the site for ASSET_BASE OUT ASSETS [TEMPLATE] from the same parse (repeatable)')
+    ap.add_argument('--ir-cache', default='.build-ir', help='Folder caching each note\'s parsed form between builds (default: .build-ir)')
+    ap.add_argument('--jobs', '-j', type=int, default=1, help='Render notes in N worker processes (0 = one per CPU)')
+    ap.add_argument('--profile', nargs='?', const='build.pstats', metavar='PATH',
+                    help='Run the build under cProfile and dump stats to PATH (default: build.pstats); use with --jobs 1')
     args = ap.parse_args()
+    for t in args.target:
+        if len(t) not in (3, 4):
+            ap.error('--target takes ASSET_BASE OUT ASSETS [TEMPLATE]')
 
     ROOT = pathlib.Path('.').resolve()
-    build(
+    kwargs = dict(
         book=pathlib.Path(args.book).resolve(),
         out_dir=(ROOT / args.out).resolve(),
         assets_dir=(ROOT / args.assets).resolve(),
         template_path=pathlib.Path(args.template).resolve(),
-        asset_base=args.asset_base.rstrip('/'))
+        asset_base=args.asset_base.rstrip('/'),
+        jobs=args.jobs,
+        targets=[Target(t[0].rstrip('/'), (ROOT / t[1]).resolve(), (ROOT / t[2]).resolve(),
+                        pathlib.Path(t[3] if len(t) > 3 else args.template).resolve()) for t in args.target],
+        ir_dir=(ROOT / args.ir_cache).resolve())
+    if args.profile:
+        profiler = cProfile.Profile()
+        failures = profiler.runcall(build, **kwargs)
+        profiler.dump_stats(args.profile)
+        print(f'Profile written to {args.profile} (python3 -m pstats {args.profile})')
+    else:
+        failures = build(**kwargs)
+    if failures:
+        raise SystemExit(f'{len(failures)} page(s) failed to render.')
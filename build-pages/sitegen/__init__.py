@@ -0,0 +1 @@
+"""Shared building blocks for the Obsidian-to-Pages site builders."""
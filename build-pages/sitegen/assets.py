@@ -0,0 +1,215 @@
+"""Asset stage: content-hash fingerprints and precompressed siblings.
+
+``fingerprint`` copies every stylesheet and script found directly in the given
+directories to ``<name>.<sha256[:10]><ext>`` next to the source, after
+pointing their own references at the fingerprinted names (``@import`` in CSS,
+``assets/js/...`` string literals in JS), so a change to an imported file also
+changes the importer's fingerprint. Stale fingerprints are removed and the
+mapping is saved as JSON. Templates reference assets through
+``{{asset:css/style.css}}`` slots filled from ``AssetMap.slots``.
+
+``bundle_css`` runs before fingerprinting. It inlines a stylesheet's local
+``@import``s into one minified bundle, hoisting remote imports to the top, and
+extracts the critical rules (selectors matching ``CRITICAL_SELECTORS``: theme
+variables, layout, the fixed controls and first-screen typography).
+``style_links`` inlines those rules in ``<head>`` and loads the full bundle
+without blocking first paint.
+
+``precompress`` writes ``.gz`` siblings for text outputs so a static server
+can serve them precompressed.
+"""
+import gzip, hashlib, html, json, os, pathlib, re
+
+from .minify import minify_css
+from .publish import WRITTEN, remove, write_if_changed
+
+FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{10}(?=\.(?:css|js)$)')
+CSS_REF_RE = re.compile(r'''(@import\s+(?:url\(\s*)?['"]?)([^'")\s;]+)''')
+JS_REF_RE = re.compile(r'''assets/(?:css|js)/[\w.-]+\.(?:css|js)\b''')
+GZIP_SUFFIXES = ('.html', '.css', '.js', '.json')
+IMPORT_RE = re.compile(r'''@import\s+(?:url\(\s*)?(['"]?)([^'")\s;]+)\1\s*\)?\s*([^;]*);''')
+# Selectors whose rules are inlined for first paint (each selector of a rule is tested on its own):
+# theme variables, the page layout and its fixed controls, and the type of the first screen. The
+# sidebar's contents, page states and everything further down the page wait for the bundle
+CRITICAL_SELECTORS = (
+    r':root', r'html(?:\[data-theme=[^\]]+\])?', r'body', r'h[12]', r'p',
+    r'\.(?:layout|content|sidebar|container|tagline|card)', r'\.md-content(?: h[12]| p)?',
+    r'\.(?:hamburger|theme-toggle|font-slider|backdrop)',
+)
+CRITICAL_SELECTOR_RE = re.compile('|'.join(f'(?:{p})' for p in CRITICAL_SELECTORS))
+
+class AssetMap:
+    def __init__(self, mapping: dict):
+        # 'css/style.css' -> 'css/style.0123456789.css' (paths relative to assets/)
+        self.mapping = mapping
+
+    def slots(self, asset_base: str) -> dict:
+        return {f'asset:{src}': f'{asset_base}/assets/{dest}' for src, dest in self.mapping.items()}
+
+    def digest(self) -> str:
+        return hashlib.sha256(json.dumps(self.mapping, sort_keys=True).encode('utf-8')).hexdigest()
+
+def fingerprint(assets: pathlib.Path, dirs=('css', 'js'), map_path: pathlib.Path = None) -> AssetMap:
+    sources = {}
+    for d in dirs:
+        for path in sorted((assets / d).glob('*')):
+            if path.is_file() and path.suffix in ('.css', '.js') and not FINGERPRINT_RE.search(path.name):
+                sources[path.relative_to(assets).as_posix()] = path
+    mapping, visiting = {}, set()
+
+    def resolve(rel: str) -> str:
+        # Depth-first so a file's references are fingerprinted before its own hash is taken
+        if rel in mapping:
+            return mapping[rel]
+        if rel in visiting:
+            raise ValueError(f'Asset reference cycle through {rel}')
+        visiting.add(rel)
+        path = sources[rel]
+        text = path.read_text(encoding='utf-8')
+        if path.suffix == '.css':
+            def ref(m):
+                target = (pathlib.PurePosixPath(rel).parent / m.group(2)).as_posix()
+                return m.group(1) + pathlib.PurePosixPath(resolve(target)).name if target in sources else m.group(0)
+            text = CSS_REF_RE.sub(ref, text)
+        else:
+            def ref(m):
+                target = m.group(0)[len('assets/'):]
+                # A script naming itself (e.g. to locate its own URL) keeps the plain name
+                return 'assets/' + resolve(target) if target in sources and target != rel else m.group(0)
+            text = JS_REF_RE.sub(ref, text)
+        data = text.encode('utf-8')
+        h = hashlib.sha256(data).hexdigest()[:10]
+        dest = path.with_name(f'{path.stem}.{h}{path.suffix}')
+        write_if_changed(dest, data)
+        visiting.discard(rel)
+        mapping[rel] = dest.relative_to(assets).as_posix()
+        return mapping[rel]
+
+    for rel in sources:
+        resolve(rel)
+    live = set(mapping.values())
+    for d in dirs:
+        for path in (assets / d).glob('*'):
+            if FINGERPRINT_RE.search(path.name) and path.relative_to(assets).as_posix() not in live:
+                remove(path)
+    if map_path is not None:
+        write_if_changed(map_path, json.dumps(mapping, indent=2, sort_keys=True).encode('utf-8'))
+    return AssetMap(mapping)
+
+def load_asset_map(assets: pathlib.Path, map_path: pathlib.Path = None, dirs=('css', 'js')) -> AssetMap:
+    # The last build's fingerprints, or plain names for anything not fingerprinted (all of them without map_path)
+    try:
+        mapping = json.loads(map_path.read_text(encoding='utf-8')) if map_path else {}
+    except (OSError, ValueError):
+        mapping = {}
+    for d in dirs:
+        for path in sorted((assets / d).glob('*')):
+            rel = path.relative_to(assets).as_posix()
+            if path.suffix in ('.css', '.js') and not FINGERPRINT_RE.search(path.name) and rel not in mapping:
+                mapping[rel] = rel
+    return AssetMap(mapping)
+
+def _inline_imports(path: pathlib.Path, remote: list, seen: set) -> str:
+    # Local @imports are replaced by the imported file (wrapped in @media if qualified)
+    seen.add(path)
+    def sub(m):
+        url, media = m.group(2), m.group(3).strip()
+        if re.match(r'^(?:[a-z]+:)?//', url):
+            if m.group(0) not in remote:
+                remote.append(m.group(0))
+            return ''
+        target = (path.parent / url).resolve()
+        if target in seen or not target.is_file():
+            return ''
+        body = _inline_imports(target, remote, seen)
+        return f'@media {media}{{{body}}}' if media else body
+    return IMPORT_RE.sub(sub, path.read_text(encoding='utf-8'))
+
+def _css_blocks(css: str):
+    # Top-level (prelude, body) pairs of minified CSS; body is None for statements (@import ...;)
+    blocks, depth, start, quote = [], 0, 0, None
+    for i, ch in enumerate(css):
+        if quote:
+            if ch == quote and css[i - 1] != '\\':
+                quote = None
+        elif ch in '"\'':
+            quote = ch
+        elif ch == '{':
+            if depth == 0:
+                brace = i
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                blocks.append((css[start:brace].strip(), css[brace + 1:i]))
+                start = i + 1
+        elif ch == ';' and depth == 0:
+            blocks.append((css[start:i].strip(), None))
+            start = i + 1
+    return blocks
+
+def critical_css(css: str, selector_re=CRITICAL_SELECTOR_RE) -> str:
+    kept = []
+    for prelude, body in _css_blocks(css):
+        if body is None:
+            continue
+        if prelude.startswith(('@media', '@supports')):
+            inner = critical_css(body, selector_re)
+            if inner:
+                kept.append(f'{prelude}{{{inner}}}')
+        elif not prelude.startswith('@'):
+            selectors = [sel for sel in prelude.split(',') if selector_re.fullmatch(sel.strip())]
+            if selectors:
+                kept.append(f'{",".join(selectors)}{{{body}}}')
+    # A rule repeated later (the same variables from two imported sheets) overrides its earlier copy
+    return ''.join(rule for i, rule in enumerate(kept) if rule not in kept[i + 1:])
+
+def bundle_css(entry: pathlib.Path, out: pathlib.Path, critical_out: pathlib.Path, selector_re=CRITICAL_SELECTOR_RE) -> str:
+    # Writes the minified bundle and its critical subset; returns the critical CSS
+    remote = []
+    body = _inline_imports(entry.resolve(), remote, set())
+    css = minify_css(''.join(remote) + body)
+    critical = critical_css(css, selector_re)
+    write_if_changed(out, css.encode('utf-8'))
+    critical_out.parent.mkdir(parents=True, exist_ok=True)
+    write_if_changed(critical_out, critical.encode('utf-8'))
+    return critical
+
+def style_links(slots: dict, critical: str = None, bundle: str = 'css/bundle.css', plain: str = 'css/style.css') -> str:
+    # <head> markup for the stylesheets: critical rules inline and the bundle loaded async
+    # (a plain blocking <link> without noscript), or just the plain stylesheet without a bundle
+    href = slots.get(f'asset:{bundle}')
+    if critical is None or href is None:
+        return f'<link rel="stylesheet" href="{slots[f"asset:{plain}"]}" />'
+    href = html.escape(href)
+    return (f'<style>{critical}</style>\n'
+            f'  <link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'" />\n'
+            f'  <noscript><link rel="stylesheet" href="{href}" /></noscript>')
+
+def precompress(paths, level: int = 9, gz_path=None) -> int:
+    # Writes <file>.gz (or gz_path(file)) for each path whose sibling is missing or older; returns
+    # how many were written
+    written = 0
+    for path in paths:
+        gz = gz_path(path) if gz_path else path.with_name(path.name + '.gz')
+        try:
+            if gz.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+                continue
+        except OSError:
+            pass
+        existed = gz.exists()
+        tmp = gz.with_name(gz.name + '.tmp')
+        tmp.write_bytes(gzip.compress(path.read_bytes(), level, mtime=0))
+        os.replace(tmp, gz)
+        WRITTEN.note(gz, existed)
+        written += 1
+    return written
+
+def prune_gzip(gz_paths, everything: bool = False) -> int:
+    # Drops .gz siblings whose source is gone, or all of them once precompression is off
+    removed = 0
+    for gz in gz_paths:
+        src = gz.with_name(gz.name[:-len('.gz')])
+        if src.suffix in GZIP_SUFFIXES and (everything or not src.exists()):
+            removed += remove(gz)
+    return removed
@@ -0,0 +1,134 @@
+"""Build daemon: a JSON-lines API over a local Unix socket, plus a client.
+
+Each request is one line ``{"id": ..., "op": "<name>", "args": {...}}``; each
+answer is one line ``{"id": ..., "ok": true, "result": ...}`` or
+``{"id": ..., "ok": false, "error": "..."}``. A connection may send several
+requests without waiting; answers carry the request's id.
+
+``serve(path, handlers, quick)`` runs the asyncio server until a ``shutdown``
+request or Ctrl-C. ``handlers`` (renders, builds) run one at a time on a single
+worker thread, so the event loop never waits on disk I/O and builds never
+overlap; ``quick`` handlers (status) run on the loop and answer even while a
+build is in progress. ``Client(path)`` is a small blocking client for editor
+integrations, scripts and tests; from a shell, ``socat - UNIX-CONNECT:<path>``
+works too.
+"""
+import asyncio, json, pathlib, socket, time
+from concurrent.futures import ThreadPoolExecutor
+
+class DaemonError(RuntimeError):
+    pass
+
+def _in_use(path: pathlib.Path) -> bool:
+    with socket.socket(socket.AF_UNIX) as s:
+        try:
+            s.connect(str(path))
+        except OSError:
+            return False
+    return True
+
+async def _serve(path: pathlib.Path, handlers: dict, quick: dict) -> None:
+    loop = asyncio.get_running_loop()
+    worker = ThreadPoolExecutor(max_workers=1)
+    stop = asyncio.Event()
+
+    async def answer(req: dict) -> dict:
+        op, args = req.get('op'), req.get('args') or {}
+        try:
+            if op == 'shutdown':
+                stop.set()
+                return { 'ok': True, 'result': None }
+            if op in quick:
+                return { 'ok': True, 'result': quick[op](**args) }
+            if op not in handlers:
+                raise DaemonError(f'unknown op {op!r}')
+            result = await loop.run_in_executor(worker, lambda: handlers[op](**args))
+            return { 'ok': True, 'result': result }
+        except Exception as e:
+            return { 'ok': False, 'error': f'{type(e).__name__}: {e}' }
+
+    async def connection(reader, writer):
+        lock = asyncio.Lock()
+        async def reply(line: bytes):
+            try:
+                req = json.loads(line)
+                res = await answer(req)
+                res['id'] = req.get('id')
+            except ValueError as e:
+                res = { 'id': None, 'ok': False, 'error': f'bad request: {e}' }
+            async with lock:
+                writer.write(json.dumps(res).encode('utf-8') + b'\n')
+                await writer.drain()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(reply(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_unix_server(connection, path=str(path), limit=1 << 24)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        worker.shutdown(wait=True)
+
+def serve(path: pathlib.Path, handlers: dict, quick: dict = None) -> None:
+    path = pathlib.Path(path)
+    if path.exists():
+        if _in_use(path):
+            raise DaemonError(f'a daemon is already listening on {path}')
+        # Left behind by a daemon that did not exit cleanly
+        path.unlink()
+    try:
+        asyncio.run(_serve(path, handlers, quick or {}))
+    finally:
+        path.unlink(missing_ok=True)
+
+class Client:
+    def __init__(self, path, timeout: float = None, wait: float = 0):
+        # wait: keep retrying the connection this many seconds (for a daemon still starting)
+        deadline = time.monotonic() + wait
+        while True:
+            self.sock = socket.socket(socket.AF_UNIX)
+            self.sock.settimeout(timeout)
+            try:
+                self.sock.connect(str(path))
+                break
+            except OSError:
+                self.sock.close()
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+        self.file = self.sock.makefile('rb')
+        self.next_id = 0
+
+    def call(self, op: str, **args):
+        self.next_id += 1
+        self.sock.sendall(json.dumps({ 'id': self.next_id, 'op': op, 'args': args }).encode('utf-8') + b'\n')
+        line = self.file.readline()
+        if not line:
+            raise DaemonError('daemon closed the connection')
+        res = json.loads(line)
+        if not res['ok']:
+            raise DaemonError(res['error'])
+        return res['result']
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,137 @@
+"""Local preview server with live reload, plus a polling file watcher.
+
+The server maps ``<base>/...`` onto a directory (so pages built with an
+absolute asset base such as ``/mathematical-economics`` work unchanged),
+injects a tiny EventSource client into every HTML response, and pushes a
+``reload`` event over server-sent events whenever ``ReloadHub.notify()`` is
+called. Only the standard library is used.
+"""
+import http.server, os, pathlib, threading, time
+from urllib.parse import urlsplit
+
+EVENTS_PATH = '/__livereload'
+CLIENT_SNIPPET = (
+    '<script>(function(){var es=new EventSource("' + EVENTS_PATH + '");'
+    'es.onmessage=function(e){if(e.data==="reload")location.reload();};})();</script>'
+).encode('utf-8')
+
+class ReloadHub:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.version = 0
+
+    def notify(self) -> None:
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> int:
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != seen, timeout)
+            return self.version
+
+def make_handler(root: pathlib.Path, base: str, hub: ReloadHub):
+    base = base.rstrip('/')
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=str(root), **kwargs)
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path == EVENTS_PATH:
+                return self._events()
+            if path in ('', '/') and base:
+                self.send_response(302)
+                self.send_header('Location', base + '/index.html')
+                self.end_headers()
+                return
+            if base and not (path == base or path.startswith(base + '/')):
+                return self.send_error(404)
+            self.path = self.path[len(base):] or '/'
+            fs_path = pathlib.Path(self.translate_path(self.path))
+            if fs_path.is_dir():
+                fs_path = fs_path / 'index.html'
+            if fs_path.suffix == '.html' and fs_path.is_file():
+                return self._html(fs_path)
+            return super().do_GET()
+
+        def _html(self, fs_path: pathlib.Path):
+            body = fs_path.read_bytes()
+            at = body.rfind(b'</body>')
+            body = body[:at] + CLIENT_SNIPPET + body[at:] if at != -1 else body + CLIENT_SNIPPET
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _events(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            seen = hub.version
+            try:
+                while True:
+                    version = hub.wait(seen, 15)
+                    # Comment lines keep idle connections (and proxies) alive
+                    self.wfile.write(b'data: reload\n\n' if version != seen else b': ping\n\n')
+                    self.wfile.flush()
+                    seen = version
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+def serve(root: pathlib.Path, base: str, hub: ReloadHub, host: str = '127.0.0.1', port: int = 8000):
+    # Serves in a daemon thread and returns the server (call shutdown() to stop)
+    server = http.server.ThreadingHTTPServer((host, port), make_handler(root, base, hub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def snapshot(paths) -> dict:
+    # path -> (mtime_ns, size) for every non-hidden file below the given roots
+    state, stack = {}, [str(p) for p in paths if os.path.isdir(p)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        st = entry.stat()
+                        state[entry.path] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    continue
+    return state
+
+def watch(paths, on_change, interval: float = 0.1, debounce: float = 0.05) -> None:
+    # Polls the roots forever; on_change(changed_paths) runs once per burst of edits
+    seen = snapshot(paths)
+    while True:
+        time.sleep(interval)
+        current = snapshot(paths)
+        if current == seen:
+            continue
+        # Debounce: editors often write a file in several steps
+        while True:
+            time.sleep(debounce)
+            settled = snapshot(paths)
+            if settled == current:
+                break
+            current = settled
+        changed = {p for p in seen.keys() | current.keys() if seen.get(p) != current.get(p)}
+        seen = current
+        on_change(changed)
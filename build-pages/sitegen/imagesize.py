@@ -0,0 +1,108 @@
+"""Intrinsic image dimensions read from file headers (standard library only).
+
+``image_size(path)`` returns ``(width, height)`` in CSS pixels for PNG, GIF,
+JPEG and SVG files, or None for anything else or anything unreadable. Only
+the first bytes are read: the PNG IHDR chunk, the GIF logical screen, the
+JPEG segments up to the first start-of-frame (with the EXIF orientation
+applied, as browsers do), and the opening ``<svg>`` tag (``width``/``height``
+in px, else the ``viewBox``).
+"""
+import re, struct
+
+SVG_HEAD = 8192
+SVG_TAG_RE = re.compile(rb'<svg\b[^>]*>', re.S | re.I)
+SVG_ATTR_RE = re.compile(rb'''\b(width|height|viewBox)\s*=\s*["']([^"']*)["']''', re.I)
+SVG_LENGTH_RE = re.compile(rb'^\s*([\d.]+)\s*(?:px)?\s*$')
+# Start-of-frame markers (C4, C8 and CC are other segment types)
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# EXIF orientations that rotate the image by 90 degrees
+ROTATED = {5, 6, 7, 8}
+
+def _png(head: bytes):
+    if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    return None
+
+def _gif(head: bytes):
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', head[6:10])
+    return None
+
+def _exif_orientation(data: bytes) -> int:
+    # data: an APP1 payload after 'Exif\0\0' (a TIFF header, then IFD0)
+    order = {b'II': '<', b'MM': '>'}.get(data[:2])
+    if order is None or len(data) < 8:
+        return 1
+    offset = struct.unpack(order + 'I', data[4:8])[0]
+    if offset + 2 > len(data):
+        return 1
+    count = struct.unpack(order + 'H', data[offset:offset + 2])[0]
+    for i in range(count):
+        entry = data[offset + 2 + 12 * i:offset + 14 + 12 * i]
+        if len(entry) < 12:
+            break
+        tag, kind = struct.unpack(order + 'HH', entry[:4])
+        if tag == 0x0112 and kind == 3:
+            return struct.unpack(order + 'H', entry[8:10])[0]
+    return 1
+
+def _jpeg(fh):
+    if fh.read(2) != b'\xff\xd8':
+        return None
+    orientation = 1
+    while True:
+        byte = fh.read(1)
+        while byte == b'\xff':
+            marker = fh.read(1)
+            if marker != b'\xff':
+                break
+        else:
+            return None
+        if not marker:
+            return None
+        marker = marker[0]
+        # Stand-alone markers carry no length
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            continue
+        length = fh.read(2)
+        if len(length) < 2:
+            return None
+        body = fh.read(struct.unpack('>H', length)[0] - 2)
+        if marker == 0xE1 and body[:6] == b'Exif\x00\x00':
+            orientation = _exif_orientation(body[6:])
+        elif marker in JPEG_SOF:
+            if len(body) < 5:
+                return None
+            height, width = struct.unpack('>HH', body[1:5])
+            return (height, width) if orientation in ROTATED else (width, height)
+
+def _svg(head: bytes):
+    tag = SVG_TAG_RE.search(head)
+    if not tag:
+        return None
+    attrs = {k.lower(): v for k, v in SVG_ATTR_RE.findall(tag.group(0))}
+    width, height = (SVG_LENGTH_RE.match(attrs.get(k, b'')) for k in (b'width', b'height'))
+    if width and height:
+        return round(float(width.group(1))), round(float(height.group(1)))
+    box = attrs.get(b'viewbox', b'').replace(b',', b' ').split()
+    if len(box) == 4:
+        try:
+            return round(float(box[2])), round(float(box[3]))
+        except ValueError:
+            return None
+    return None
+
+def image_size(path):
+    try:
+        with open(path, 'rb') as fh:
+            head = fh.read(32)
+            if head[:2] == b'\xff\xd8':
+                fh.seek(0)
+                size = _jpeg(fh)
+            elif str(path).lower().endswith('.svg'):
+                size = _svg(head + fh.read(SVG_HEAD))
+            else:
+                size = _png(head) or _gif(head)
+    except (OSError, struct.error, ValueError):
+        return None
+    return size if size and size[0] > 0 and size[1] > 0 else None
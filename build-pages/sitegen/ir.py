@@ -0,0 +1,161 @@
+"""Per-note intermediate representation, rendered once and specialized per target.
+
+Parsing a note (blocks, inline markup, formulas, images, wikilinks) is the
+expensive part of a build; filling a template is cheap. ``render_targets``
+therefore parses each note once into an IR, its body fragments with every
+asset-base URL left as the symbol ``BASE``, plus the media refs, formulas and
+search terms seen on the way, and then writes one page per target config,
+each with its own asset base, template, media root and slots.
+
+IRs are cached on disk as ``<ir dir>/<key[:2]>/<key>.json``, keyed by a hash
+of the note's bytes (read in chunks), everything about the render config that shapes the body
+(but not the target fields: asset base, template, media root, slots,
+minification) and the renderer's source. A hit skips parsing altogether,
+provided every image it embeds still maps to the same blob. A later build for
+another host, or for all of them at once, parses nothing that is unchanged.
+Notes are parsed from lazily read lines with NUL characters replaced (as an
+HTML parser would), so ``BASE`` cannot come from the source.
+"""
+import dataclasses, hashlib, json, os, pathlib, time
+from concurrent.futures import ProcessPoolExecutor
+
+from .mathspans import write_sidecar
+from .media import get_store
+from .render import MATH_SPANS, iter_md_html, note_body_lines, page_template, read_lines, write_page
+from .search import NoteTerms
+
+IR_VERSION = 2
+BASE = '\x00'
+# Config fields that only matter when a page is written, never to the IR
+TARGET_FIELDS = frozenset(('asset_base', 'template', 'media_root', 'slots', 'minify_html', 'memo_bytes', 'links', 'src_root'))
+SITEGEN = pathlib.Path(__file__).resolve().parent
+
+_code_digest = None
+
+def _code() -> str:
+    # The renderer's own source: a change to it invalidates every IR
+    global _code_digest
+    if _code_digest is None:
+        h = hashlib.sha256()
+        for path in sorted(SITEGEN.glob('*.py')):
+            h.update(path.read_bytes())
+        _code_digest = h.hexdigest()
+    return _code_digest
+
+def ir_key(src: pathlib.Path, rel: pathlib.Path, title: str, label: str, config) -> str:
+    shape = [IR_VERSION, _code(), rel.as_posix(), title, label,
+             [[f.name, repr(getattr(config, f.name))] for f in dataclasses.fields(config) if f.name not in TARGET_FIELDS]]
+    if config.links is not None:
+        shape.append(sorted(config.links.items()))
+    h = hashlib.sha256(json.dumps(shape).encode('utf-8'))
+    with open(src, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def ir_path(ir_dir: pathlib.Path, key: str) -> pathlib.Path:
+    return ir_dir / key[:2] / f'{key}.json'
+
+def load_ir(ir_dir: pathlib.Path, key: str):
+    try:
+        return json.loads(ir_path(ir_dir, key).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+def save_ir(ir_dir: pathlib.Path, key: str, ir: dict) -> None:
+    path = ir_path(ir_dir, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique temp name: two workers may store the same IR
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp.write_text(json.dumps(ir, separators=(',', ':')), encoding='utf-8')
+    os.replace(tmp, path)
+
+def parse_note(src: pathlib.Path, rel_dir: pathlib.Path, title: str, label: str, config) -> dict:
+    # config: the first target's config; its asset base is replaced by BASE
+    config = dataclasses.replace(config, asset_base=BASE)
+    media = get_store(config.media_root)
+    media.take_refs()
+    MATH_SPANS.take()
+    lines = note_body_lines((line.replace(BASE, '\ufffd') for line in read_lines(src)), title, label, config.drop_heading)
+    terms = NoteTerms(title) if config.search_terms else None
+    if terms:
+        lines = terms.feed(lines)
+    body = list(iter_md_html(lines, rel_dir, config))
+    return {
+        'body': body,
+        # Formulas left for KaTeX in the browser (all of them without build-time MathML)
+        'client_math': MATH_SPANS.needs_client(),
+        'media': media.take_refs(),
+        'math': MATH_SPANS.take() if config.protect_math else {},
+        'terms': terms.terms if terms else {},
+    }
+
+def emit(ir: dict, config, template, out_html: pathlib.Path, title: str, slots: dict) -> None:
+    # One target's page (and math sidecar) from the IR; slot values may hold BASE as well
+    base = config.asset_base
+    body = [fragment.replace(BASE, base) for fragment in ir['body']]
+    slots = {name: value.replace(BASE, base) for name, value in (slots or {}).items()}
+    if config.math_macros is not None and not ir['client_math']:
+        slots['katex'] = ''
+    write_page(template, config, out_html, title, body, slots)
+    if config.protect_math:
+        write_sidecar(out_html, ir['math'])
+
+def render_note(job, configs, templates, ir_dir: pathlib.Path):
+    # job: (src, one output path per config, title, label, slots)
+    src, outs, title, label, slots = job
+    media = get_store(configs[0].media_root)
+    start, media_start = time.perf_counter(), media.seconds
+    try:
+        rel = src.relative_to(configs[0].src_root)
+        key = ir_key(src, rel, title, label, configs[0])
+        ir = load_ir(ir_dir, key)
+        hit = ir is not None and all(media.add(pathlib.Path(s)) == blob for s, blob in ir['media'].items())
+        media.take_refs()
+        if not hit:
+            ir = parse_note(src, rel.parent, title, label, configs[0])
+            save_ir(ir_dir, key, ir)
+        for config, template, out_html in zip(configs, templates, outs):
+            if config is not configs[0]:
+                for s in ir['media']:
+                    get_store(config.media_root).add(pathlib.Path(s))
+            emit(ir, config, template, out_html, title, slots)
+    except Exception as e:
+        return f'{type(e).__name__}: {e}', {}, media.take_updates(), {}, (time.perf_counter() - start, media.seconds - media_start), None, False
+    return None, ir['media'], media.take_updates(), ir['terms'], (time.perf_counter() - start, media.seconds - media_start), key, hit
+
+# Per-process batch state for worker processes: (configs, templates, ir_dir)
+_batch = None
+
+def _init_worker(configs, ir_dir: pathlib.Path, media_entries: dict):
+    global _batch
+    _batch = (configs, [page_template(c) for c in configs], ir_dir)
+    get_store(configs[0].media_root).entries = media_entries
+
+def _render_in_worker(job):
+    return render_note(job, *_batch)
+
+def render_targets(jobs, configs, ir_dir: pathlib.Path, workers: int = 1):
+    """Render every job once and write it for every config; results come back in job order.
+
+    Each result is ``(error, media refs, media updates, search terms, (seconds, media seconds),
+    IR key, whether the IR was reused)``.
+    """
+    jobs = list(jobs)
+    configs = list(configs)
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(jobs) > 1:
+        init = (configs, ir_dir, get_store(configs[0].media_root).entries)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init) as pool:
+            return list(pool.map(_render_in_worker, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    templates = [page_template(c) for c in configs]
+    return [render_note(job, configs, templates, ir_dir) for job in jobs]
+
+def prune_irs(ir_dir: pathlib.Path, live_keys) -> int:
+    # Drop cached IRs no note of this build produced or reused
+    removed = 0
+    for path in ir_dir.glob('*/*.json'):
+        if path.stem not in live_keys:
+            path.unlink()
+            removed += 1
+    return removed
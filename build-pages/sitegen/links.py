@@ -0,0 +1,56 @@
+"""Wikilink index, backlinks and the link graph.
+
+``link_index(notes)`` maps every name a note can be linked by to its URL path,
+so each ``[[target]]`` resolves with one dict lookup however large the vault
+is. Names match case-insensitively (``render.link_key``). When two notes share
+a name, the more specific kind wins: vault path, then file name, then front
+matter alias, then title without its number prefix; within a kind the first
+note in vault order.
+
+``link_graph(notes, index)`` resolves every note's targets once and returns
+what each page links to, the backlinks of each page, the edges for
+``link-graph.json`` and how many targets matched no note.
+"""
+import html, json, pathlib
+
+from .publish import write_if_changed
+from .render import link_key, note_title
+
+def _names(rel: str, aliases):
+    stem = pathlib.PurePosixPath(rel).stem
+    return [rel], [stem], aliases, [note_title(stem)[1]]
+
+def link_index(notes) -> dict:
+    # notes: (vault-relative path, aliases, URL path) in vault order
+    names = [(_names(rel, aliases), url) for rel, aliases, url in notes]
+    index = {}
+    for kind in range(4):
+        for groups, url in names:
+            for name in groups[kind]:
+                index.setdefault(link_key(name), url)
+    return index
+
+def link_graph(notes, index: dict):
+    # notes: (URL path, title, link keys); a page linking to itself is not its own backlink
+    ids = {url: i for i, (url, _, _) in enumerate(notes)}
+    resolved, backlinks, edges, missing = [], {}, [], 0
+    for i, (url, title, targets) in enumerate(notes):
+        found = [index.get(t) for t in targets]
+        resolved.append(found)
+        missing += found.count(None)
+        for target in dict.fromkeys(found):
+            if target and target != url:
+                backlinks.setdefault(target, []).append((title, url))
+                edges.append([i, ids[target]])
+    return resolved, backlinks, edges, missing
+
+def backlinks_html(asset_base: str, sources) -> str:
+    if not sources:
+        return ''
+    items = '\n'.join(f'<li><a href="{asset_base}{url}">{html.escape(title)}</a></li>' for title, url in sources)
+    return f'<section class="backlinks">\n<h2>Backlinks</h2>\n<ul>\n{items}\n</ul>\n</section>'
+
+def write_link_graph(path: pathlib.Path, notes, edges) -> None:
+    # Nodes are (title, URL path); links are [source, target] node indexes
+    graph = { 'nodes': [{ 'title': title, 'path': url } for url, title, _ in notes], 'links': edges }
+    write_if_changed(path, json.dumps(graph, separators=(',', ':')).encode('utf-8'))
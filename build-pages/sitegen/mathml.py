@@ -0,0 +1,537 @@
+"""Build-time TeX to MathML conversion (standard library only).
+
+``to_mathml(tex, display, macros)`` turns one formula into a ``<math>``
+element, with the TeX kept as its ``application/x-tex`` annotation, so
+browsers typeset it without KaTeX. ``macros`` are argument-free TeX macros, as
+in the ``MACROS`` table of assets/js/math.js (``load_macros`` reads them from
+there), expanded before parsing.
+
+The converter covers what the notes use: letters, numbers and operators,
+Greek, sub/superscripts and primes, ``\\frac``/``\\dfrac``/``\\binom``,
+roots, named functions and big operators (limits under and over in display
+style), ``\\mathop``/``\\operatorname``, the ``\\mathbb``/``\\mathcal``/
+``\\mathbf``/``\\mathrm`` family (mapped to Unicode math alphanumerics),
+``\\text``, accents, ``\\left``/``\\middle``/``\\right`` and ``\\big``
+delimiters, spacing commands, and the matrix, ``cases``, ``aligned``,
+``gathered`` and ``array`` environments. Anything else raises
+``MathMLError``; the caller then leaves that formula to KaTeX in the browser.
+"""
+import html, json, pathlib, re, unicodedata
+
+class MathMLError(ValueError):
+    pass
+
+# Control words, control symbols ('\\,', '\\{', a row break '\\\\'), comments, whitespace, characters
+TOKEN_RE = re.compile(r'\\[a-zA-Z]+|\\.|%[^\n]*|\s+|.', re.S)
+MACROS_RE = re.compile(r'var MACROS = (\{.*?\});', re.S)
+# Macro expansion depth before a (recursive) macro is given up on
+MAX_EXPANSION = 8
+
+GREEK = dict(zip(
+    ('alpha beta gamma delta epsilon varepsilon zeta eta theta vartheta iota kappa varkappa lambda mu nu xi pi varpi '
+     'rho varrho sigma varsigma tau upsilon phi varphi chi psi omega').split(),
+    'αβγδϵεζηθϑικϰλμνξπϖρϱσςτυϕφχψω'))
+GREEK_UPPER = dict(zip('Gamma Delta Theta Lambda Xi Pi Sigma Upsilon Phi Psi Omega'.split(), 'ΓΔΘΛΞΠΣΥΦΨΩ'))
+# Ordinary symbols (<mi>)
+SYMBOLS = {
+    'infty': '∞', 'partial': '∂', 'nabla': '∇', 'emptyset': '∅', 'varnothing': '∅', 'ell': 'ℓ', 'hbar': 'ℏ',
+    'aleph': 'ℵ', 'Re': 'ℜ', 'Im': 'ℑ', 'wp': '℘', 'imath': 'ı', 'jmath': 'ȷ', 'top': '⊤', 'bot': '⊥',
+    'angle': '∠', 'triangle': '△', 'Box': '□', 'prime': '′', 'checkmark': '✓', 'dagger': '†',
+    '%': '%', '$': '$', '#': '#', '_': '_', '&': '&',
+}
+# Binary operators, relations, arrows, logic and punctuation (<mo>)
+OPERATORS = {
+    'pm': '±', 'mp': '∓', 'times': '×', 'div': '÷', 'cdot': '⋅', 'cdotp': '⋅', 'ast': '∗', 'star': '⋆', 'circ': '∘',
+    'bullet': '∙', 'oplus': '⊕', 'ominus': '⊖', 'otimes': '⊗', 'odot': '⊙', 'cup': '∪', 'cap': '∩', 'sqcup': '⊔',
+    'setminus': '∖', 'smallsetminus': '∖', 'wedge': '∧', 'land': '∧', 'vee': '∨', 'lor': '∨',
+    'leq': '≤', 'le': '≤', 'geq': '≥', 'ge': '≥', 'leqslant': '⩽', 'geqslant': '⩾', 'neq': '≠', 'ne': '≠',
+    'approx': '≈', 'equiv': '≡', 'sim': '∼', 'simeq': '≃', 'cong': '≅', 'propto': '∝', 'doteq': '≐',
+    'triangleq': '≜', 'coloneqq': '≔', 'lesssim': '≲', 'gtrsim': '≳', 'll': '≪', 'gg': '≫',
+    'in': '∈', 'notin': '∉', 'ni': '∋', 'subset': '⊂', 'subseteq': '⊆', 'subsetneq': '⊊', 'supset': '⊃',
+    'supseteq': '⊇', 'supsetneq': '⊋', 'sqsubseteq': '⊑', 'prec': '≺', 'succ': '≻', 'preceq': '⪯',
+    'succeq': '⪰', 'preccurlyeq': '≼', 'succcurlyeq': '≽', 'precsim': '≾', 'succsim': '≿',
+    'perp': '⊥', 'parallel': '∥', 'mid': '∣', 'nmid': '∤', 'vdash': '⊢', 'models': '⊨',
+    'to': '→', 'rightarrow': '→', 'leftarrow': '←', 'gets': '←', 'leftrightarrow': '↔', 'Rightarrow': '⇒',
+    'Leftarrow': '⇐', 'Leftrightarrow': '⇔', 'iff': '⟺', 'implies': '⟹', 'impliedby': '⟸', 'mapsto': '↦',
+    'longrightarrow': '⟶', 'longleftarrow': '⟵', 'Longrightarrow': '⟹', 'Longleftarrow': '⟸',
+    'longmapsto': '⟼', 'uparrow': '↑', 'downarrow': '↓', 'nearrow': '↗', 'searrow': '↘',
+    'rightharpoonup': '⇀', 'hookrightarrow': '↪',
+    'forall': '∀', 'exists': '∃', 'nexists': '∄', 'neg': '¬', 'lnot': '¬', 'colon': ':',
+    'ldots': '…', 'dots': '…', 'cdots': '⋯', 'vdots': '⋮', 'ddots': '⋱',
+    'langle': '⟨', 'rangle': '⟩', 'lfloor': '⌊', 'rfloor': '⌋', 'lceil': '⌈', 'rceil': '⌉',
+    'vert': '|', 'Vert': '‖', 'lvert': '|', 'rvert': '|', 'lVert': '‖', 'rVert': '‖', 'backslash': '\\',
+    '{': '{', '}': '}', '|': '‖',
+}
+# Big operators: (character, limits under/over in display style)
+BIG_OPERATORS = {
+    'sum': ('∑', True), 'prod': ('∏', True), 'coprod': ('∐', True), 'bigcup': ('⋃', True), 'bigcap': ('⋂', True),
+    'bigoplus': ('⨁', True), 'bigotimes': ('⨂', True), 'bigvee': ('⋁', True), 'bigwedge': ('⋀', True),
+    'bigsqcup': ('⨆', True), 'int': ('∫', False), 'iint': ('∬', False), 'iiint': ('∭', False), 'oint': ('∮', False),
+}
+# Named functions, set upright: (text, limits)
+FUNCTIONS = {
+    **{name: (name, False) for name in
+       'arccos arcsin arctan arg cos cosh cot coth csc deg dim exp hom ker lg ln log sec sin sinh tan tanh'.split()},
+    **{name: (name, True) for name in 'det gcd inf lim max min Pr sup'.split()},
+    'liminf': ('lim inf', True), 'limsup': ('lim sup', True),
+}
+SPACES = {
+    ',': '0.1667em', ':': '0.2222em', '>': '0.2222em', ';': '0.2778em', '!': '-0.1667em', ' ': '0.3333em',
+    'thinspace': '0.1667em', 'enspace': '0.5em', 'quad': '1em', 'qquad': '2em',
+}
+FONTS = {
+    'mathbb': 'bb', 'mathcal': 'cal', 'mathscr': 'cal', 'mathfrak': 'frak', 'mathbf': 'bf', 'boldsymbol': 'bfit',
+    'bm': 'bfit', 'mathit': 'it', 'mathsf': 'sf', 'mathtt': 'tt', 'mathrm': 'rm',
+}
+# Unicode name prefixes of each font's alphanumerics (the second one for the letters that predate
+# the Mathematical Alphanumeric Symbols block, e.g. DOUBLE-STRUCK CAPITAL R)
+FONT_NAMES = {
+    'bb': ('MATHEMATICAL DOUBLE-STRUCK', 'DOUBLE-STRUCK'), 'cal': ('MATHEMATICAL SCRIPT', 'SCRIPT'),
+    'frak': ('MATHEMATICAL FRAKTUR', 'BLACK-LETTER'), 'bf': ('MATHEMATICAL BOLD',), 'bfit': ('MATHEMATICAL BOLD ITALIC',),
+    'it': ('MATHEMATICAL ITALIC',), 'sf': ('MATHEMATICAL SANS-SERIF',), 'tt': ('MATHEMATICAL MONOSPACE',),
+}
+TEXT = ('text', 'textrm', 'textnormal', 'mbox')
+TEXT_SYMBOLS = {'\\{': '{', '\\}': '}', '\\%': '%', '\\$': '$', '\\&': '&', '\\#': '#', '\\_': '_', '\\ ': ' ',
+                '\\,': '\u2009', '~': '\u00a0'}
+# (character, stretchy): narrow accents keep their size, wide ones span the base
+ACCENTS = {
+    'hat': ('^', False), 'bar': ('ˉ', False), 'tilde': ('~', False), 'vec': ('→', False), 'dot': ('˙', False),
+    'ddot': ('¨', False), 'check': ('ˇ', False), 'breve': ('˘', False), 'acute': ('ˊ', False), 'grave': ('ˋ', False),
+    'widehat': ('^', True), 'widetilde': ('~', True), 'overline': ('‾', True), 'overrightarrow': ('→', True),
+    'overleftarrow': ('←', True),
+}
+DELIMITERS = {
+    '(': '(', ')': ')', '[': '[', ']': ']', '|': '|', '/': '/', '<': '⟨', '>': '⟩', '\\{': '{', '\\}': '}',
+    '\\|': '‖', '\\langle': '⟨', '\\rangle': '⟩', '\\lfloor': '⌊', '\\rfloor': '⌋', '\\lceil': '⌈',
+    '\\rceil': '⌉', '\\vert': '|', '\\Vert': '‖', '\\lvert': '|', '\\rvert': '|', '\\lVert': '‖', '\\rVert': '‖',
+    '\\uparrow': '↑', '\\downarrow': '↓', '\\backslash': '\\',
+}
+BIG_SIZES = {'big': '1.2em', 'Big': '1.623em', 'bigg': '2.047em', 'Bigg': '2.470em'}
+BIG = {f'\\{size}{side}': em for size, em in BIG_SIZES.items() for side in ('', 'l', 'r', 'm')}
+# Plain fences and slashes do not grow with their contents in TeX
+NO_STRETCH = frozenset('()[]{}|‖⟨⟩⌊⌋⌈⌉/')
+# Environment -> (left fence, right fence, column alignments, display style)
+ENVIRONMENTS = {
+    'matrix': ('', '', ('center',), False), 'pmatrix': ('(', ')', ('center',), False),
+    'bmatrix': ('[', ']', ('center',), False), 'Bmatrix': ('{', '}', ('center',), False),
+    'vmatrix': ('|', '|', ('center',), False), 'Vmatrix': ('‖', '‖', ('center',), False),
+    'cases': ('{', '', ('left',), False),
+    'aligned': ('', '', ('align-right', 'align-left'), True), 'align': ('', '', ('align-right', 'align-left'), True),
+    'align*': ('', '', ('align-right', 'align-left'), True), 'split': ('', '', ('align-right', 'align-left'), True),
+    'gathered': ('', '', ('center',), True), 'gather': ('', '', ('center',), True), 'gather*': ('', '', ('center',), True),
+    'array': ('', '', None, False),
+}
+CELL_STYLES = {
+    'center': '', 'left': ' style="text-align: left"', 'right': ' style="text-align: right"',
+    # Paired columns of aligned equations meet at the alignment point
+    'align-right': ' style="text-align: right; padding-right: 0"', 'align-left': ' style="text-align: left; padding-left: 0"',
+}
+ARRAY_COLUMNS = {'l': 'left', 'c': 'center', 'r': 'right'}
+# Tokens that close a group, a \left, a cell or an environment
+CLOSERS = frozenset(('}', '\\right', '&', '\\\\', '\\end'))
+STYLES = {'\\displaystyle': True, '\\textstyle': False}
+THIN_SPACE = '<mspace width="0.1667em"/>'
+
+def load_macros(path: pathlib.Path) -> dict:
+    # The MACROS object literal of math.js (JSON: double-quoted keys and values, no trailing comma)
+    m = MACROS_RE.search(pathlib.Path(path).read_text(encoding='utf-8'))
+    if not m:
+        raise ValueError(f'no MACROS table in {path}')
+    return json.loads(m.group(1))
+
+def tokenize(tex: str, macros: dict, depth: int = 0) -> list:
+    # Commands keep their backslash; comments are dropped and whitespace runs become ' '
+    out = []
+    for m in TOKEN_RE.finditer(tex):
+        tok = m.group(0)
+        if tok[0] == '%':
+            continue
+        if tok.isspace():
+            tok = ' '
+        elif tok in macros:
+            if depth >= MAX_EXPANSION or '#' in macros[tok]:
+                raise MathMLError(f'cannot expand macro {tok}')
+            out += tokenize(macros[tok], macros, depth + 1)
+            continue
+        out.append(tok)
+    return out
+
+def _esc(s: str) -> str:
+    return html.escape(s, quote=False)
+
+def _row(items) -> str:
+    # One element: a lone item as is, anything else in an <mrow>
+    items = [item for item in items if item]
+    return items[0] if len(items) == 1 else '<mrow>' + ''.join(items) + '</mrow>'
+
+def _mo(c: str) -> str:
+    return f'<mo stretchy="false">{_esc(c)}</mo>' if c in NO_STRETCH else f'<mo>{_esc(c)}</mo>'
+
+def _styled(c: str, font: str) -> str:
+    # 'R' in 'bb' -> 'ℝ', 'α' in 'bf' -> '𝛂', '1' in 'bb' -> '𝟙'
+    try:
+        name = unicodedata.name(c)
+    except ValueError:
+        raise MathMLError(f'no {font} form of {c!r}') from None
+    name = name.replace('LATIN ', '').replace('GREEK ', '').replace('LETTER ', '')
+    for prefix in FONT_NAMES[font]:
+        try:
+            return unicodedata.lookup(f'{prefix} {name}')
+        except KeyError:
+            pass
+    raise MathMLError(f'no {font} form of {c!r}')
+
+class _Parser:
+    def __init__(self, tokens: list, display: bool):
+        self.toks, self.i = tokens, 0
+        # Display style (limits go under and over) and the font set by \mathbb and friends
+        self.display, self.font = display, None
+
+    def peek(self):
+        # The next token, skipping spaces (which do not matter in math mode)
+        while self.i < len(self.toks) and self.toks[self.i] == ' ':
+            self.i += 1
+        return self.toks[self.i] if self.i < len(self.toks) else None
+
+    def next(self) -> str:
+        tok = self.peek()
+        if tok is None:
+            raise MathMLError('unexpected end of formula')
+        self.i += 1
+        return tok
+
+    def expect(self, tok: str) -> None:
+        found = self.next()
+        if found != tok:
+            raise MathMLError(f'expected {tok}, found {found}')
+
+    def parse_list(self, stop=()) -> list:
+        # Atoms up to (not including) a token in stop, or the end
+        items, prev = [], None
+        while True:
+            tok = self.peek()
+            if tok is None or tok in stop:
+                return items
+            if tok in CLOSERS:
+                raise MathMLError(f'unexpected {tok}')
+            if tok in STYLES:
+                # \displaystyle applies to the rest of the group
+                self.i += 1
+                display, self.display = self.display, STYLES[tok]
+                rest = self.parse_list(stop)
+                self.display = display
+                flag = 'true' if STYLES[tok] else 'false'
+                items.append(f'<mstyle displaystyle="{flag}" scriptlevel="0">{_row(rest)}</mstyle>')
+                return items
+            markup, kind = self.parse_atom()
+            if kind is None:
+                continue
+            # A function name is set off from an ordinary operand by a thin space, as in TeX
+            if prev == 'fn' and kind in ('ord', 'fn'):
+                items.append(THIN_SPACE)
+            items.append(markup)
+            prev = kind
+
+    def parse_atom(self):
+        # One base with its scripts: (markup, kind), kind being 'ord', 'fn', 'op', 'mo', 'space' or None
+        if self.peek() in ('^', '_', "'"):
+            base, kind, limits = '<mrow></mrow>', 'ord', False
+        else:
+            base, kind, limits = self.parse_base(self.next())
+            if kind is None:
+                return '', None
+        while self.peek() in ('\\limits', '\\nolimits'):
+            limits = 'always' if self.next() == '\\limits' else False
+        sub, sups, caret = None, [], False
+        while True:
+            tok = self.peek()
+            if tok == "'":
+                self.i += 1
+                sups.append('<mo>′</mo>')
+            elif tok == '^':
+                if caret:
+                    raise MathMLError('double superscript')
+                self.i += 1
+                caret = True
+                sups.append(self.parse_script())
+            elif tok == '_':
+                if sub is not None:
+                    raise MathMLError('double subscript')
+                self.i += 1
+                sub = self.parse_script()
+            else:
+                break
+        if sub is None and not sups:
+            return base, kind
+        sup = _row(sups) if sups else None
+        under = limits == 'always' or (limits and self.display)
+        single, above, both = ('munder', 'mover', 'munderover') if under else ('msub', 'msup', 'msubsup')
+        if sub is not None and sup is not None:
+            return f'<{both}>{base}{sub}{sup}</{both}>', kind
+        if sub is not None:
+            return f'<{single}>{base}{sub}</{single}>', kind
+        return f'<{above}>{base}{sup}</{above}>', kind
+
+    def parse_script(self) -> str:
+        # Scripts are set in text style
+        display, self.display = self.display, False
+        try:
+            return self.parse_arg()
+        finally:
+            self.display = display
+
+    def parse_arg(self) -> str:
+        # A braced group or a single token (x^2n is x^{2}n)
+        tok = self.next()
+        if tok == '{':
+            items = self.parse_list(('}',))
+            self.expect('}')
+            return _row(items) or '<mrow></mrow>'
+        if tok in CLOSERS or tok in ('^', '_'):
+            raise MathMLError(f'missing argument before {tok}')
+        markup, kind, _ = self.parse_base(tok, single=True)
+        if kind is None:
+            raise MathMLError(f'missing argument before {tok}')
+        return markup
+
+    def parse_base(self, tok: str, single: bool = False):
+        # (markup, kind, limits) for the atom starting with tok
+        if tok == '{':
+            items = self.parse_list(('}',))
+            self.expect('}')
+            return _row(items) or '<mrow></mrow>', 'ord', False
+        if tok[0] == '\\' and len(tok) > 1:
+            return self.command(tok)
+        if tok.isdigit() or (tok == '.' and self.i < len(self.toks) and self.toks[self.i].isdigit()):
+            number = tok
+            while not single and self.i < len(self.toks):
+                nxt = self.toks[self.i]
+                if not (nxt.isdigit() or (nxt == '.' and self.i + 1 < len(self.toks) and self.toks[self.i + 1].isdigit())):
+                    break
+                number += nxt
+                self.i += 1
+            if self.font in FONT_NAMES:
+                return f'<mn>{"".join(_styled(c, self.font) if c.isdigit() else c for c in number)}</mn>', 'ord', False
+            return f'<mn>{number}</mn>', 'ord', False
+        if tok.isalpha():
+            text = tok
+            # Upright runs (\mathrm{Var}) are one identifier
+            while self.font == 'rm' and not single and self.peek() is not None and self.peek().isalpha():
+                text += self.next()
+            return self.identifier(text), 'ord', False
+        if tok == '~':
+            return f'<mspace width="{SPACES[" "]}"/>', 'space', False
+        if tok == '-':
+            return '<mo>−</mo>', 'mo', False
+        if tok == '*':
+            return '<mo>∗</mo>', 'mo', False
+        if tok in "+=<>,;:!?()[]|/.'@" or unicodedata.category(tok)[0] in 'SP':
+            if tok in '\\$#&^_{}':
+                raise MathMLError(f'unexpected {tok}')
+            return _mo(tok), 'mo', False
+        if unicodedata.category(tok)[0] == 'N':
+            return f'<mn>{_esc(tok)}</mn>', 'ord', False
+        raise MathMLError(f'unexpected character {tok!r}')
+
+    def identifier(self, text: str, upright: bool = False) -> str:
+        if self.font in FONT_NAMES:
+            return '<mi>' + ''.join(_styled(c, self.font) for c in text) + '</mi>'
+        if (upright or self.font == 'rm') and len(text) == 1:
+            return f'<mi mathvariant="normal">{_esc(text)}</mi>'
+        return f'<mi>{_esc(text)}</mi>'
+
+    def command(self, tok: str):
+        name = tok[1:]
+        if name in GREEK:
+            return self.identifier(GREEK[name]), 'ord', False
+        if name in GREEK_UPPER:
+            return self.identifier(GREEK_UPPER[name], upright=True), 'ord', False
+        if name in SYMBOLS:
+            return f'<mi>{_esc(SYMBOLS[name])}</mi>', 'ord', False
+        if name in OPERATORS:
+            return _mo(OPERATORS[name]), 'mo', False
+        if name in BIG_OPERATORS:
+            c, limits = BIG_OPERATORS[name]
+            return f'<mo>{c}</mo>', 'op', limits
+        if name in FUNCTIONS:
+            text, limits = FUNCTIONS[name]
+            return f'<mi>{text}</mi>', 'fn', limits
+        if name in SPACES:
+            return f'<mspace width="{SPACES[name]}"/>', 'space', False
+        if name in FONTS:
+            font, self.font = self.font, FONTS[name]
+            try:
+                return self.parse_arg(), 'ord', False
+            finally:
+                self.font = font
+        if name in TEXT:
+            return self.text(), 'ord', False
+        if name in ACCENTS:
+            c, stretchy = ACCENTS[name]
+            return f'<mover accent="true">{self.parse_arg()}<mo stretchy="{str(stretchy).lower()}">{_esc(c)}</mo></mover>', 'ord', False
+        if name == 'underline':
+            return f'<munder accentunder="true">{self.parse_arg()}<mo stretchy="true">‾</mo></munder>', 'ord', False
+        if name in ('frac', 'dfrac', 'tfrac', 'cfrac', 'binom', 'dbinom', 'tbinom'):
+            return self.fraction(name), 'ord', False
+        if name == 'sqrt':
+            if self.peek() == '[':
+                self.i += 1
+                index = self.parse_list((']',))
+                self.expect(']')
+                return f'<mroot>{self.parse_arg()}{_row(index) or "<mrow></mrow>"}</mroot>', 'ord', False
+            return f'<msqrt>{self.parse_arg()}</msqrt>', 'ord', False
+        if name == 'left':
+            left = self.delimiter()
+            items = self.parse_list(('\\right',))
+            self.expect('\\right')
+            right = self.delimiter()
+            opening = [f'<mo fence="true" stretchy="true" form="prefix">{_esc(left)}</mo>'] if left else []
+            closing = [f'<mo fence="true" stretchy="true" form="postfix">{_esc(right)}</mo>'] if right else []
+            return '<mrow>' + ''.join(opening + items + closing) + '</mrow>', 'ord', False
+        if name == 'middle':
+            return f'<mo fence="true" stretchy="true" form="infix">{_esc(self.delimiter())}</mo>', 'mo', False
+        if tok in BIG:
+            size = BIG[tok]
+            return f'<mo fence="true" stretchy="true" symmetric="true" minsize="{size}" maxsize="{size}">{_esc(self.delimiter())}</mo>', 'mo', False
+        if name == 'operatorname':
+            limits = self.peek() == '*'
+            if limits:
+                self.i += 1
+            font, self.font = self.font, 'rm'
+            try:
+                return self.parse_arg(), 'fn', limits
+            finally:
+                self.font = font
+        if name == 'mathop':
+            return self.parse_arg(), 'fn', True
+        if name in ('mathrel', 'mathbin', 'mathpunct', 'mathopen', 'mathclose'):
+            return self.parse_arg(), 'mo', False
+        if name == 'mathord':
+            return self.parse_arg(), 'ord', False
+        if name in ('overset', 'stackrel', 'underset'):
+            script = self.parse_script()
+            tag = 'munder' if name == 'underset' else 'mover'
+            return f'<{tag}>{self.parse_arg()}{script}</{tag}>', 'mo' if name == 'stackrel' else 'ord', False
+        if name in ('overbrace', 'underbrace'):
+            tag, brace = ('mover', '⏞') if name == 'overbrace' else ('munder', '⏟')
+            # Its label (the following script) always goes over or under the brace
+            return f'<{tag}>{self.parse_arg()}<mo stretchy="true">{brace}</mo></{tag}>', 'ord', 'always'
+        if name == 'phantom':
+            return f'<mphantom>{self.parse_arg()}</mphantom>', 'ord', False
+        if name in ('nonumber', 'notag'):
+            return '', None, False
+        if name == 'begin':
+            return self.environment(), 'ord', False
+        raise MathMLError(f'unsupported command {tok}')
+
+    def fraction(self, name: str) -> str:
+        # \dfrac and \dbinom force display style, \tfrac and \tbinom text style
+        forced = {'d': True, 'c': True, 't': False}.get(name[0])
+        display, self.display = self.display, False if forced is None else forced
+        try:
+            num, den = self.parse_arg(), self.parse_arg()
+        finally:
+            self.display = display
+        if name.endswith('binom'):
+            out = f'<mrow><mo>(</mo><mfrac linethickness="0">{num}{den}</mfrac><mo>)</mo></mrow>'
+        else:
+            out = f'<mfrac>{num}{den}</mfrac>'
+        if forced is None:
+            return out
+        return f'<mstyle displaystyle="{str(forced).lower()}" scriptlevel="0">{out}</mstyle>'
+
+    def delimiter(self) -> str:
+        # The fence after \left, \right, \middle or \big: '' for '.'
+        tok = self.next()
+        if tok == '.':
+            return ''
+        if tok not in DELIMITERS:
+            raise MathMLError(f'unsupported delimiter {tok}')
+        return DELIMITERS[tok]
+
+    def text(self) -> str:
+        # \text{...}: the raw tokens up to the matching brace
+        self.expect('{')
+        out, depth = [], 0
+        while True:
+            if self.i >= len(self.toks):
+                raise MathMLError('unclosed \\text')
+            tok = self.toks[self.i]
+            self.i += 1
+            if tok == '}':
+                if not depth:
+                    break
+                depth -= 1
+            elif tok == '{':
+                depth += 1
+            elif tok in TEXT_SYMBOLS:
+                out.append(TEXT_SYMBOLS[tok])
+            elif tok[0] == '\\' or tok == '$':
+                raise MathMLError(f'unsupported in text: {tok}')
+            else:
+                out.append(tok)
+        text = ''.join(out)
+        # Edge spaces would be trimmed from a token element
+        stripped = text.strip(' ')
+        if stripped != text:
+            lead, trail = len(text) - len(text.lstrip(' ')), len(text) - len(text.rstrip(' '))
+            text = '\u00a0' * lead + stripped + '\u00a0' * trail
+        return f'<mtext>{_esc(text)}</mtext>'
+
+    def braced_name(self) -> str:
+        self.expect('{')
+        name = ''
+        while self.peek() != '}':
+            name += self.next()
+        self.i += 1
+        return name
+
+    def environment(self) -> str:
+        name = self.braced_name()
+        if name not in ENVIRONMENTS:
+            raise MathMLError(f'unsupported environment {name}')
+        left, right, columns, display = ENVIRONMENTS[name]
+        if columns is None:
+            spec = self.braced_name()
+            if not spec or any(c not in ARRAY_COLUMNS for c in spec):
+                raise MathMLError(f'unsupported array columns {spec}')
+            columns = [ARRAY_COLUMNS[c] for c in spec]
+        outer, self.display = self.display, display
+        rows, row = [], []
+        try:
+            while True:
+                row.append(self.parse_list(('&', '\\\\', '\\end')))
+                tok = self.next()
+                if tok == '&':
+                    continue
+                rows.append(row)
+                row = []
+                if tok == '\\end':
+                    break
+                # A row break may carry extra spacing: \\[2pt]
+                if self.peek() == '[':
+                    while self.next() != ']':
+                        pass
+        finally:
+            self.display = outer
+        if self.braced_name() != name:
+            raise MathMLError(f'\\begin{{{name}}} ended by another environment')
+        # A trailing \\ leaves an empty last row
+        if len(rows) > 1 and rows[-1] == [[]]:
+            rows.pop()
+        body = ''.join('<mtr>' + ''.join(f'<mtd{CELL_STYLES[columns[n % len(columns)]]}>{_row(cell)}</mtd>'
+                                         for n, cell in enumerate(row)) + '</mtr>' for row in rows)
+        table = f'<mtable displaystyle="true">{body}</mtable>' if display else f'<mtable>{body}</mtable>'
+        if not (left or right):
+            return table
+        opening = f'<mo fence="true" stretchy="true" form="prefix">{_esc(left)}</mo>' if left else ''
+        closing = f'<mo fence="true" stretchy="true" form="postfix">{_esc(right)}</mo>' if right else ''
+        return f'<mrow>{opening}{table}{closing}</mrow>'
+
+def to_mathml(tex: str, display: bool = False, macros: dict = None) -> str:
+    """One formula (without its delimiters) as a ``<math>`` element; raises ``MathMLError``."""
+    parser = _Parser(tokenize(tex, macros or {}), display)
+    body = _row(parser.parse_list()) or '<mrow></mrow>'
+    block = ' display="block"' if display else ''
+    return (f'<math{block}><semantics>{body}'
+            f'<annotation encoding="application/x-tex">{_esc(tex.strip())}</annotation></semantics></math>')
@@ -0,0 +1,87 @@
+"""Build-time record of the math on each page.
+
+The inline lexers hand every protected formula to ``MathSpans.wrap``, which
+returns it inside ``<span class="math" data-h="<hash>">`` (delimiters kept, so
+plain KaTeX auto-render still works) and remembers its TeX. After a page is
+written, ``write_sidecar`` stores that page's formulas next to it as
+``<page>.math.json``; assets/js/math.js uses the sidecar to typeset formulas
+lazily and to cache the rendered HTML by hash.
+
+Given the TeX macros of math.js, ``wrap`` first tries to convert the formula
+to MathML at build time (see ``mathml.py``); a converted formula is returned
+as a ``<math>`` element and left out of the sidecar, one the converter cannot
+handle is wrapped as usual and typeset in the browser. Conversions (and
+failures) are cached by formula hash for as long as the macros stay the same.
+A page whose formulas all converted needs no KaTeX; ``untagged`` is set when
+raw HTML on the page carries delimiters the lexers never saw.
+"""
+import hashlib, html, json, pathlib, re
+
+from .mathml import MathMLError, to_mathml
+from .publish import remove, write_if_changed
+
+SIDECAR_VERSION = 1
+# Longest delimiters first so '$$x$$' is never read as '$' + '$x$' + '$'
+DELIMS = (('$$', '$$', True), ('\\[', '\\]', True), ('$', '$', False), ('\\(', '\\)', False))
+# Any opening delimiter, for raw HTML that auto-render would still typeset
+DELIM_RE = re.compile(r'\$|\\\(|\\\[')
+
+def split_formula(src: str):
+    # '$$x$$' -> ('x', True); display is True for $$...$$ and \[...\]
+    for left, right, display in DELIMS:
+        if len(src) > len(left) + len(right) and src.startswith(left) and src.endswith(right):
+            return src[len(left):-len(right)], display
+    return src, False
+
+class MathSpans:
+    def __init__(self):
+        # hash -> [tex, display] for the page being rendered
+        self.formulas = {}
+        self.untagged = False
+        # hash -> MathML (None: not convertible), valid for the macros it was converted with
+        self.converted, self.macros = {}, None
+
+    def wrap(self, escaped: str, macros: dict = None) -> str:
+        """Wrap one HTML-escaped, delimited formula and record it (or convert it, given macros)."""
+        src = html.unescape(escaped)
+        h = hashlib.sha256(src.encode('utf-8')).hexdigest()[:16]
+        if macros is not None:
+            markup = self.convert(h, src, macros)
+            if markup is not None:
+                return markup
+        if h not in self.formulas:
+            self.formulas[h] = list(split_formula(src))
+        return f'<span class="math" data-h="{h}">{escaped}</span>'
+
+    def convert(self, h: str, src: str, macros: dict):
+        if macros is not self.macros and macros != self.macros:
+            self.converted, self.macros = {}, macros
+        if h not in self.converted:
+            try:
+                self.converted[h] = to_mathml(*split_formula(src), macros)
+            except MathMLError:
+                self.converted[h] = None
+        return self.converted[h]
+
+    def note_raw(self, line: str) -> None:
+        if DELIM_RE.search(line):
+            self.untagged = True
+
+    def needs_client(self) -> bool:
+        # Whether the current page still needs KaTeX in the browser
+        return bool(self.formulas) or self.untagged
+
+    def take(self) -> dict:
+        formulas, self.formulas, self.untagged = self.formulas, {}, False
+        return formulas
+
+def sidecar_path(out_html: pathlib.Path) -> pathlib.Path:
+    return out_html.with_suffix('.math.json')
+
+def write_sidecar(out_html: pathlib.Path, formulas: dict) -> None:
+    # Pages without math get no sidecar (and lose a stale one)
+    path = sidecar_path(out_html)
+    if not formulas:
+        remove(path)
+        return
+    write_if_changed(path, json.dumps({ 'version': SIDECAR_VERSION, 'formulas': formulas }, separators=(',', ':')).encode('utf-8'))
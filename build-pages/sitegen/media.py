@@ -0,0 +1,137 @@
+"""Content-addressed media store for images referenced by notes.
+
+Each source image is hashed at most once per build (and not at all when its
+size and mtime match the persisted stat cache) and stored once under
+``<media root>/<sha256[:16]><ext>``, so a figure used by ten notes is copied
+once and unchanged figures are never copied again. Copies use a reflink
+(FICLONE) where the filesystem supports it and fall back to a plain copy.
+Hardlinks are deliberately not used: vault images are often edited in place,
+which would silently rewrite a blob whose name promises different content.
+Each entry also records the image's intrinsic [width, height], parsed from
+its header once per content hash, for the width/height attributes of <img>.
+"""
+import hashlib, os, pathlib, shutil, time
+
+from .imagesize import image_size
+from .publish import WRITTEN, remove
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+FICLONE = 0x40049409
+
+def _sha256(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _clone(src: pathlib.Path, dest: pathlib.Path) -> None:
+    # Unique temp name so concurrent workers storing the same blob never collide
+    tmp = dest.with_name(f'{dest.name}.{os.getpid()}.tmp')
+    try:
+        with open(src, 'rb') as fi, open(tmp, 'wb') as fo:
+            try:
+                if fcntl is None:
+                    raise OSError
+                fcntl.ioctl(fo.fileno(), FICLONE, fi.fileno())
+            except OSError:
+                shutil.copyfileobj(fi, fo)
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+class MediaStore:
+    def __init__(self, root: pathlib.Path, entries: dict = None):
+        self.root = root
+        self.reset(entries)
+
+    def reset(self, entries: dict = None) -> None:
+        # Start a new build; long-lived processes (watch mode) must re-stat sources
+        # Persistent stat cache: source path -> {'size', 'mtime_ns', 'sha256', 'dims'}
+        self.entries = entries if entries is not None else {}
+        self.updates = {}
+        self.refs = {}
+        self.copied = 0
+        # Time spent stat-ing, hashing and copying sources (for build timings)
+        self.seconds = 0.0
+        self._seen = {}
+        self._dims_by_hash = {}
+
+    def add(self, src_path: pathlib.Path):
+        """Store src_path once and return its blob name, or None if it cannot be read."""
+        key = src_path.as_posix()
+        blob = self._seen.get(key)
+        if blob is None:
+            start = time.perf_counter()
+            try:
+                st = os.stat(src_path)
+                entry = self.entries.get(key)
+                if not entry or entry['size'] != st.st_size or entry['mtime_ns'] != st.st_mtime_ns:
+                    entry = { 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': _sha256(src_path) }
+                    entry['dims'] = self._dims(src_path, entry['sha256'])
+                    self.entries[key] = self.updates[key] = entry
+                elif 'dims' not in entry:
+                    # Entry persisted before dimensions were recorded
+                    entry = { **entry, 'dims': self._dims(src_path, entry['sha256']) }
+                    self.entries[key] = self.updates[key] = entry
+                blob = entry['sha256'][:16] + src_path.suffix.lower()
+                dest = self.root / blob
+                existed = dest.exists()
+                if not existed or dest.stat().st_size != st.st_size:
+                    self.root.mkdir(parents=True, exist_ok=True)
+                    _clone(src_path, dest)
+                    WRITTEN.note(dest, existed)
+                    self.copied += 1
+            except OSError:
+                return None
+            finally:
+                self.seconds += time.perf_counter() - start
+            self._seen[key] = blob
+        self.refs[key] = blob
+        return blob
+
+    def _dims(self, src_path: pathlib.Path, sha256: str):
+        # Header-parsed [width, height] (None if unknown), read once per content hash
+        if sha256 not in self._dims_by_hash:
+            size = image_size(src_path)
+            self._dims_by_hash[sha256] = list(size) if size else None
+        return self._dims_by_hash[sha256]
+
+    def dimensions(self, src_path: pathlib.Path):
+        """[width, height] of an image stored by add(), or None if unknown."""
+        entry = self.entries.get(src_path.as_posix())
+        return entry.get('dims') if entry else None
+
+    def take_refs(self) -> dict:
+        # Blobs referenced since the last call (one note's worth when called per note)
+        refs, self.refs = self.refs, {}
+        return refs
+
+    def take_updates(self) -> dict:
+        updates, self.updates = self.updates, {}
+        return updates
+
+    def prune(self, live_blobs) -> int:
+        # Drop blobs (and files from older layouts) that no page references anymore
+        if not self.root.exists():
+            return 0
+        removed = 0
+        for path in sorted(self.root.rglob('*'), reverse=True):
+            if path.is_file() and path.relative_to(self.root).as_posix() not in live_blobs:
+                removed += remove(path)
+            elif path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+        return removed
+
+_stores = {}
+
+def get_store(root: pathlib.Path) -> MediaStore:
+    store = _stores.get(root)
+    if store is None:
+        store = _stores[root] = MediaStore(root)
+    return store
@@ -0,0 +1,51 @@
+"""Least-recently-used memo with a byte budget.
+
+``Memo(budget)`` maps keys to values whose approximate size the caller passes
+to ``put``; once the stored sizes exceed the budget the least recently used
+entries are dropped. A budget of 0 stores nothing. ``take_stats()`` returns the
+hit, miss and eviction counts since the previous call together with the
+current occupancy, so a long-lived process can report them per build.
+"""
+from collections import OrderedDict
+
+class Memo:
+    def __init__(self, budget: int = 0):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        hit = self.entries.get(key)
+        if hit is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return hit[0]
+
+    def put(self, key, value, nbytes: int) -> None:
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        if nbytes > self.budget:
+            return
+        self.entries[key] = (value, nbytes)
+        self.size += nbytes
+        self._evict()
+
+    def resize(self, budget: int) -> None:
+        self.budget = budget
+        self._evict()
+
+    def _evict(self) -> None:
+        while self.size > self.budget:
+            _, (_, nbytes) = self.entries.popitem(last=False)
+            self.size -= nbytes
+            self.evictions += 1
+
+    def take_stats(self) -> dict:
+        stats = { 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                  'entries': len(self.entries), 'bytes': self.size, 'budget': self.budget }
+        self.hits = self.misses = self.evictions = 0
+        return stats
@@ -0,0 +1,71 @@
+"""Whitespace-level minifiers for generated HTML and CSS.
+
+``minify_html`` collapses each run of whitespace to one character (a newline
+if the run contained one, else a space) and drops comments. It leaves
+``<pre>``, ``<textarea>``, ``<script>`` and ``<style>`` contents, math spans
+(``<span class="math" ...>``) and build-time MathML (``<math>``) byte-for-byte,
+so formulas and their sidecar hashes are untouched. Collapsing never removes
+whitespace outright, so the rendered page is unchanged.
+
+``minify_css`` drops comments, collapses whitespace and removes it around
+``{ } ; , >`` and after ``:``. Quoted strings are kept verbatim.
+"""
+import re, weakref
+
+from .templates import Template
+
+HTML_KEEP_RE = re.compile(r'<(pre|textarea|script|style)\b.*?(?:</\1\s*>|\Z)|<span class="math"[^>]*>.*?</span>|<math\b.*?</math>|<!--.*?-->', re.S | re.I)
+# ASCII whitespace only: a non-breaking space is content
+WS_RE = re.compile(r'[ \t\r\n\f]+')
+CSS_STRING = r'''"(?:\\.|[^"\\])*"''' + r"""|'(?:\\.|[^'\\])*'"""
+CSS_COMMENT_RE = re.compile(rf'({CSS_STRING})|/\*.*?\*/', re.S)
+CSS_STRING_RE = re.compile(CSS_STRING)
+CSS_PUNCT_RE = re.compile(r' ?([{};,>]) ?|(:) ')
+
+def _collapse(m) -> str:
+    return '\n' if '\n' in m.group(0) else ' '
+
+def minify_html(s: str) -> str:
+    out, pos = [], 0
+    for m in HTML_KEEP_RE.finditer(s):
+        out.append(WS_RE.sub(_collapse, s[pos:m.start()]))
+        keep = m.group(0)
+        # Comments go, except conditional ones (<!--[if ...]>)
+        if not keep.startswith('<!--') or keep.startswith('<!--['):
+            out.append(keep)
+        pos = m.end()
+    out.append(WS_RE.sub(_collapse, s[pos:]))
+    return ''.join(out)
+
+_templates = weakref.WeakKeyDictionary()
+
+def minify_template(tpl: Template) -> Template:
+    # The template's literal segments minified once; slots are left for their values
+    hit = _templates.get(tpl)
+    if hit is None:
+        segments, line_slot = [], False
+        for seg in tpl.segments:
+            if seg.__class__ is str:
+                # After a slot alone on its line (which ends it) the indentation goes, as it would
+                # have collapsed into that newline
+                seg = minify_html('\n' + seg)[1:] if line_slot else minify_html(seg)
+            elif len(seg) == 3:
+                seg = (seg[0], seg[1], '')
+            line_slot = seg.__class__ is not str and len(seg) == 3
+            segments.append(seg)
+        hit = _templates[tpl] = Template(segments)
+    return hit
+
+def _squeeze_css(s: str) -> str:
+    s = CSS_PUNCT_RE.sub(lambda m: m.group(1) or m.group(2), WS_RE.sub(' ', s))
+    return s.replace(';}', '}')
+
+def minify_css(css: str) -> str:
+    css = CSS_COMMENT_RE.sub(lambda m: m.group(1) or ' ', css)
+    out, pos = [], 0
+    for m in CSS_STRING_RE.finditer(css):
+        out.append(_squeeze_css(css[pos:m.start()]))
+        out.append(m.group(0))
+        pos = m.end()
+    out.append(_squeeze_css(css[pos:]))
+    return ''.join(out).strip()
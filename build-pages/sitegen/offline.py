@@ -0,0 +1,80 @@
+"""Offline support: a versioned precache manifest and the service worker.
+
+``precache_manifest`` lists, by URL, the shell every page needs (stylesheets
+and scripts, the sidebar partial, ``site.json``, the navigation shards, the
+landing page and the pinned CDN files the page template loads), every page in
+reading order and what each page embeds (its math sidecar and images), with a
+content hash per URL. ``version`` is a hash of the whole manifest.
+
+``write_service_worker`` renders the worker script from a template with that
+version, so any change to the site changes the worker's bytes and browsers
+install the new one. The worker precaches the shell, serves listed URLs from
+its cache, prefetches the next page (and its images) after each page view and,
+on update, drops only the entries whose hash changed. With ``enabled=False``
+it writes a worker that unregisters itself and clears its caches (for the
+development server, whose pages must never be served from a cache).
+
+Hashes are only recomputed for files whose size or mtime changed since the
+previous build (``file_hashes``); unchanged outputs keep their mtime.
+"""
+import hashlib, json, os, pathlib, re
+
+from .publish import write_if_changed
+from .templates import load_template
+
+REMOTE_RE = re.compile(r'''(?:href|src)=["'](https://[^"']+)["']''')
+
+def remote_urls(*templates: pathlib.Path) -> list:
+    # Pinned third-party files (the KaTeX CDN build) the page template and its slot partials load
+    return sorted(set(url for template in templates for url in REMOTE_RE.findall(template.read_text(encoding='utf-8'))))
+
+def file_hashes(root: pathlib.Path, rels, known: dict = None, written=()) -> dict:
+    # rels: root-relative paths (missing files are left out); known: the previous result, kept
+    # as is for files not in written and while a rewritten file's size and mtime are unchanged
+    known = known or {}
+    out = {}
+    for rel in rels:
+        prev = known.get(rel)
+        if prev and rel not in written:
+            out[rel] = prev
+            continue
+        try:
+            st = os.stat(root / rel)
+        except OSError:
+            continue
+        if prev and prev[0] == st.st_size and prev[1] == st.st_mtime_ns:
+            out[rel] = prev
+            continue
+        digest = hashlib.sha256((root / rel).read_bytes()).hexdigest()[:16]
+        out[rel] = [st.st_size, st.st_mtime_ns, digest]
+    return out
+
+def precache_manifest(asset_base: str, shell, pages, deps: dict, hashes: dict, remote=()) -> dict:
+    # shell, pages: root-relative paths (pages in reading order); deps: page path -> embedded paths;
+    # hashes: root-relative path -> content hash; remote: absolute URLs, identified by the URL itself
+    def url(rel: str) -> str:
+        return f'{asset_base}/{rel}'
+    shell = [rel for rel in shell if rel in hashes]
+    pages = [rel for rel in pages if rel in hashes]
+    manifest = {
+        'shell': [url(rel) for rel in shell] + list(remote),
+        'pages': [url(rel) for rel in pages],
+        'deps': {url(rel): [url(d) for d in deps.get(rel, ()) if d in hashes] for rel in pages},
+        'hashes': { **{url(rel): hashes[rel] for rel in shell + pages},
+                    **{url(d): hashes[d] for rel in pages for d in deps.get(rel, ()) if d in hashes},
+                    **{u: '' for u in remote} },
+    }
+    manifest['version'] = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return manifest
+
+def write_precache(path: pathlib.Path, manifest: dict) -> bool:
+    return write_if_changed(path, json.dumps(manifest, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+def write_service_worker(path: pathlib.Path, template: pathlib.Path, asset_base: str, manifest_url: str,
+                         version: str = '', enabled: bool = True) -> bool:
+    script = load_template(template).render(
+        version=json.dumps(version),
+        manifest=json.dumps(manifest_url),
+        scope=json.dumps(asset_base + '/'),
+        enabled='true' if enabled else 'false')
+    return write_if_changed(path, script.encode('utf-8'))
@@ -0,0 +1,214 @@
+"""Staged, write-if-changed publishing of generated output.
+
+``write_if_changed(path, data)`` replaces a file only when its bytes differ, so
+an unchanged output keeps its mtime and rsync, git and CDNs see no change.
+Every file it writes, and every file ``remove(path)`` deletes, is noted in
+``WRITTEN`` (with whether it existed before), so a build can list its added,
+changed and removed outputs without walking them.
+
+``Stage(live)`` gives a build a sibling ``.<name>.staging`` directory that
+holds only the files it rewrites; ``exists``, ``glob`` and ``remove`` see the
+staged files over the live ones. Writers must replace files (temporary name,
+then ``os.replace``) rather than truncate them. ``publish()`` drops staged
+files whose bytes did not change, moves the rest into the live tree (each with
+one ``os.replace``) and deletes the removed ones, so its cost follows what the
+build wrote rather than the size of the site. With ``fresh=True`` (a full
+build) the staging tree is the whole new site instead: rewritten files with
+unchanged bytes get their old mtime back and the tree replaces the live one in
+one step (``renameat2(RENAME_EXCHANGE)`` on Linux, otherwise two renames).
+Only that swap is atomic: an incremental publish replaces one file at a time,
+so a build interrupted while publishing can leave a mix of old and new files
+(each one whole). It never records that build in its cache, so the next build
+renders those notes again, and it clears the leftover staging directory.
+
+``snapshot(root, paths)`` and ``delta(before, after)`` compare output files by
+size and mtime to list the added, changed and removed paths; ``written_delta``
+does the same from ``WRITTEN``.
+"""
+import ctypes, filecmp, os, pathlib, shutil
+
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+class WriteLog:
+    # Output path -> whether it existed before this build first wrote or removed it
+    def __init__(self):
+        self.paths = {}
+
+    def note(self, path: pathlib.Path, existed: bool) -> None:
+        self.paths.setdefault(pathlib.Path(path), existed)
+
+    def merge(self, paths: dict) -> None:
+        for path, existed in paths.items():
+            self.note(path, existed)
+
+    def forget(self, root: pathlib.Path) -> None:
+        # Drop entries below root (a staging tree, whose files are noted again under their live path)
+        self.paths = {p: e for p, e in self.paths.items() if root not in p.parents}
+
+    def take(self) -> dict:
+        paths, self.paths = self.paths, {}
+        return paths
+
+WRITTEN = WriteLog()
+
+def write_if_changed(path: pathlib.Path, data: bytes) -> bool:
+    try:
+        if path.read_bytes() == data:
+            return False
+        existed = True
+    except OSError:
+        existed = False
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    WRITTEN.note(path, existed)
+    return True
+
+def remove(path: pathlib.Path) -> bool:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        return False
+    WRITTEN.note(path, True)
+    return True
+
+def _exchange(a: pathlib.Path, b: pathlib.Path) -> bool:
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return False
+    return renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE) == 0
+
+def _files(root: pathlib.Path):
+    # Relative paths of every file below root, dot-entries (staging trees) skipped
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for name in filenames:
+            yield os.path.relpath(os.path.join(dirpath, name), root)
+
+class Stage:
+    def __init__(self, live: pathlib.Path, fresh: bool = False):
+        self.live = live
+        self.root = live.with_name(f'.{live.name}.staging')
+        self.fresh = fresh or not live.exists()
+        # Live files deleted by this build (relative to live), applied by publish()
+        self.removed = set()
+        # Left over from an interrupted build
+        if self.root.exists():
+            shutil.rmtree(self.root)
+        self.root.mkdir(parents=True)
+
+    def path(self, live_path: pathlib.Path) -> pathlib.Path:
+        return self.root / live_path.relative_to(self.live)
+
+    def exists(self, live_path: pathlib.Path) -> bool:
+        rel = live_path.relative_to(self.live)
+        if (self.root / rel).exists():
+            return True
+        return not self.fresh and rel not in self.removed and live_path.exists()
+
+    def glob(self, live_dir: pathlib.Path, pattern: str) -> list:
+        # Live paths of the files matching pattern in live_dir, staged or not removed
+        found = {self.live / p.relative_to(self.root) for p in self.path(live_dir).glob(pattern)}
+        if not self.fresh:
+            found.update(p for p in live_dir.glob(pattern) if p.relative_to(self.live) not in self.removed)
+        return sorted(found)
+
+    def remove(self, live_path: pathlib.Path) -> bool:
+        staged = remove(self.path(live_path))
+        if self.fresh or not live_path.exists() or live_path.relative_to(self.live) in self.removed:
+            return staged
+        self.removed.add(live_path.relative_to(self.live))
+        return True
+
+    def _settle(self):
+        # Full build: a file rewritten with the same bytes gets the live copy's mtime back; the
+        # rest is noted as written, and live files missing from the new tree as removed
+        staged = set(_files(self.root))
+        for rel in staged:
+            new, live = self.root / rel, self.live / rel
+            try:
+                old = os.stat(live)
+            except OSError:
+                WRITTEN.note(live, False)
+                continue
+            if os.stat(new).st_size == old.st_size and filecmp.cmp(new, live, shallow=False):
+                os.utime(new, ns=(old.st_atime_ns, old.st_mtime_ns))
+            else:
+                WRITTEN.note(live, True)
+        for rel in _files(self.live):
+            if rel not in staged:
+                WRITTEN.note(self.live / rel, True)
+
+    def _apply(self):
+        # Incremental build: move changed files in, delete removed ones and the directories they emptied
+        for rel in _files(self.root):
+            new, live = self.root / rel, self.live / rel
+            existed = live.exists()
+            if existed and os.stat(new).st_size == os.stat(live).st_size and filecmp.cmp(new, live, shallow=False):
+                continue
+            live.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(new, live)
+            self.removed.discard(pathlib.Path(rel))
+            WRITTEN.note(live, existed)
+        dirs = set()
+        for rel in self.removed:
+            remove(self.live / rel)
+            dirs.update((self.live / rel).parents)
+        for d in sorted(dirs, key=lambda d: len(d.parts), reverse=True):
+            if self.live in d.parents and not any(d.iterdir()):
+                d.rmdir()
+
+    def publish(self):
+        WRITTEN.forget(self.root)
+        if not self.fresh:
+            self._apply()
+            shutil.rmtree(self.root)
+            return
+        self._settle()
+        if not self.live.exists():
+            os.rename(self.root, self.live)
+            return
+        if not _exchange(self.root, self.live):
+            old = self.live.with_name(f'.{self.live.name}.old')
+            if old.exists():
+                shutil.rmtree(old)
+            os.rename(self.live, old)
+            os.rename(self.root, self.live)
+            self.root = old
+        shutil.rmtree(self.root)
+
+def snapshot(root: pathlib.Path, paths, skip=()) -> dict:
+    # Root-relative POSIX path -> (size, mtime_ns) for the files and trees in paths
+    out = {}
+    for path in paths:
+        files = [path] if path.is_file() else [path / rel for rel in _files(path)] if path.is_dir() else []
+        for f in files:
+            rel = f.relative_to(root).as_posix()
+            if rel not in skip:
+                st = f.stat()
+                out[rel] = (st.st_size, st.st_mtime_ns)
+    return out
+
+def delta(before: dict, after: dict) -> dict:
+    return {
+        'added': sorted(p for p in after if p not in before),
+        'changed': sorted(p for p in after if p in before and after[p] != before[p]),
+        'removed': sorted(p for p in before if p not in after),
+    }
+
+def written_delta(written: dict, root: pathlib.Path, paths, skip=()) -> dict:
+    # delta() from a WriteLog's entries: those under paths (files or trees), as they stand now
+    out = { 'added': [], 'changed': [], 'removed': [] }
+    for path, existed in written.items():
+        if not any(path == p or p in path.parents for p in paths):
+            continue
+        rel = path.relative_to(root).as_posix()
+        if rel in skip:
+            continue
+        if path.exists():
+            out['changed' if existed else 'added'].append(rel)
+        elif existed:
+            out['removed'].append(rel)
+    return { kind: sorted(rels) for kind, rels in out.items() }
@@ -0,0 +1,550 @@
+"""Markdown-to-page rendering shared by every builder.
+
+``render_many(jobs, config)`` renders a batch of notes, each job being
+``(src, out, title, label, slots)``. It returns one result per job, in order:
+``(error, media refs, media stat-cache updates, search terms, (seconds, media seconds))``.
+Patterns are compiled once at import, the page template is parsed once per
+batch, and the media store's stat cache is shared by every note in the batch
+(handed to each worker process once, not per note). Failures are returned,
+not raised, so one bad note never stops a build.
+
+``RenderConfig`` holds what differs between the entry points: the source root,
+template, asset base, media handling, whether formulas are protected and
+recorded for the math sidecars, and which leading heading is dropped.
+
+Obsidian ``[[note#heading|alias]]`` links resolve through ``config.links``, a
+dict from ``link_key(name)`` to URL path built once per build (see
+``links.py``), so each link costs one lookup. Headings get ``id``s from their
+slug, which is also what ``#heading`` resolves to. ``note_links(lines)`` finds a
+note's aliases and link targets with the renderer's own block and inline rules,
+without rendering it (or holding the whole note in memory).
+
+With ``config.memo_bytes`` set, each block's inline HTML is memoized in
+``BLOCK_MEMO`` (an in-process LRU with that byte budget), keyed on a hash of
+the block source, its directory and the config fields that shape the output.
+A hit is reused only while the images it embeds map to the same blobs and its
+wikilinks to the same pages; its formulas and media refs are recorded for the
+current note as if it had been rendered. Long-lived processes (watch mode)
+then re-render only the blocks that changed.
+
+Images get their intrinsic ``width``/``height`` (from the media store, parsed
+from the file header) and ``decoding="async"``; all but the first
+``config.eager_images`` of each note also get ``loading="lazy"``.
+
+With ``config.math_macros`` (the macros of assets/js/math.js), formulas are
+converted to MathML as they are lexed and only the ones the converter rejects
+are left for KaTeX. The body of such a page is rendered before its head, and a
+page left with no formulas for the browser gets an empty ``katex`` slot, so it
+loads no KaTeX at all.
+"""
+import filecmp, hashlib, html, itertools, os, pathlib, re, time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import unquote
+
+from .imagesize import image_size
+from .mathspans import MathSpans, write_sidecar
+from .media import get_store
+from .memo import Memo
+from .minify import minify_html, minify_template
+from .publish import WRITTEN
+from .search import NoteTerms
+from .templates import load_template
+
+@dataclass(frozen=True)
+class RenderConfig:
+    src_root: pathlib.Path
+    template: pathlib.Path
+    asset_base: str
+    media_root: pathlib.Path
+    # Lex formulas first so their contents are never rewritten, and write <page>.math.json sidecars
+    protect_math: bool = True
+    # TeX macros for build-time MathML (needs protect_math); None leaves every formula to KaTeX
+    math_macros: dict = None
+    # 'hashed': content-addressed media store, repo-absolute URLs;
+    # 'copy': images mirrored under media_root/<note dir>/, page-relative URLs
+    media_urls: str = 'hashed'
+    # Drop a leading H1 that repeats the title ('title') or any leading H1 ('any')
+    drop_heading: str = 'title'
+    search_terms: bool = False
+    # Collapse template and body whitespace (math spans, <pre>, <script>, <style> left as is)
+    minify_html: bool = False
+    # Byte budget of the block memo (0 = no memo); only used with hashed media
+    memo_bytes: int = 0
+    # Wikilink index (link_key(name) -> URL path); None leaves [[...]] as text
+    links: dict = None
+    # Leading images per note loaded eagerly (likely above the fold); later ones get loading="lazy"
+    eager_images: int = 1
+    # Template slots shared by every page of the batch (e.g. fingerprinted asset URLs)
+    slots: dict = field(default_factory=dict)
+
+# Formulas seen while rendering the current note (one collector per process)
+MATH_SPANS = MathSpans()
+# Rendered inline blocks (one memo per process, sized from config.memo_bytes)
+BLOCK_MEMO = Memo()
+# Approximate per-entry cost of a memoized block beyond its strings
+MEMO_OVERHEAD = 200
+# What the block being memoized depends on: ('math', formula, None), ('img', source path, blob)
+# and ('link', link key, URL path); None when no block is being recorded
+_block_deps = None
+# Images emitted so far in the current note (reset by iter_md_html)
+_note_images = 0
+
+NUM_LABEL_RE = re.compile(r'^(\d+(?:\.\d+)*)\s+(.+)$')
+ABS_URL_RE = re.compile(r'^(?:[a-z]+:)?//')
+H1_RE = re.compile(r'^#\s+.+')
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*)$')
+HR_RE = re.compile(r'^-{3,}\s*$')
+BULLET_RE = re.compile(r'^([ \t]*)([-\*])\s+(.*)$')
+
+# Delimited formulas as (opener, closer), tried in this order: $$...$$, $...$, \[...\] and \(...\),
+# each with at least one character inside
+MATH_DELIMS = (('$$', '$$'), ('$', '$'), ('\\[', '\\]'), ('\\(', '\\)'))
+
+# Token openers scanned left to right: a formula, wikilink, image, link or code span starts at the
+# first one whose closing delimiter follows (formulas first); link texts are re-lexed
+INLINE_RE = re.compile(r"""
+    (?P<math>\$|\\[\[(])
+  | (?<!!)\[\[(?P<wiki>[^\[\]\n]+)\]\]
+  | (?P<link>!?\[)
+  | `(?P<code>[^`]+)`
+""", re.X)
+# Stands in for a token while bold and italics are applied (NUL never reaches the lexer)
+TOKEN_SLOT_RE = re.compile(r'\x00(\d+)\x00')
+
+# Sequential passes used when math is not protected (markup inside formulas is rewritten too);
+# the lexer applies the last two around its tokens
+IMG_RE = re.compile(r'!\[([^\]]*)\]\(([^\)]+)\)')
+LINK_RE = re.compile(r'\[([^\]]+)\]\(([^\)]+)\)')
+CODE_RE = re.compile(r'`([^`]+)`')
+STRONG_RE = re.compile(r'\*\*([^*]+)\*\*')
+EM_RE = re.compile(r'(?<!\*)\*([^*]+)\*(?!\*)')
+WIKILINK_RE = re.compile(r'(?<!!)\[\[([^\[\]\n]+)\]\]')
+# Front matter aliases: 'aliases: [a, b]', 'aliases: a' or a '- a' list on the following lines
+ALIASES_RE = re.compile(r'^alias(?:es)?:\s*(.*)$')
+
+def slugify(s: str) -> str:
+    s = s.strip().lower()
+    # replace non-alnum with hyphen
+    s = re.sub(r'[^a-z0-9]+', '-', s)
+    s = re.sub(r'-{2,}', '-', s).strip('-')
+    return s or 'index'
+
+def split_num_label(name: str):
+    m = NUM_LABEL_RE.match(name.strip())
+    if m:
+        return m.group(1), m.group(2)
+    return '', name.strip()
+
+def note_title(stem: str):
+    # (title, label): the filename with its numeric prefix kept, and without it
+    num, label = split_num_label(stem)
+    return (num + ' ' if num else '') + label, label
+
+def link_key(name: str) -> str:
+    # Link targets match case-insensitively, with or without the .md suffix
+    name = name.strip().replace('\\', '/').casefold()
+    return name[:-3] if name.endswith('.md') else name
+
+def split_wikilink(inner: str):
+    # 'note#heading|alias' -> (note, heading, display text)
+    target, _, alias = inner.partition('|')
+    note, _, heading = target.partition('#')
+    note, heading = note.strip(), heading.strip()
+    return note, heading, alias.strip() or (f'{note} > {heading}' if note and heading else note or heading)
+
+def _wikilink(inner: str, config: RenderConfig) -> str:
+    # inner is HTML-escaped; block references (#^id) link to the note itself
+    note, heading, text = split_wikilink(inner)
+    anchor = '#' + slugify(html.unescape(heading)) if heading and not heading.startswith('^') else ''
+    if not note:
+        return f'<a class="wikilink" href="{anchor}">{text}</a>' if anchor else text
+    key = link_key(html.unescape(note))
+    path = config.links.get(key)
+    if _block_deps is not None:
+        _block_deps.append(('link', key, path))
+    if path is None:
+        return f'<span class="wikilink unresolved">{text}</span>'
+    return f'<a class="wikilink" href="{config.asset_base}{path}{anchor}">{text}</a>'
+
+def _is_abs_url(u: str) -> bool:
+    return bool(ABS_URL_RE.match(u)) or u.startswith('data:') or u.startswith('/')
+
+def _img_sub(alt: str, src: str, rel_dir: pathlib.Path, config: RenderConfig) -> str:
+    global _note_images
+    dims = None
+    if _is_abs_url(src):
+        new_src = src
+    elif config.media_urls == 'copy':
+        src_path = (config.src_root / rel_dir / src).resolve()
+        dest_path = (config.media_root / rel_dir / src).resolve()
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if src_path.exists():
+                dest_path.write_bytes(src_path.read_bytes())
+        except Exception:
+            pass
+        dims = image_size(src_path)
+        new_src = f"{'../' * (len(rel_dir.parts) + 1)}assets/media/{rel_dir.as_posix()}/{src}"
+    else:
+        # Images are stored once under their content hash; unreadable ones keep the old path
+        src_path = (config.src_root / rel_dir / unquote(html.unescape(src))).resolve()
+        blob = get_store(config.media_root).add(src_path)
+        if _block_deps is not None:
+            _block_deps.append(('img', src_path.as_posix(), blob))
+        new_src = f"{config.asset_base}/assets/media/{blob or rel_dir.as_posix() + '/' + src}"
+        if blob:
+            dims = get_store(config.media_root).dimensions(src_path)
+    # Intrinsic size reserves the image's box before it loads (no reflow)
+    size = f' width="{dims[0]}" height="{dims[1]}"' if dims else ''
+    lazy = ' loading="lazy"' if _note_images >= config.eager_images else ''
+    _note_images += 1
+    return f'<img src="{new_src}" alt="{alt}"{size}{lazy} decoding="async">'
+
+def _find(s: str, sub: str, start: int, found: dict) -> int:
+    # s.find(sub, start) for starts that never decrease: the last hit (or miss) is reused while it
+    # still lies ahead, so a run of unclosed openers costs one search instead of one each
+    hit = found.get(sub)
+    if hit is None or 0 <= hit < start:
+        hit = found[sub] = s.find(sub, start)
+    return hit
+
+def _formula_end(s: str, i: int, found: dict):
+    # End of the formula opening at s[i], or None when no closer follows
+    for opener, closer in MATH_DELIMS:
+        if s.startswith(opener, i):
+            end = _find(s, closer, i + len(opener) + 1, found)
+            if end >= 0:
+                return end + len(closer)
+    return None
+
+def _link_parts(s: str, i: int, found: dict):
+    # (text, href, end) of the link (or image: alt, src) opening at s[i]: '[' text ']' '(' href ')'
+    # with the first ']' and ')' closing them; None when it does not close
+    image = s[i] == '!'
+    text_start = i + 2 if image else i + 1
+    close = _find(s, ']', text_start, found)
+    if close < 0 or (close == text_start and not image) or not s.startswith('(', close + 1):
+        return None
+    end = _find(s, ')', close + 2, found)
+    if end <= close + 2:
+        return None
+    return s[text_start:close], s[close + 2:end], end + 1
+
+def _inline_scan(s: str):
+    # (kind, start, end, parts) of each token in s; kind is 'math', 'wiki', 'img', 'link' or 'code'
+    found, pos = {}, 0
+    while True:
+        m = INLINE_RE.search(s, pos)
+        if m is None:
+            return
+        kind, start = m.lastgroup, m.start()
+        if kind == 'math':
+            end = _formula_end(s, start, found)
+            parts = ()
+        elif kind == 'link':
+            parts = _link_parts(s, start, found)
+            end = parts and parts[2]
+            kind = 'img' if s[start] == '!' else 'link'
+        else:
+            end, parts = m.end(), (m.group(kind),)
+        if end is None:
+            pos = start + 1
+            continue
+        yield kind, start, end, parts
+        pos = end
+
+def _inline_tokens(s: str, rel_dir: pathlib.Path, config: RenderConfig) -> str:
+    # Tokens become numbered slots, bold and italics are applied around them (as the passes do,
+    # so a '*' inside a formula or a link never closes them), then the slots are filled in
+    text, tokens, pos = [], [], 0
+    for kind, start, end, parts in _inline_scan(s):
+        text.append(s[pos:start])
+        if kind == 'math':
+            formula = s[start:end]
+            tokens.append(MATH_SPANS.wrap(formula, config.math_macros))
+            if _block_deps is not None:
+                _block_deps.append(('math', formula, None))
+        elif kind == 'wiki':
+            tokens.append(s[start:end] if config.links is None else _wikilink(parts[0], config))
+        elif kind == 'img':
+            tokens.append(_img_sub(parts[0], parts[1], rel_dir, config))
+        elif kind == 'link':
+            tokens.append(f'<a href="{parts[1]}">' + _inline_tokens(parts[0], rel_dir, config) + '</a>')
+        else:
+            tokens.append(f'<code>{parts[0]}</code>')
+        text.append(f'\x00{len(tokens) - 1}\x00')
+        pos = end
+    text.append(s[pos:])
+    text = EM_RE.sub(r'<em>\1</em>', STRONG_RE.sub(r'<strong>\1</strong>', ''.join(text)))
+    return TOKEN_SLOT_RE.sub(lambda m: tokens[int(m.group(1))], text) if tokens else text
+
+def _inline_passes(s: str, rel_dir: pathlib.Path, config: RenderConfig) -> str:
+    s = IMG_RE.sub(lambda m: _img_sub(m.group(1), m.group(2), rel_dir, config), s)
+    if config.links is not None:
+        s = WIKILINK_RE.sub(lambda m: _wikilink(m.group(1), config), s)
+    s = LINK_RE.sub(r'<a href="\2">\1</a>', s)
+    s = CODE_RE.sub(r'<code>\1</code>', s)
+    s = STRONG_RE.sub(r'<strong>\1</strong>', s)
+    return EM_RE.sub(r'<em>\1</em>', s)
+
+def _inline_html(s: str, rel_dir: pathlib.Path, config: RenderConfig) -> str:
+    if config.protect_math:
+        # NUL is not valid in HTML text (browsers show U+FFFD) and marks the lexer's token slots
+        return _inline_tokens(html.escape(s).replace('\x00', '\ufffd'), rel_dir, config)
+    return _inline_passes(html.escape(s), rel_dir, config)
+
+def _memo_key(s: str, rel_dir: pathlib.Path, config: RenderConfig) -> bytes:
+    # Includes how many eager image slots remain, since that decides loading="lazy"
+    eager = max(0, config.eager_images - _note_images)
+    shape = f'{rel_dir.as_posix()}\0{config.asset_base}\0{config.src_root}\0{config.media_root}\0{config.protect_math}\0{config.links is None}\0{config.math_macros is None}\0{eager}\0'
+    return hashlib.blake2b((shape + s).encode('utf-8'), digest_size=16).digest()
+
+def _replay(deps, config: RenderConfig) -> bool:
+    # Valid while every image and wikilink resolves as before; then record the block's formulas
+    # (image refs were recorded by the check)
+    for kind, name, value in deps:
+        if kind == 'img' and get_store(config.media_root).add(pathlib.Path(name)) != value:
+            return False
+        if kind == 'link' and config.links.get(name) != value:
+            return False
+    for kind, name, _ in deps:
+        if kind == 'math':
+            MATH_SPANS.wrap(name, config.math_macros)
+    return True
+
+def inline_html(s: str, rel_dir: pathlib.Path, config: RenderConfig) -> str:
+    global _block_deps, _note_images
+    if not config.memo_bytes or config.media_urls != 'hashed':
+        return _inline_html(s, rel_dir, config)
+    key = _memo_key(s, rel_dir, config)
+    hit = BLOCK_MEMO.get(key)
+    if hit is not None and _replay(hit[1], config):
+        _note_images += hit[2]
+        return hit[0]
+    _block_deps = deps = []
+    images = _note_images
+    try:
+        out = _inline_html(s, rel_dir, config)
+    finally:
+        _block_deps = None
+    BLOCK_MEMO.put(key, (out, deps, _note_images - images), len(out) + len(s) + sum(len(name) + len(value or '') for _, name, value in deps) + MEMO_OVERHEAD)
+    return out
+
+def iter_blocks(lines):
+    # Block structure of a note as (kind, level, text): 'raw' HTML lines, 'blank' lines, 'heading'
+    # (level 1-6), 'hr', list 'item' (level = depth) and 'para' (joined lines, emitted when a
+    # non-paragraph line or the end closes it)
+    para = []
+    for raw in lines:
+        line = raw.rstrip('\n')
+        if line.lstrip().startswith('<'):
+            block = ('raw', 0, line)
+        elif not line.strip():
+            block = ('blank', 0, '')
+        elif HEADING_RE.match(line):
+            m = HEADING_RE.match(line)
+            block = ('heading', len(m.group(1)), m.group(2))
+        elif HR_RE.match(line):
+            block = ('hr', 0, '')
+        elif BULLET_RE.match(line):
+            bm = BULLET_RE.match(line)
+            block = ('item', min(6, len(bm.group(1).replace('\t', '    '))//2), bm.group(3))
+        else:
+            para.append(line)
+            continue
+        if para:
+            yield 'para', 0, ' '.join(para).strip()
+            para = []
+        yield block
+    if para:
+        yield 'para', 0, ' '.join(para).strip()
+
+def iter_md_html(lines, rel_dir: pathlib.Path, config: RenderConfig):
+    # Yields one HTML fragment per block so a page can be streamed instead of built whole
+    global _note_images
+    _note_images = 0
+    list_stack, ids = [], set()
+    def set_list_depth(depth: int):
+        while len(list_stack) < depth:
+            list_stack.append('ul'); yield '<ul>'
+        while len(list_stack) > depth:
+            list_stack.pop(); yield '</ul>'
+    for kind, level, text in iter_blocks(lines):
+        if kind == 'para':
+            # A paragraph stays inside an open list until a non-item block closes it
+            yield '<p>' + inline_html(text, rel_dir, config) + '</p>'; continue
+        if kind == 'item':
+            yield from set_list_depth(level+1)
+            yield '<li>' + inline_html(text, rel_dir, config) + '</li>'; continue
+        yield from set_list_depth(0)
+        if kind == 'raw':
+            if config.math_macros is not None:
+                MATH_SPANS.note_raw(text)
+            yield text
+        elif kind == 'heading':
+            # Ids are heading slugs (repeats get -2, -3, ...), the anchors [[note#heading]] points at
+            base = hid = slugify(text)
+            n = 2
+            while hid in ids:
+                hid = f'{base}-{n}'; n += 1
+            ids.add(hid)
+            yield f'<h{level} id="{hid}">' + inline_html(text, rel_dir, config) + f'</h{level}>'
+        elif kind == 'hr':
+            yield '<hr>'
+    yield from set_list_depth(0)
+
+def md_to_html(md: str, rel_dir: pathlib.Path, config: RenderConfig) -> str:
+    return '\n'.join(iter_md_html(md.splitlines(), rel_dir, config))
+
+def split_front_matter(lines):
+    # (front matter lines or None, remaining lines); only a closed leading '---' block counts
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None or first.strip() != '---':
+        return None, itertools.chain(() if first is None else (first,), lines)
+    meta = []
+    for line in lines:
+        if line.strip() == '---':
+            return meta, lines
+        meta.append(line)
+    return None, iter([first, *meta])
+
+def front_matter_aliases(meta) -> list:
+    aliases, in_list = [], False
+    for line in meta or ():
+        m = ALIASES_RE.match(line)
+        if m:
+            value = m.group(1).strip()
+            in_list = not value
+            values = value[1:-1].split(',') if value.startswith('[') and value.endswith(']') else [value]
+            aliases += [v.strip().strip('\'"') for v in values if v.strip()]
+        elif in_list and line.lstrip().startswith('- '):
+            aliases.append(line.lstrip()[2:].strip().strip('\'"'))
+        else:
+            in_list = False
+    return aliases
+
+def _wikilink_targets(s: str, out: list) -> None:
+    for kind, _, _, parts in _inline_scan(s):
+        if kind == 'wiki':
+            note = split_wikilink(parts[0])[0]
+            if note:
+                out.append(link_key(note))
+        elif kind == 'link':
+            _wikilink_targets(parts[0], out)
+
+def note_links(lines):
+    # (front matter aliases, link_key of every [[target]] in order) as the renderer would see them
+    meta, lines = split_front_matter(lines)
+    targets = []
+    for kind, _, block in iter_blocks(lines):
+        if kind in ('para', 'heading', 'item'):
+            _wikilink_targets(block, targets)
+    return front_matter_aliases(meta), targets
+
+def note_body_lines(lines, title: str, label: str, drop_heading: str = 'title'):
+    # Front matter skipped; a leading H1 equal to the computed title is dropped (case-insensitive)
+    _, lines = split_front_matter(lines)
+    first = next(lines, None)
+    if first is not None and H1_RE.match(first):
+        heading = first[1:].strip()
+        if drop_heading == 'any' or heading.lower() == title.lower() or heading.lower() == label.lower():
+            first = None
+    if first is not None:
+        yield first
+    yield from lines
+
+def read_lines(md_path: pathlib.Path, errors: str = 'strict'):
+    # Source lines read lazily
+    with open(md_path, encoding='utf-8', errors=errors) as fh:
+        for raw in fh:
+            yield from raw.splitlines()
+
+def iter_note_lines(md_path: pathlib.Path, title: str, label: str, drop_heading: str = 'title'):
+    yield from note_body_lines(read_lines(md_path), title, label, drop_heading)
+
+def page_template(config: RenderConfig):
+    template = load_template(config.template)
+    return minify_template(template) if config.minify_html else template
+
+def _page_values(config: RenderConfig, title: str, content, slots: dict) -> dict:
+    values = { 'title': title, 'content': content, 'asset_base': config.asset_base, **config.slots, **(slots or {}) }
+    if config.minify_html:
+        for name, value in values.items():
+            values[name] = minify_html(value) if value.__class__ is str else map(minify_html, value)
+    return values
+
+def render_page(config: RenderConfig, title: str, content_html: str, slots: dict = None) -> str:
+    return page_template(config).render(**_page_values(config, title, content_html, slots))
+
+def write_page(template, config: RenderConfig, out_html: pathlib.Path, title: str, fragments, slots: dict) -> None:
+    # Streams the template with the body fragments; a failed render leaves no partial page, and
+    # an unchanged one keeps the old file (and its mtime)
+    tmp = out_html.with_name(out_html.name + '.tmp')
+    try:
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            template.stream(fh, **_page_values(config, title, fragments, slots))
+        existed = out_html.exists()
+        if existed and filecmp.cmp(tmp, out_html, shallow=False):
+            tmp.unlink()
+        else:
+            os.replace(tmp, out_html)
+            WRITTEN.note(out_html, existed)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+def render_one(job, config: RenderConfig, template=None):
+    src, out_html, title, label, slots = job
+    media = get_store(config.media_root)
+    media.take_refs()
+    MATH_SPANS.take()
+    start, media_start = time.perf_counter(), media.seconds
+    terms = NoteTerms(title) if config.search_terms else None
+    try:
+        lines = iter_note_lines(src, title, label, config.drop_heading)
+        if terms:
+            lines = terms.feed(lines)
+        rel_dir = src.relative_to(config.src_root).parent
+        fragments = iter_md_html(lines, rel_dir, config)
+        if config.math_macros is not None:
+            # The head depends on whether any formula is left for the browser
+            fragments = list(fragments)
+            if not MATH_SPANS.needs_client():
+                slots = { **(slots or {}), 'katex': '' }
+        write_page(template or page_template(config), config, out_html, title, fragments, slots)
+        if config.protect_math:
+            write_sidecar(out_html, MATH_SPANS.take())
+    except Exception as e:
+        return f'{type(e).__name__}: {e}', {}, media.take_updates(), {}, (time.perf_counter() - start, media.seconds - media_start)
+    return None, media.take_refs(), media.take_updates(), terms.terms if terms else {}, (time.perf_counter() - start, media.seconds - media_start)
+
+# Per-process batch state for worker processes: (config, template)
+_batch = None
+
+def _init_worker(config: RenderConfig, media_entries: dict):
+    global _batch
+    BLOCK_MEMO.resize(config.memo_bytes)
+    _batch = (config, page_template(config))
+    get_store(config.media_root).entries = media_entries
+
+def _render_in_worker(job):
+    # The files the job wrote go back with its result for the parent's WRITTEN
+    return render_one(job, *_batch), WRITTEN.take()
+
+def render_many(jobs, config: RenderConfig, workers: int = 1):
+    # workers=0 means one per CPU; results come back in job order either way
+    jobs = list(jobs)
+    workers = workers or os.cpu_count() or 1
+    BLOCK_MEMO.resize(config.memo_bytes)
+    if workers > 1 and len(jobs) > 1:
+        init = (config, get_store(config.media_root).entries)
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init) as pool:
+            for result, written in pool.map(_render_in_worker, jobs, chunksize=max(1, len(jobs) // (workers * 4))):
+                WRITTEN.merge(written)
+                results.append(result)
+        return results
+    template = page_template(config)
+    return [render_one(job, config, template) for job in jobs]
@@ -0,0 +1,94 @@
+"""Full-text search index built while notes are rendered.
+
+``NoteTerms.feed`` wraps a note's source lines and tokenizes them on the way
+through to the renderer: prose words, heading words (weighted higher) and TeX
+command names inside formulas (``\\alpha``, ``\\max``, ...). ``write_index``
+turns the per-note term weights into an inverted index sharded by term prefix:
+
+    <out>/index.json          {version, prefix_len, stopwords, docs: [[title, path]], shards}
+    <out>/<prefix>.json.gz    {term: [doc, weight, doc, weight, ...]}
+
+Postings are appended in document order, so construction is linear in the
+number of (note, term) pairs, and a query only downloads the shards for its
+terms' prefixes.
+"""
+import gzip, json, pathlib, re
+
+from .publish import remove, write_if_changed
+
+INDEX_VERSION = 1
+PREFIX_LEN = 2
+TITLE_WEIGHT, HEADING_WEIGHT, TEXT_WEIGHT, MATH_WEIGHT = 5, 3, 1, 1
+
+STOPWORDS = frozenset('an and are as at be by for from has if in into is it its of on or that the then this to was we with'.split())
+# Layout commands that say nothing about what a formula is about
+TEX_SKIP = frozenset('begin end left right big bigg frac dfrac tfrac text mathrm mathbf mathbb mathcal mathop operatorname '
+                     'displaystyle limits quad qquad cdot cdots ldots dots vdots ddots hline'.split())
+
+HEADING_RE = re.compile(r'^#{1,6}\s+(.*)$')
+MATH_RE = re.compile(r'\$\$.+?\$\$|\$.+?\$|\\\[.+?\\\]|\\\(.+?\\\)')
+TEX_CMD_RE = re.compile(r'\\([A-Za-z]{2,})')
+TEX_WORDS_RE = re.compile(r'\\(?:text|mathrm|operatorname|textbf)\{([^}]*)\}')
+LINK_RE = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+TAG_RE = re.compile(r'<[^>]+>')
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+def words(text: str):
+    return [w for w in WORD_RE.findall(text.lower()) if len(w) > 1 and w not in STOPWORDS]
+
+class NoteTerms:
+    def __init__(self, title: str):
+        # term -> summed weight for one note
+        self.terms = {}
+        self.add(words(title), TITLE_WEIGHT)
+
+    def add(self, tokens, weight: int) -> None:
+        terms = self.terms
+        for w in tokens:
+            terms[w] = terms.get(w, 0) + weight
+
+    def feed(self, lines):
+        # Pass the lines through unchanged, indexing each one on the way
+        for line in lines:
+            self.line(line)
+            yield line
+
+    def line(self, line: str) -> None:
+        m = HEADING_RE.match(line)
+        text, weight = (m.group(1), HEADING_WEIGHT) if m else (line, TEXT_WEIGHT)
+        for formula in MATH_RE.findall(text):
+            self.add([c.lower() for c in TEX_CMD_RE.findall(formula) if c not in TEX_SKIP], MATH_WEIGHT)
+            for inner in TEX_WORDS_RE.findall(formula):
+                self.add(words(inner), MATH_WEIGHT)
+        text = LINK_RE.sub(r'\1', MATH_RE.sub(' ', text))
+        self.add(words(TAG_RE.sub(' ', text)), weight)
+
+def write_index(out_dir: pathlib.Path, docs, doc_terms) -> int:
+    """Write the sharded index; docs is [[title, path]] aligned with doc_terms ({term: weight}).
+
+    Only shards whose bytes changed are rewritten and shards for vanished
+    prefixes are removed. Returns the number of files written or removed.
+    """
+    shards = {}
+    for doc_id, terms in enumerate(doc_terms):
+        for term, weight in terms.items():
+            postings = shards.setdefault(term[:PREFIX_LEN], {}).setdefault(term, [])
+            postings.append(doc_id); postings.append(weight)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    changed = 0
+    for prefix, shard in shards.items():
+        # mtime=0 keeps the gzip bytes reproducible so unchanged shards are left alone
+        data = gzip.compress(json.dumps(shard, separators=(',', ':')).encode('utf-8'), mtime=0)
+        changed += write_if_changed(out_dir / f'{prefix}.json.gz', data)
+    for path in out_dir.glob('*.json.gz'):
+        if path.name[:-len('.json.gz')] not in shards:
+            changed += remove(path)
+    meta = {
+        'version': INDEX_VERSION,
+        'prefix_len': PREFIX_LEN,
+        'stopwords': sorted(STOPWORDS),
+        'docs': docs,
+        'shards': sorted(shards),
+    }
+    changed += write_if_changed(out_dir / 'index.json', json.dumps(meta, separators=(',', ':')).encode('utf-8'))
+    return changed
@@ -0,0 +1,105 @@
+"""Tiny template engine shared by the site builders.
+
+Templates are plain HTML with ``{{name}}`` slots and ``{{> name}}`` partial
+includes; slot names may contain ``:./`` (e.g. ``{{asset:css/style.css}}``). Partials live in ``partials/<name>.html`` next to the top-level
+template and are inlined at parse time. A slot alone on its line takes the
+line (indentation and newline) with it when its value is empty. Each file is parsed once into literal
+and slot segments and cached until the mtime of the template or any partial
+it pulled in changes.
+"""
+import os, pathlib, re
+
+SLOT_RE = re.compile(r'\{\{(>?)\s*([\w:./-]+)\s*\}\}')
+
+class Template:
+    def __init__(self, segments):
+        # Literal segments are str; slots are (name, raw) so unknown slots render verbatim, or
+        # (name, raw, indent) for a slot alone on its line
+        self.segments = segments
+
+    def render(self, **values) -> str:
+        out = []
+        for seg in self.segments:
+            if seg.__class__ is str:
+                out.append(seg)
+                continue
+            value = values.get(seg[0], seg[1])
+            if len(seg) == 2:
+                out.append(value)
+            elif value:
+                out.append(f'{seg[2]}{value}\n')
+        return ''.join(out)
+
+    def stream(self, fh, **values) -> None:
+        # Like render(), but writes to fh; a non-str value is an iterable of fragments joined by newlines
+        for seg in self.segments:
+            if seg.__class__ is str:
+                fh.write(seg)
+                continue
+            value = values.get(seg[0], seg[1])
+            if len(seg) == 3:
+                if value == '':
+                    continue
+                fh.write(seg[2])
+            if value.__class__ is str:
+                fh.write(value)
+            else:
+                sep = ''
+                for fragment in value:
+                    fh.write(sep); fh.write(fragment)
+                    sep = '\n'
+            if len(seg) == 3:
+                fh.write('\n')
+
+_cache = {}
+
+def _parse(path: pathlib.Path, partials_dir: pathlib.Path, deps: dict, stack: tuple) -> list:
+    if path in stack:
+        raise ValueError(f'Recursive partial include: {path}')
+    deps[path] = os.stat(path).st_mtime_ns
+    text = path.read_text(encoding='utf-8')
+    # Partials are spliced inline, so their final newline is dropped
+    if path.parent.name == 'partials' and text.endswith('\n'):
+        text = text[:-1]
+    segments, pos = [], 0
+    for m in SLOT_RE.finditer(text):
+        segments.append(text[pos:m.start()])
+        if m.group(1):
+            segments += _parse(partials_dir / (m.group(2) + '.html'), partials_dir, deps, stack + (path,))
+            pos = m.end()
+            continue
+        line_start = text.rfind('\n', 0, m.start()) + 1
+        indent = text[line_start:m.start()]
+        # A partial's first line continues the including line, so it is not a line of its own
+        alone = line_start > 0 or path.parent.name != 'partials'
+        if alone and line_start >= pos and not indent.strip() and text.startswith('\n', m.end()):
+            segments[-1] = text[pos:line_start]
+            segments.append((m.group(2), m.group(0), indent))
+            pos = m.end() + 1
+        else:
+            segments.append((m.group(2), m.group(0)))
+            pos = m.end()
+    segments.append(text[pos:])
+    # Merge adjacent literals so rendering is a single pass over few segments
+    merged = []
+    for seg in segments:
+        if seg.__class__ is str and merged and merged[-1].__class__ is str:
+            merged[-1] += seg
+        elif seg != '':
+            merged.append(seg)
+    return merged
+
+def load_template(path) -> Template:
+    path = pathlib.Path(path)
+    hit = _cache.get(path)
+    if hit:
+        deps, tpl = hit
+        try:
+            if all(os.stat(p).st_mtime_ns == m for p, m in deps):
+                return tpl
+        except OSError:
+            pass
+    deps = {}
+    tpl = Template(_parse(path, path.parent / 'partials', deps, ()))
+    _cache[path] = (tuple(deps.items()), tpl)
+    return tpl
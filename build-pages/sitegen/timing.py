@@ -0,0 +1,35 @@
+"""Build phase timers and per-note durations for build-info.json."""
+import time
+
+SLOWEST_N = 10
+
+class PhaseTimer:
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.phases = {}
+
+    def lap(self, name: str) -> None:
+        # Charges the time since the previous lap (or the start) to `name`
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self.last
+        self.last = now
+
+    def report(self, note_times, slowest: int = SLOWEST_N) -> dict:
+        """note_times: (note, seconds, media_seconds) for each rendered note.
+
+        Note durations are measured inside the renderer, so with several
+        workers their sum exceeds the wall-clock 'render' phase.
+        """
+        total = sum(t for _, t, _ in note_times)
+        worst = sorted(note_times, key=lambda n: n[1], reverse=True)[:slowest]
+        return {
+            'total_s': round(time.perf_counter() - self.start, 4),
+            'phases_s': {name: round(s, 4) for name, s in self.phases.items()},
+            'notes': {
+                'rendered': len(note_times),
+                'render_s': round(total, 4),
+                'media_s': round(sum(m for _, _, m in note_times), 4),
+                'mean_ms': round(total / len(note_times) * 1e3, 3) if note_times else 0,
+            },
+            'slowest': [{ 'note': note, 'ms': round(t * 1e3, 3), 'media_ms': round(m * 1e3, 3) } for note, t, m in worst],
+        }
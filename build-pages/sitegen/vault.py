@@ -0,0 +1,102 @@
+"""In-memory model of an Obsidian vault built from a single os.scandir walk.
+
+Every directory is listed exactly once. The resulting tree of ``VaultDir`` and
+``VaultNote`` objects (with each note's size and mtime from the same walk)
+is what the builder reads for the manifest, sidebar, index pages and
+rendering, instead of re-listing directories with iterdir/rglob.
+Entries whose name starts with '.' (.obsidian, .trash, ...) are skipped, and
+symlinked directories are not followed. A long-lived process keeps the tree
+and calls ``refresh(tree, changed_paths)``, which re-lists only the
+directories holding the changed paths.
+"""
+import os, pathlib
+
+class VaultNote:
+    __slots__ = ('path', 'rel', 'size', 'mtime_ns')
+
+    def __init__(self, path: pathlib.Path, rel: pathlib.Path, size: int, mtime_ns: int):
+        self.path = path
+        self.rel = rel
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+class VaultDir:
+    __slots__ = ('path', 'rel', 'dirs', 'notes', 'children')
+
+    def __init__(self, path: pathlib.Path, rel: pathlib.Path):
+        self.path = path
+        # Relative to the vault root; Path('.') for the root itself
+        self.rel = rel
+        self.dirs = []
+        self.notes = []
+        # Subdirectories and notes together, sorted by name
+        self.children = []
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    def walk(self):
+        # This directory, then every descendant directory (pre-order, sorted by name)
+        yield self
+        for d in self.dirs:
+            yield from d.walk()
+
+    def iter_notes(self):
+        # All notes below this directory, in the same order as sorting their paths
+        for _, child in self.children:
+            if child.__class__ is VaultNote:
+                yield child
+            else:
+                yield from child.iter_notes()
+
+def _fill(top: VaultDir) -> VaultDir:
+    # (Re)list top and everything below it
+    top.dirs, top.notes, top.children = [], [], []
+    stack = [top]
+    while stack:
+        d = stack.pop()
+        try:
+            entries = os.scandir(d.path)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        child = VaultDir(pathlib.Path(entry.path), d.rel / entry.name)
+                        d.dirs.append(child)
+                        stack.append(child)
+                    elif entry.name.endswith('.md') and entry.is_file():
+                        st = entry.stat()
+                        child = VaultNote(pathlib.Path(entry.path), d.rel / entry.name, st.st_size, st.st_mtime_ns)
+                        d.notes.append(child)
+                    else:
+                        continue
+                except OSError:
+                    continue
+                d.children.append((entry.name, child))
+        d.dirs.sort(key=lambda c: c.path.name)
+        d.notes.sort(key=lambda c: c.path.name)
+        d.children.sort(key=lambda c: c[0])
+    return top
+
+def scan(root: pathlib.Path) -> VaultDir:
+    return _fill(VaultDir(root, pathlib.Path('.')))
+
+def refresh(top: VaultDir, paths) -> VaultDir:
+    # Re-list the nearest known directory of each changed (added, edited or deleted) path
+    known = {d.rel: d for d in top.walk()}
+    stale = set()
+    for path in paths:
+        rel = pathlib.Path(os.path.relpath(path, top.path)).parent
+        while rel not in known:
+            rel = rel.parent
+        stale.add(rel)
+    # A directory re-listed as part of a stale ancestor needs no pass of its own
+    for rel in stale:
+        if not any(other in rel.parents for other in stale):
+            _fill(known[rel])
+    return top
@@ -0,0 +1,124 @@
+// Service worker, written to sw.js by tools/build_site.py (edit templates/sw.js instead).
+// Precaches the shell listed in assets/precache.json, serves every listed URL from the cache,
+// prefetches the next page in reading order (and what it embeds) after each page view and, when
+// a new build is deployed, drops only the entries whose content hash changed.
+const VERSION = {{version}};
+const MANIFEST = {{manifest}};
+const SCOPE = {{scope}};
+// false on the development server: the worker removes itself and its caches
+const ENABLED = {{enabled}};
+const CACHE = 'mathematical-economics';
+// New and changed shell entries wait here between install and activate
+const NEXT = CACHE + '-next';
+// The manifest the cached entries match is stored with them
+const MANIFEST_KEY = SCOPE + '__precache__';
+
+let current = null;
+
+// Same-origin entries are keyed by path without the query string
+function key(url) {
+  const u = new URL(url, self.location.href);
+  if (u.origin !== self.location.origin) return u.href;
+  return u.pathname.endsWith('/') ? u.pathname + 'index.html' : u.pathname;
+}
+
+async function readManifest(cache) {
+  const res = await cache.match(MANIFEST_KEY);
+  return res ? res.json() : null;
+}
+
+async function active() {
+  if (!current) {
+    const m = await readManifest(await caches.open(CACHE));
+    if (!m) return null;
+    m.order = new Map(m.pages.map((page, i) => [page, i]));
+    // Pinned CDN files: everything under their directory (e.g. KaTeX fonts) is immutable too
+    m.remote = m.shell.filter(url => url.startsWith('https://')).map(url => url.slice(0, url.lastIndexOf('/') + 1));
+    current = m;
+  }
+  return current;
+}
+
+function listed(m, k) {
+  return k in m.hashes || m.remote.some(prefix => k.startsWith(prefix));
+}
+
+async function store(cache, k, res) {
+  if (res.ok && !res.redirected) await cache.put(k, res);
+}
+
+self.addEventListener('install', event => {
+  event.waitUntil((async () => {
+    if (ENABLED) {
+      const next = await (await fetch(MANIFEST + '?v=' + VERSION, { cache: 'no-cache' })).json();
+      const old = await readManifest(await caches.open(CACHE)) || { hashes: {} };
+      const staging = await caches.open(NEXT);
+      await Promise.all(next.shell.filter(url => old.hashes[url] !== next.hashes[url]).map(async url => {
+        const res = await fetch(url, { cache: 'no-cache' });
+        if (!res.ok) throw new Error(url + ': ' + res.status);
+        await staging.put(key(url), res);
+      }));
+      await staging.put(MANIFEST_KEY, new Response(JSON.stringify(next), { headers: { 'Content-Type': 'application/json' } }));
+    }
+    await self.skipWaiting();
+  })());
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil((async () => {
+    if (!ENABLED) {
+      const names = await caches.keys();
+      await Promise.all(names.filter(name => name.startsWith(CACHE)).map(name => caches.delete(name)));
+      await self.registration.unregister();
+      return;
+    }
+    const cache = await caches.open(CACHE), staging = await caches.open(NEXT);
+    const next = await readManifest(staging);
+    if (next) {
+      // Entries whose hash is unchanged stay cached; changed and removed ones are dropped
+      const old = await readManifest(cache);
+      if (old) {
+        await Promise.all(Object.keys(old.hashes).filter(url => old.hashes[url] !== next.hashes[url]).map(url => cache.delete(key(url))));
+      }
+      for (const req of await staging.keys()) await cache.put(req, await staging.match(req));
+    }
+    await caches.delete(NEXT);
+    current = null;
+    await self.clients.claim();
+  })());
+});
+
+async function prefetch(m, page, cache) {
+  if (!page) return;
+  for (const url of [page].concat(m.deps[page] || [])) {
+    if (await cache.match(key(url))) continue;
+    try {
+      await store(cache, key(url), await fetch(url));
+    } catch (e) {
+      return;
+    }
+  }
+}
+
+async function respond(event) {
+  const req = event.request;
+  const m = await active();
+  const k = key(req.url);
+  if (!m || !listed(m, k)) return fetch(req);
+  const cache = await caches.open(CACHE);
+  let res = await cache.match(k);
+  if (!res) {
+    res = await fetch(req);
+    await store(cache, k, res.clone());
+  }
+  // Reading is linear: fetch the next page while this one is read (not on Save-Data connections)
+  if (req.mode === 'navigate' && m.order.has(k) && req.headers.get('Save-Data') !== 'on') {
+    event.waitUntil(prefetch(m, m.pages[m.order.get(k) + 1], cache));
+  }
+  return res;
+}
+
+self.addEventListener('fetch', event => {
+  if (!ENABLED || event.request.method !== 'GET') return;
+  event.respondWith(respond(event));
+});
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""End-to-end checks of tools/build_site.py on a small synthetic vault (run: python3 -m unittest)."""
+import json, pathlib, subprocess, sys, tempfile, unittest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'tools'))
+sys.path.insert(0, str(ROOT / 'build-pages'))
+from bench_build import BOOK_REL, generate_vault, make_workspace
+from sitegen.render import slugify
+
+class FailingNoteTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        scratch = pathlib.Path(self.tmp.name)
+        generate_vault(scratch / 'vault', 20)
+        self.ws = make_workspace(scratch, scratch / 'vault')
+        section = sorted(p for p in (self.ws / BOOK_REL).iterdir() if p.is_dir())[0]
+        self.note = section / 'Broken Note.md'
+        self.page = self.ws / 'pages' / slugify(section.name) / 'broken-note.html'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self):
+        return subprocess.run([sys.executable, 'tools/build_site.py'], cwd=self.ws, capture_output=True, text=True)
+
+    def linked(self):
+        # Every output that lists or links pages, as one string
+        outputs = [self.ws / 'index.html', self.ws / 'assets' / 'site.json', self.ws / 'assets' / 'partials' / 'sidebar.html',
+                   self.ws / 'assets' / 'link-graph.json', self.ws / 'assets' / 'search' / 'index.json']
+        outputs += (self.ws / 'assets' / 'nav').glob('*.json')
+        outputs += (self.ws / 'pages').rglob('index*.html')
+        return '\n'.join(p.read_text(encoding='utf-8') for p in outputs)
+
+    def test_new_note_that_fails_is_left_out(self):
+        self.note.write_bytes(b'invalid \xff\xfe utf-8\n')
+        result = self.build()
+        self.assertIn('failed to render', result.stdout)
+        self.assertFalse(self.page.exists())
+        self.assertNotIn('broken-note', self.linked())
+        sections = json.loads((self.ws / 'assets' / 'site.json').read_text(encoding='utf-8'))
+        self.assertEqual(sum(len(s['pages']) for s in sections), 20)
+
+    def test_note_that_fails_later_keeps_its_page(self):
+        self.note.write_text('renders fine\n', encoding='utf-8')
+        self.build()
+        self.assertTrue(self.page.exists())
+        self.note.write_bytes(b'invalid \xff\xfe utf-8\n')
+        result = self.build()
+        self.assertIn('failed to render', result.stdout)
+        self.assertTrue(self.page.exists())
+        self.assertIn('broken-note', self.linked())
+
+if __name__ == '__main__':
+    unittest.main()
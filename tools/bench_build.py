@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Benchmark the site builders against synthetic vaults.
+
+Generates deterministic Obsidian-style vaults (nested "1 Optimizing Theory/1.1 ..."
+directories, math-dense paragraphs, nested bullets, image references), runs
+tools/build_site.py, build-pages/build.py and tools/prerender_from.py against
+each one in a scratch copy of the repo, and writes a JSON report with wall
+time, notes/s and peak RSS per run (cold, warm, one edit), plus the build's own
+phase timings (scan, render, nav, search, publish, ...) from build-info.json.
+Peak RSS is that of the largest single process, the builder or one of its
+--jobs workers; it is not their sum.
+
+Usage:
+  python3 tools/bench_build.py [--sizes 100,1000] [--out report.json]
+  python3 tools/bench_build.py --compare old.json new.json
+"""
+import argparse, json, os, pathlib, platform, random, shutil, struct, subprocess, sys, tempfile, time, zlib
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+BOOK_REL = pathlib.Path('mathematical-economics') / 'mathematical-economics-book'
+ASSET_BASE = '/mathematical-economics'
+REPORT_VERSION = 2
+
+SECTIONS = ['Optimizing Theory', 'Static Economic Models', 'Dynamic Models', 'Mathematical Reviews', 'Game Theory']
+WORDS = ('budget constraint utility demand price income optimal feasible set convex concave function '
+         'equilibrium market supply marginal rate substitution lagrangian multiplier objective').split()
+FORMULAS = [r'p_1x_1 + p_2x_2 \leq I', r'\max_{x \in \R^n} f(x)', r'\frac{\partial L}{\partial x_i} = 0',
+            r'g(x) = p \cdot x - I \leq 0', r'\E[X] = \sum_i p_i x_i', r'\nabla f(x^*) = \lambda \nabla g(x^*)',
+            r'\mathcal{L}(x, \lambda) = f(x) - \lambda g(x)', r'x_k \geq 0']
+
+def _png(width: int, height: int, shade: int) -> bytes:
+    # Smallest valid grayscale PNG; the shade makes each figure's bytes (and hash) distinct
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    rows = b''.join(b'\x00' + bytes([shade]) * width for _ in range(height))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+def _sentence(rng) -> str:
+    parts = []
+    for _ in range(rng.randint(6, 14)):
+        r = rng.random()
+        if r < 0.25:
+            parts.append('$' + rng.choice(FORMULAS) + '$')
+        elif r < 0.32:
+            parts.append('**' + rng.choice(WORDS) + '**')
+        elif r < 0.38:
+            parts.append('*' + rng.choice(WORDS) + '*')
+        else:
+            parts.append(rng.choice(WORDS))
+    text = ' '.join(parts)
+    # Only the first character: capitalize() would also lowercase the formulas (\R, \E, I, ...)
+    return text[:1].upper() + text[1:] + '.'
+
+def _note(rng, title: str, images) -> str:
+    lines = [f'# {title}', '']
+    for _ in range(rng.randint(2, 5)):
+        lines += [' '.join(_sentence(rng) for _ in range(rng.randint(2, 5))), '']
+        if rng.random() < 0.5:
+            lines += ['$$' + rng.choice(FORMULAS) + '$$', '']
+        if rng.random() < 0.6:
+            for depth in (0, 1, 2, 1, 0):
+                lines.append('  ' * depth + '- ' + _sentence(rng))
+            lines.append('')
+        if images and rng.random() < 0.3:
+            lines += [f'![figure](img/{rng.choice(images)})', '']
+        if rng.random() < 0.3:
+            lines += ['## ' + ' '.join(rng.choice(WORDS) for _ in range(3)), '']
+    return '\n'.join(lines) + '\n'
+
+def generate_vault(dest: pathlib.Path, notes: int, seed: int = 1) -> None:
+    """Write a deterministic vault of `notes` notes under dest (depth up to section/x.y/x.y.z)."""
+    rng = random.Random(seed)
+    per_leaf = 10
+    leaves = max(1, notes // per_leaf)
+    written = 0
+    for leaf in range(leaves):
+        s = leaf % len(SECTIONS) + 1
+        sub = leaf // len(SECTIONS) % 8 + 1
+        deep = leaf // (len(SECTIONS) * 8) + 1
+        parts = [f'{s} {SECTIONS[s - 1]}', f'{s}.{sub} {rng.choice(WORDS)} {rng.choice(WORDS)}'.strip()]
+        if deep > 1 or rng.random() < 0.5:
+            parts.append(f'{s}.{sub}.{deep} {rng.choice(WORDS)}')
+        leaf_dir = dest.joinpath(*parts)
+        leaf_dir.mkdir(parents=True, exist_ok=True)
+        images = []
+        if leaf % 3 == 0:
+            (leaf_dir / 'img').mkdir(exist_ok=True)
+            for i in range(2):
+                name = f'fig{i}.png'
+                (leaf_dir / 'img' / name).write_bytes(_png(32 + 8 * i, 24, (leaf * 7 + i) % 256))
+                images.append(name)
+        count = per_leaf if leaf < leaves - 1 else notes - written
+        for n in range(count):
+            number = '.'.join(p.split(' ', 1)[0] for p in parts[-1:]) + f'.{n + 1}'
+            title = f'{number} {rng.choice(WORDS)} {rng.choice(WORDS)}'
+            (leaf_dir / f'{title}.md').write_text(_note(rng, title, images), encoding='utf-8')
+        written += count
+
+def make_workspace(scratch: pathlib.Path, vault: pathlib.Path) -> pathlib.Path:
+    # A copy of the repo's code and templates with the synthetic vault in place of the book
+    ws = scratch / 'repo'
+    if ws.exists():
+        shutil.rmtree(ws)
+    ignore = shutil.ignore_patterns('.git', 'pages', '__pycache__', 'media', 'search', 'build-cache.json', '.build-ir', '.dev-site', BOOK_REL.name)
+    shutil.copytree(ROOT, ws, ignore=ignore)
+    shutil.copytree(vault, ws / BOOK_REL)
+    return ws
+
+def run(cmd, cwd: pathlib.Path) -> dict:
+    # wait4's peak RSS covers the child and the workers it waited for, as the largest of them
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    err = proc.stderr.read().decode('utf-8', 'replace').strip()
+    proc.stderr.close()
+    return { 'wall_s': wall, 'peak_rss_kb': usage.ru_maxrss, 'exit': proc.returncode, 'stderr': err[-500:] }
+
+def touch_one_note(ws: pathlib.Path) -> None:
+    note = min((ws / BOOK_REL).rglob('*.md'))
+    with open(note, 'a', encoding='utf-8') as fh:
+        fh.write('\nEdited for the benchmark: $x^2$.\n')
+
+def build_phases(info: pathlib.Path) -> dict:
+    # The builder's PhaseTimer laps (timings.phases_s of its build-info.json), if it writes one
+    try:
+        return json.loads(info.read_text(encoding='utf-8'))['timings']['phases_s']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def runs(builder: str, ws: pathlib.Path, jobs: int):
+    # (run, command, prepare, build-info.json) in run order; build_site also gets warm and one-edit
+    # rebuilds, build_pages a warm rebuild from its cached note IRs
+    py = sys.executable
+    vault = str(ws / BOOK_REL)
+    if builder == 'build_site':
+        cmd = [py, 'tools/build_site.py', '--jobs', str(jobs)]
+        info = ws / 'assets' / 'build-info.json'
+        yield 'cold', cmd + ['--clean'], None, info
+        yield 'warm', cmd, None, info
+        yield 'one-edit', cmd, touch_one_note, info
+    elif builder == 'build_pages':
+        cmd = [py, 'build-pages/build.py', '--book', vault, '--asset-base', ASSET_BASE,
+               '--out', str(ws / 'bp-out' / 'pages'), '--assets', str(ws / 'bp-out' / 'assets'), '--jobs', str(jobs)]
+        info = ws / 'bp-out' / 'assets' / 'build-info.json'
+        yield 'cold', cmd, None, info
+        yield 'warm', cmd, None, info
+    elif builder == 'prerender':
+        yield 'cold', [py, 'tools/prerender_from.py', vault], None, None
+    else:
+        raise SystemExit(f'Unknown builder: {builder}')
+
+def bench(sizes, builders, jobs: int, repeat: int, keep: bool) -> dict:
+    scratch = pathlib.Path(tempfile.mkdtemp(prefix='me-bench-'))
+    results = []
+    try:
+        for size in sizes:
+            vault = scratch / f'vault-{size}'
+            t0 = time.perf_counter()
+            generate_vault(vault, size)
+            print(f'Generated {size} notes in {time.perf_counter() - t0:.1f}s', file=sys.stderr)
+            for builder in builders:
+                samples = {}
+                for _ in range(repeat):
+                    ws = make_workspace(scratch, vault)
+                    for name, cmd, prepare, info in runs(builder, ws, jobs):
+                        if prepare:
+                            prepare(ws)
+                        result = run(cmd, ws)
+                        result['phases_s'] = build_phases(info) if info else {}
+                        samples.setdefault(name, []).append(result)
+                for name, tries in samples.items():
+                    best = min(tries, key=lambda r: r['wall_s'])
+                    row = {
+                        'size': size, 'builder': builder, 'run': name,
+                        'wall_s': round(best['wall_s'], 4),
+                        'notes_per_s': round(size / best['wall_s'], 1) if best['wall_s'] else None,
+                        'peak_rss_kb': max(r['peak_rss_kb'] for r in tries),
+                        'phases_s': best['phases_s'],
+                        'exit': max((r['exit'] for r in tries), key=abs),
+                    }
+                    if row['exit']:
+                        row['stderr'] = next(r['stderr'] for r in tries if r['exit'])
+                    results.append(row)
+                    print(f'{size:>7} {builder:<12}{name:<10}{row["wall_s"]:>9.3f}s {row["notes_per_s"] or 0:>10.1f} notes/s '
+                          f'{row["peak_rss_kb"] / 1024:>8.1f} MiB peak (largest process)' + (f'  exit {row["exit"]}' if row['exit'] else ''), file=sys.stderr)
+                    if row['phases_s']:
+                        print(' ' * 8 + '  '.join(f'{phase} {s:.3f}' for phase, s in row['phases_s'].items()), file=sys.stderr)
+    finally:
+        if keep:
+            print(f'Kept scratch dir {scratch}', file=sys.stderr)
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'version': REPORT_VERSION,
+        'meta': {
+            'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'jobs': jobs,
+            'repeat': repeat,
+            'peak_rss': 'largest single process (the builder or one of its workers), not their sum',
+        },
+        'results': results,
+    }
+
+def compare(old_path: str, new_path: str) -> int:
+    old = json.loads(pathlib.Path(old_path).read_text(encoding='utf-8'))
+    new = json.loads(pathlib.Path(new_path).read_text(encoding='utf-8'))
+    # Version 1 reports called the run 'phase' and had no build phases
+    key = lambda r: (r['size'], r['builder'], r.get('run', r.get('phase')))
+    before = {key(r): r for r in old['results']}
+    print(f'{"size":>7} {"builder":<12}{"run":<10}{"old s":>9}{"new s":>9}{"speedup":>9}{"RSS MiB":>17}')
+    for r in new['results']:
+        size, builder, name = key(r)
+        o = before.get(key(r))
+        if not o:
+            print(f'{size:>7} {builder:<12}{name:<10}{"-":>9}{r["wall_s"]:>9.3f}')
+            continue
+        speedup = o['wall_s'] / r['wall_s'] if r['wall_s'] else float('inf')
+        rss = f'{o["peak_rss_kb"] / 1024:.1f} -> {r["peak_rss_kb"] / 1024:.1f}'
+        print(f'{size:>7} {builder:<12}{name:<10}{o["wall_s"]:>9.3f}{r["wall_s"]:>9.3f}{speedup:>8.2f}x{rss:>17}')
+        old_phases = o.get('phases_s', {})
+        for phase, t in r.get('phases_s', {}).items():
+            if phase in old_phases:
+                print(f'{"":>8}{"  " + phase:<22}{old_phases[phase]:>9.3f}{t:>9.3f}')
+    return 0
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--sizes', default='100,1000', help='Comma-separated vault sizes in notes (e.g. 100,1000,10000,50000)')
+    ap.add_argument('--builders', default='build_site,build_pages,prerender', help='Comma-separated subset of build_site,build_pages,prerender')
+    ap.add_argument('--jobs', '-j', type=int, default=1, help='--jobs passed to builders that support it')
+    ap.add_argument('--repeat', type=int, default=1, help='Runs per builder; the fastest is reported')
+    ap.add_argument('--out', help='Write the JSON report here (default: stdout)')
+    ap.add_argument('--keep', action='store_true', help='Keep the scratch directory with vaults and outputs')
+    ap.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two reports instead of running')
+    args = ap.parse_args(argv)
+    if args.compare:
+        return compare(*args.compare)
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    report = bench(sizes, [b for b in args.builders.split(',') if b], args.jobs, args.repeat, args.keep)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        pathlib.Path(args.out).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+    return 1 if any(r['exit'] for r in report['results']) else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: single-pass inline lexer vs the old regex cascade.
+
+Usage: python3 tools/bench_inline.py [--repeat N]
+"""
+import argparse, pathlib, re, html, timeit
+
+import build_site
+from sitegen.render import inline_html
+
+def inline_html_cascade(s: str) -> str:
+    # The pre-lexer implementation (escape, 4 math passes, 5 markup passes, restore loop)
+    s = html.escape(s)
+    math_tokens = []
+    def protect(pattern, text):
+        def _rep(m):
+            math_tokens.append(m.group(0))
+            return f"@@MATH{len(math_tokens)-1}@@"
+        return re.sub(pattern, _rep, text, flags=re.S)
+    s = protect(r"\$\$(.+?)\$\$", s)
+    s = protect(r"\$(.+?)\$", s)
+    s = protect(r"\\\[(.+?)\\\]", s)
+    s = protect(r"\\\((.+?)\\\)", s)
+    s = re.sub(r'!\[([^\]]*)\]\(([^\)]+)\)', r'<img src="\2" alt="\1">', s)
+    s = re.sub(r'\[([^\]]+)\]\(([^\)]+)\)', r'<a href="\2">\1</a>', s)
+    s = re.sub(r'`([^`]+)`', r'<code>\1</code>', s)
+    s = re.sub(r'\*\*([^*]+)\*\*', r'<strong>\1</strong>', s)
+    s = re.sub(r'(?<!\*)\*([^*]+)\*(?!\*)', r'<em>\1</em>', s)
+    for i, tok in enumerate(math_tokens):
+        s = s.replace(f"@@MATH{i}@@", tok)
+    return s
+
+def unwrap_math(s: str) -> str:
+    # The lexer tags formulas for the math sidecar; the cascade predates that
+    return re.sub(r'<span class="math" data-h="\w+">(.*?)</span>', r'\1', s)
+
+def sample_paragraphs():
+    # Real 1.1.x notes joined into paragraphs, plus synthetic math-dense ones
+    cases = {}
+    notes = sorted(build_site.BOOK.rglob('1.1.*.md'))
+    if notes:
+        text = ' '.join(line.strip().lstrip('-').strip() for p in notes for line in p.read_text(encoding='utf-8').splitlines() if line.strip())
+        cases['vault 1.1.x notes'] = text
+    unit = r'**budget** $p_1x_1 + p_2x_2 \leq I$, *so* $g(x) = p \cdot x - I \leq 0$ and \(x_k \geq 0\), '
+    for n in (10, 100, 1000):
+        cases[f'synthetic x{n}'] = unit * n + r'$$\max_x f(x)$$ [ref](https://example.com)'
+    # Emphasis around formulas that contain '*', and a lone '$' inside bold
+    cases['emphasis + math'] = (r'the *optimum $x^*$ is* unique; **Note: $x^*$ and $y^*$** hold; '
+                                r'*at \(p^*\) and $$q^*$$* too; **costs $5** and *$a*b$*')
+    # Italics right after bold; unclosed formula and link openers inside emphasis (each scanned once)
+    cases['strong then em'] = '**a***b* and ***c*** then **d**e*'
+    cases['unclosed \\( \\[ x500'] = r'*x \(y* **u \[v** ' * 500
+    return cases
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+    rel_dir = pathlib.Path('.')
+    print(f'{"case":<22}{"chars":>9}{"cascade ms":>13}{"lexer ms":>11}{"speedup":>9}  same')
+    for name, text in sample_paragraphs().items():
+        number = max(1, 20000 // max(1, len(text) // 50))
+        old = min(timeit.repeat(lambda: inline_html_cascade(text), number=number, repeat=args.repeat)) / number
+        new = min(timeit.repeat(lambda: inline_html(text, rel_dir, build_site.RENDER), number=number, repeat=args.repeat)) / number
+        same = inline_html_cascade(text) == unwrap_math(inline_html(text, rel_dir, build_site.RENDER))
+        print(f'{name:<22}{len(text):>9}{old * 1e3:>13.3f}{new * 1e3:>11.3f}{old / new:>8.1f}x  {"yes" if same else "NO"}')
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
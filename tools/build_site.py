@@ -1,209 +1,122 @@
 #!/usr/bin/env python3
-import pathlib, re, html, json, shutil
+import argparse, cProfile, dataclasses, hashlib, itertools, os, pathlib, re, html, json, shutil, sys, time
 from datetime import datetime, timezone
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'build-pages'))
+from sitegen.assets import bundle_css, fingerprint, load_asset_map, precompress, prune_gzip, style_links
+from sitegen.links import backlinks_html, link_graph, link_index, write_link_graph
+from sitegen.mathml import load_macros
+from sitegen.mathspans import DELIM_RE, sidecar_path
+from sitegen.media import get_store
+from sitegen.minify import minify_html
+from sitegen.offline import file_hashes, precache_manifest, remote_urls, write_precache, write_service_worker
+from sitegen.publish import WRITTEN, Stage, remove, write_if_changed, written_delta
+from sitegen.render import BLOCK_MEMO, MATH_SPANS, RenderConfig, iter_md_html, iter_note_lines, note_body_lines, note_links, note_title, read_lines, render_many, render_page, slugify
+from sitegen.search import write_index as write_search_index
+from sitegen.templates import load_template
+from sitegen.timing import PhaseTimer
+from sitegen.vault import VaultDir, refresh as refresh_vault, scan as scan_vault
+
 BOOK = ROOT / 'mathematical-economics' / 'mathematical-economics-book'
-PAGES = ROOT / 'pages'
-PARTIALS = ROOT / 'assets' / 'partials'
-TEMPLATE = ROOT / 'templates' / 'section.html'
+TEMPLATES = ROOT / 'templates'
+TEMPLATE = TEMPLATES / 'section.html'
+INDEX_TEMPLATE = TEMPLATES / 'index.html'
+# The KaTeX includes, filled into section.html's {{katex}} slot unless a page needs no KaTeX
+KATEX_PARTIAL = TEMPLATES / 'partials' / 'katex.html'
+MATH_JS = ROOT / 'assets' / 'js' / 'math.js'
+SITEGEN = ROOT / 'build-pages' / 'sitegen'
+DAEMON_SOCKET = ROOT / '.build.sock'
+SW_TEMPLATE = TEMPLATES / 'sw.js'
+# Where --watch builds and serves its development site, so the committed outputs are never touched
+DEV_SITE = ROOT / '.dev-site'
+# Hand-written stylesheets, scripts and images under assets/, copied into the development site
+STATIC_DIRS = ('css', 'js', 'img')
 
 ASSET_BASE = '/mathematical-economics'
 BUILDER_NAME = 'in-repo-builder'
 BUILDER_VERSION = 'local'
+CACHE_VERSION = 5
+# Entries (subsections + pages) per directory index page; longer listings continue on index.2.html, ...
+INDEX_PAGE_SIZE = 50
+# Block memo budget for --watch, in MiB: a rebuild after an edit re-renders only the changed blocks
+MEMO_MB = 64
 
-def slugify(s: str) -> str:
-    s = s.strip().lower()
-    # replace non-alnum with hyphen
-    s = re.sub(r'[^a-z0-9]+', '-', s)
-    s = re.sub(r'-{2,}', '-', s).strip('-')
-    return s or 'index'
-
-def split_num_label(name: str):
-    m = re.match(r'^(\d+(?:\.\d+)*)\s+(.+)$', name.strip())
-    if m:
-        return m.group(1), m.group(2)
-    return '', name.strip()
-
-def _is_abs_url(u: str) -> bool:
-    return bool(re.match(r'^(?:[a-z]+:)?//', u)) or u.startswith('data:') or u.startswith('/')
-
-def inline_html(s: str, rel_dir: pathlib.Path, src_root: pathlib.Path) -> str:
-    s = html.escape(s)
-    # Protect math spans from other substitutions
-    math_tokens = []
-    def protect(pattern, text):
-        def _rep(m):
-            math_tokens.append(m.group(0))
-            return f"@@MATH{len(math_tokens)-1}@@"
-        return re.sub(pattern, _rep, text, flags=re.S)
-    # Order matters: handle $$ first, then $; then \[ \] and \( \)
-    s = protect(r"\$\$(.+?)\$\$", s)
-    s = protect(r"\$(.+?)\$", s)
-    s = protect(r"\\\[(.+?)\\\]", s)
-    s = protect(r"\\\((.+?)\\\)", s)
-    # images ![alt](src)
-    def _img_sub(m):
-        alt = m.group(1); src = m.group(2)
-        if _is_abs_url(src):
-            new_src = src
-        else:
-            src_path = (src_root / rel_dir / src).resolve()
-            dest_path = (ROOT / 'assets' / 'media' / rel_dir / src).resolve()
-            dest_path.parent.mkdir(parents=True, exist_ok=True)
-            try:
-                if src_path.exists():
-                    dest_path.write_bytes(src_path.read_bytes())
-            except Exception:
-                pass
-            new_src = f"{ASSET_BASE}/assets/media/{rel_dir.as_posix()}/{src}"
-        return f'<img src="{new_src}" alt="{alt}">'
-    s = re.sub(r'!\[([^\]]*)\]\(([^\)]+)\)', _img_sub, s)
-    # links [text](url)
-    s = re.sub(r'\[([^\]]+)\]\(([^\)]+)\)', r'<a href="\2">\1</a>', s)
-    # code `...`
-    s = re.sub(r'`([^`]+)`', r'<code>\1</code>', s)
-    # bold/italics
-    s = re.sub(r'\*\*([^*]+)\*\*', r'<strong>\1</strong>', s)
-    s = re.sub(r'(?<!\*)\*([^*]+)\*(?!\*)', r'<em>\1</em>', s)
-    # Restore math tokens
-    for i, tok in enumerate(math_tokens):
-        s = s.replace(f"@@MATH{i}@@", tok)
-    return s
-
-def md_to_html(md: str, rel_dir: pathlib.Path, src_root: pathlib.Path) -> str:
-    lines = md.splitlines()
-    out, para = [], []
-    list_stack = []
-    bullet_re = re.compile(r'^([ \t]*)([-\*])\s+(.*)$')
-    def flush_para():
-        nonlocal para
-        if para:
-            out.append('<p>' + inline_html(' '.join(para).strip(), rel_dir, src_root) + '</p>')
-            para = []
-    def set_list_depth(depth: int):
-        while len(list_stack) < depth:
-            out.append('<ul>'); list_stack.append('ul')
-        while len(list_stack) > depth:
-            out.append('</ul>'); list_stack.pop()
-    for raw in lines:
-        line = raw.rstrip('\n')
-        if line.lstrip().startswith('<'):
-            flush_para(); set_list_depth(0); out.append(line); continue
-        if not line.strip():
-            flush_para(); set_list_depth(0); continue
-        m = re.match(r'^(#{1,6})\s+(.*)$', line)
-        if m:
-            flush_para(); set_list_depth(0)
-            level = len(m.group(1)); text = inline_html(m.group(2), rel_dir, src_root)
-            out.append(f'<h{level}>' + text + f'</h{level}>'); continue
-        if re.match(r'^-{3,}\s*$', line):
-            flush_para(); set_list_depth(0); out.append('<hr>'); continue
-        bm = bullet_re.match(line)
-        if bm:
-            flush_para()
-            indent = bm.group(1).replace('\t', '    ')
-            depth = min(6, len(indent)//2)
-            set_list_depth(depth+1)
-            out.append('<li>' + inline_html(bm.group(3), rel_dir, src_root) + '</li>'); continue
-        para.append(line)
-    flush_para(); set_list_depth(0)
-    return '\n'.join(out)
-
-# Titles come from filenames; content headings are rendered in-body.
-
-def render_page(title: str, content_html: str) -> str:
-    tpl = TEMPLATE.read_text(encoding='utf-8')
-    return tpl.replace('{{title}}', title).replace('{{content}}', content_html)
-
-def build_manifest():
-    sections = {}
-    # Include all top-level directories as sections, even if empty
-    for entry in sorted(BOOK.iterdir()):
-        if entry.is_dir() and not entry.name.startswith('.'):
-            sections.setdefault(entry.name, [])
-    # Attach any Markdown files to their top-level section
-    for md_path in BOOK.rglob('*.md'):
-        try:
-            rel = md_path.relative_to(BOOK)
-        except Exception:
-            continue
-        parts = list(rel.parts)
-        if not parts:
-            continue
-        section_key = parts[0]
-        sections.setdefault(section_key, []).append(md_path)
-    # sort each section's pages by path
-    for k in list(sections.keys()):
-        sections[k] = sorted(sections[k])
+# Per-build records: not site content, never compressed or listed in the delta
+BUILD_RECORDS = ('build-cache.json', 'build-info.json', 'build-delta.json')
+SITE_RECORDS = {f'assets/{name}' for name in BUILD_RECORDS}
+
+def use_site(site: pathlib.Path) -> None:
+    # Points every generated output at site (the repo itself unless --watch); sources are still
+    # read from the repo
+    global SITE, PAGES, PARTIALS, MEDIA_ROOT, CACHE, SEARCH, NAV, LINK_GRAPH, DELTA, ASSET_MAP, PRECACHE, SERVICE_WORKER, CSS_BUNDLE, CRITICAL_CSS, SITE_OUTPUTS, RENDER
+    SITE = site
+    PAGES = site / 'pages'
+    PARTIALS = site / 'assets' / 'partials'
+    MEDIA_ROOT = site / 'assets' / 'media'
+    CACHE = site / 'assets' / 'build-cache.json'
+    SEARCH = site / 'assets' / 'search'
+    NAV = site / 'assets' / 'nav'
+    LINK_GRAPH = site / 'assets' / 'link-graph.json'
+    DELTA = site / 'assets' / 'build-delta.json'
+    ASSET_MAP = site / 'assets' / 'asset-map.json'
+    PRECACHE = site / 'assets' / 'precache.json'
+    SERVICE_WORKER = site / 'sw.js'
+    CSS_BUNDLE = site / 'assets' / 'css' / 'bundle.css'
+    CRITICAL_CSS = PARTIALS / 'critical.css'
+    SITE_OUTPUTS = (site / 'index.html', site / 'index.html.gz', SERVICE_WORKER, site / 'sw.js.gz', PAGES, site / 'assets')
+    # How vault notes render: formulas protected (with sidecars), hashed media, search terms collected
+    RENDER = RenderConfig(src_root=BOOK, template=TEMPLATE, asset_base=ASSET_BASE, media_root=MEDIA_ROOT, search_terms=True)
+
+use_site(ROOT)
+
+# Empty sidebar/prev-next slots: site-nav.js fills them in the browser
+NO_NAV = { 'sidebar': '', 'section_nav': '' }
+
+# Kept between builds of a long-lived process (watch mode, the daemon): the cache as last written
+# (reused while the file is unchanged) and what previews need from the last build
+_warm = {}
+
+def media_unchanged(media, refs) -> bool:
+    # A reused page stays valid only while each image it embeds maps to the same blob
+    ok = all(media.add(pathlib.Path(src)) == blob for src, blob in refs.items())
+    media.take_refs()
+    return ok
+
+def build_manifest(vault):
+    # Every top-level directory is a section (even if empty), holding all notes below it;
+    # a note directly under the book becomes a section of its own
+    sections = [(d.name, d, list(d.iter_notes())) for d in vault.dirs]
+    sections += [(n.path.name, VaultDir(n.path, n.rel), [n]) for n in vault.notes]
     return sections
 
-def main():
-    if not BOOK.exists():
-        print('Book directory not found:', BOOK)
-        return 1
-    # Clean pages output for a fresh build
-    if PAGES.exists():
-        shutil.rmtree(PAGES)
-    PAGES.mkdir(parents=True, exist_ok=True)
-
-    manifest = []
-    sidebar_data = []
-    sections = build_manifest()
-    for sect_label, files in sections.items():
+def page_set(scanned, excluded=frozenset()):
+    # Manifest, sidebar model, directory index pages and note records from the scanned sections,
+    # leaving out the notes in `excluded`
+    manifest, sidebar_data, dir_indexes, notes = [], [], [], []
+    for sect_label, sect_dir, records in scanned:
         sect_slug = slugify(sect_label)
-        sect_out_dir = PAGES / sect_slug
-        sect_out_dir.mkdir(parents=True, exist_ok=True)
         sect_entry = { 'label': sect_label, 'slug': sect_slug, 'pages': [] }
         # Track pages grouped by directory (relative to BOOK)
         pages_by_dir = {}
-        for md_path in files:
-            rel = md_path.relative_to(BOOK)
-            # Build slugged output path mirroring directories; stem for filename
-            out_dirs = [slugify(p) for p in rel.parts[:-1]]
-            name_slug = slugify(md_path.stem)
-            out_html = PAGES.joinpath(*(out_dirs + [name_slug + '.html']))
-            out_html.parent.mkdir(parents=True, exist_ok=True)
-            md = md_path.read_text(encoding='utf-8')
-            # Title from filename (preserve case) with numeric prefix if present
-            num, label = split_num_label(md_path.stem)
-            title = (num + ' ' if num else '') + label
-            # Drop a leading H1 if it equals the computed title (case-insensitive)
-            md_lines = md.splitlines()
-            if md_lines and re.match(r'^#\s+.+', md_lines[0]):
-                first = re.sub(r'^#\s+', '', md_lines[0]).strip()
-                if first.lower() == title.lower() or first.lower() == label.lower():
-                    md_lines = md_lines[1:]
-                md = '\n'.join(md_lines)
-            rel_dir = rel.parent
-            content = md_to_html(md, rel_dir, BOOK)
-            html_page = render_page(title, content)
-            out_html.write_text(html_page, encoding='utf-8')
-            url_path = f"/pages/{'/'.join(out_dirs + [name_slug + '.html'])}"
+        for rel, record in records:
+            if record[5] in excluded:
+                continue
+            title, url_path = record[2], record[4]
+            notes.append(record)
             sect_entry['pages'].append({ 'title': title, 'path': url_path })
             # Group pages under their parent directory (relative path)
-            parent_dir = rel.parent
-            pages_by_dir.setdefault(parent_dir, []).append({ 'title': title, 'path': url_path })
-            print(f'Rendered {md_path} -> {out_html}')
+            pages_by_dir.setdefault(rel.parent, []).append({ 'title': title, 'path': url_path })
         manifest.append(sect_entry)
 
         # Build sidebar model for this section (children + pages)
-        src_section_dir = BOOK / sect_label
-        # Map of relative dir -> pages
-        root_rel = src_section_dir.relative_to(BOOK)
-        root_pages = pages_by_dir.get(root_rel, [])
-        try:
-            child_dirs = [d for d in sorted(src_section_dir.iterdir()) if d.is_dir() and not d.name.startswith('.')]
-        except Exception:
-            child_dirs = []
+        root_pages = pages_by_dir.get(sect_dir.rel, [])
         children = []
-        for c in child_dirs:
-            child_rel = c.relative_to(BOOK)
-            child_slug = slugify(c.name)
+        for c in sect_dir.dirs:
             children.append({
                 'label': c.name,
-                'slug': child_slug,
-                'pages': pages_by_dir.get(child_rel, [])
+                'slug': slugify(c.name),
+                'pages': pages_by_dir.get(c.rel, [])
             })
         sidebar_data.append({
             'label': sect_label,
@@ -212,48 +125,497 @@ def main():
             'children': children,
         })
 
-        # Create index pages for the entire directory tree under this section
-        # Collect all directories recursively (including empty)
-        all_dirs = []
-        for d in src_section_dir.rglob('*'):
-            if d.is_dir() and not d.name.startswith('.'):
-                all_dirs.append(d)
-        # Ensure root section dir is included first
-        all_dirs = [src_section_dir] + all_dirs
-
-        for d in all_dirs:
-            rel_dir = d.relative_to(BOOK)  # e.g., '1 Optimizing Theory/1.2 linear programming'
-            # Output folder path under pages/
+        # Index pages for the entire directory tree under this section (including empty
+        # directories); the section root comes first
+        for d in sect_dir.walk():
+            rel_dir = d.rel  # e.g., '1 Optimizing Theory/1.2 linear programming'
+            # Output folder path under pages/ (also holds this directory's notes)
             out_dir = PAGES.joinpath(*[slugify(p) for p in rel_dir.parts])
-            out_dir.mkdir(parents=True, exist_ok=True)
-            # Build content listing immediate subdirectories and pages in this dir
-            # Subdirectories
-            try:
-                child_dirs = [c for c in sorted(d.iterdir()) if c.is_dir() and not c.name.startswith('.')]
-            except Exception:
-                child_dirs = []
-            sub_links = ''
-            if child_dirs:
-                items = []
-                for c in child_dirs:
-                    child_rel = c.relative_to(BOOK)
-                    child_out = '/'.join([slugify(p) for p in child_rel.parts])
-                    items.append(f'<li><a href="{ASSET_BASE}/pages/{child_out}/index.html">{html.escape(c.name)}</a></li>')
-                sub_links = '<h2>Subsections</h2>\n<ul>\n' + '\n'.join(items) + '\n</ul>'
-            # Pages in this dir (from pages_by_dir)
-            dir_key = rel_dir
-            page_links = ''
-            if dir_key in pages_by_dir:
-                items = [f'<li><a href="{ASSET_BASE}{p["path"]}">{html.escape(p["title"])}</a></li>' for p in pages_by_dir[dir_key]]
-                page_links = '<h2>Pages</h2>\n<ul>\n' + '\n'.join(items) + '\n</ul>'
-            body_parts = [part for part in [sub_links, page_links] if part]
-            sec_body = '\n<hr>\n'.join(body_parts) if body_parts else '<p>Coming soon.</p>'
             title = rel_dir.name if rel_dir.parts else sect_label
-            (out_dir / 'index.html').write_text(render_page(title, sec_body), encoding='utf-8')
+            dir_indexes.append((rel_dir, out_dir, title, d.dirs, pages_by_dir.get(rel_dir)))
+    return manifest, sidebar_data, dir_indexes, notes
+
+def sidebar_section_html(sect) -> str:
+    # One section's pages and subsections: the body of its sidebar shard
+    sidebar = []
+    # List any pages directly under the section root
+    if sect.get('root_pages'):
+        sidebar.append('    <ul style="margin:6px 0 10px 16px; padding:0; list-style: none;">')
+        for p in sect['root_pages']:
+            sidebar.append(f'      <li><a href="{ASSET_BASE}{p["path"]}">{html.escape(p["title"])}</a></li>')
+        sidebar.append('    </ul>')
+    # List subsections and their pages
+    if sect.get('children'):
+        sidebar.append('    <ul style="margin:6px 0 10px 16px; padding:0; list-style: none;">')
+        for child in sect['children']:
+            child_href = f'/pages/{sect["slug"]}/{child["slug"]}/index.html'
+            sidebar.append(f'      <li><a href="{ASSET_BASE}{child_href}">{html.escape(child["label"])}</a>')
+            if child.get('pages'):
+                sidebar.append('        <ul style="margin:4px 0 6px 14px; padding:0; list-style: none;">')
+                for p in child['pages']:
+                    sidebar.append(f'          <li><a href="{ASSET_BASE}{p["path"]}">{html.escape(p["title"])}</a></li>')
+                sidebar.append('        </ul>')
+            sidebar.append('      </li>')
+        sidebar.append('    </ul>')
+    return '\n'.join(sidebar)
+
+def sidebar_html(sidebar_data, expanded=None) -> str:
+    # Skeleton with one collapsed entry per section; site-nav.js fetches a section's shard
+    # when it is expanded or active. The `expanded` section's shard is inlined instead.
+    sidebar = ['<div class="card">', '  <div class="search">', '    <input id="siteSearch" type="search" placeholder="Search notes" aria-label="Search notes" autocomplete="off">', '    <ul id="searchResults" hidden></ul>', '  </div>', '  <nav>', f'    <a href="{ASSET_BASE}/index.html" data-match="/index.html">Home</a>', '    <hr style="border:none;border-top:1px solid var(--border);margin:8px 0;">', '    <strong style="display:block;padding:4px 10px;color:var(--muted)">Sections</strong>']
+    for sect in sidebar_data:
+        open_ = sect['slug'] == expanded
+        sidebar.append(f'    <div class="nav-section" data-section="{html.escape(sect["slug"])}">')
+        if sect.get('root_pages') or sect.get('children'):
+            sidebar.append(f'      <button class="nav-expand" type="button" aria-expanded="{"true" if open_ else "false"}" aria-label="Show contents of {html.escape(sect["label"])}"></button>')
+        # Section header links to section index
+        first = f"/pages/{sect['slug']}/index.html"
+        sidebar.append(f'      <a href="{ASSET_BASE}{first}" data-match="/pages/{sect["slug"]}/">{html.escape(sect["label"])}</a>')
+        if open_:
+            sidebar += ['    <div class="nav-shard">', sidebar_section_html(sect), '    </div>']
+        sidebar.append('    </div>')
+    sidebar += ['  </nav>', '</div>']
+    return '\n'.join(sidebar)
+
+def nav_shards(manifest, sidebar_data):
+    # slug -> shard: the section's sidebar HTML, its pages in order, and the pages just
+    # before and after it, so prev/next needs only the current section's shard
+    shards, last = {}, None
+    for i, (sect, side) in enumerate(zip(manifest, sidebar_data)):
+        shards[sect['slug']] = {
+            'html': sidebar_section_html(side),
+            'pages': [p['path'] for p in sect['pages']],
+            'prev': last,
+            'next': next((s['pages'][0]['path'] for s in manifest[i + 1:] if s['pages']), None),
+        }
+        if sect['pages']:
+            last = sect['pages'][-1]['path']
+    return shards
+
+def write_sidebar(manifest, sidebar_data, minify=False):
+    keep = minify_html if minify else str
+    PARTIALS.mkdir(parents=True, exist_ok=True)
+    write_if_changed(PARTIALS / 'sidebar.html', keep(sidebar_html(sidebar_data)).encode('utf-8'))
+    NAV.mkdir(parents=True, exist_ok=True)
+    shards = nav_shards(manifest, sidebar_data)
+    for slug, shard in shards.items():
+        shard['html'] = keep(shard['html'])
+        write_if_changed(NAV / f'{slug}.json', json.dumps(shard, separators=(',', ':')).encode('utf-8'))
+    for path in NAV.glob('*.json'):
+        if path.stem not in shards:
+            remove(path)
+
+SIDEBAR_LINK_RE = re.compile(r'<a href="([^"]*)"(?: data-match="([^"]*)")?>')
+
+def _nav_button(path, label: str) -> str:
+    if path is None:
+        return f'<span class="button" style="opacity:.5;pointer-events:none">{label}</span>'
+    return f'<a class="button" href="{ASSET_BASE}{path}">{label}</a>'
+
+def make_inline_nav(manifest, sidebar_data):
+    # Returns url_path -> template slots holding what site-nav.js would otherwise
+    # fetch and compute in the browser: the sidebar with its active links (and the page's
+    # own section expanded), and prev/next
+    sidebars = {}
+    flat = [p['path'] for sect in manifest for p in sect['pages']]
+    position = {}
+    for i, path in enumerate(flat):
+        position.setdefault(path, i)
+    def slots(url_path):
+        page = ASSET_BASE + url_path
+        def mark(m):
+            # Same rule as the script: a data-match occurring in the path, or the page's own link
+            if m.group(1) == page or (m.group(2) and m.group(2) in page):
+                return m.group(0)[:-1] + ' class="active">'
+            return m.group(0)
+        # '/pages/<section>/...' -> '<section>'
+        parts = url_path.split('/')
+        slug = parts[2] if len(parts) > 3 else None
+        if slug not in sidebars:
+            sidebars[slug] = sidebar_html(sidebar_data, expanded=slug)
+        i = position.get(url_path)
+        section_nav = ''
+        if i is not None:
+            prev = flat[i - 1] if i > 0 else None
+            nxt = flat[i + 1] if i + 1 < len(flat) else None
+            section_nav = '<div class="buttons">' + _nav_button(prev, '← Previous') + _nav_button(nxt, 'Next →') + '</div>'
+        return { 'sidebar': SIDEBAR_LINK_RE.sub(mark, sidebars[slug]), 'section_nav': section_nav }
+    return slots
+
+def index_page_name(n: int) -> str:
+    return 'index.html' if n == 1 else f'index.{n}.html'
+
+def _index_pager(out_dir: pathlib.Path, n: int, count: int) -> str:
+    # Previous/next links between the pages of one directory listing
+    url_dir = '/' + out_dir.relative_to(SITE).as_posix() + '/'
+    prev = url_dir + index_page_name(n - 1) if n > 1 else None
+    nxt = url_dir + index_page_name(n + 1) if n < count else None
+    return '<div class="buttons">' + _nav_button(prev, '← Previous page') + f' <span>Page {n} of {count}</span> ' + _nav_button(nxt, 'Next page →') + '</div>'
+
+def write_index(manifest, asset_slots, minify=False):
+    # Generate index.html dynamically with section cards
+    card = load_template(TEMPLATES / 'partials' / 'card.html')
+    cards = []
+    for sect in manifest:
+        link = f'{ASSET_BASE}{sect["pages"][0]["path"]}' if sect['pages'] else f'{ASSET_BASE}/pages/{sect["slug"]}/index.html'
+        cards.append(card.render(title=html.escape(sect['label']), link=link))
+    index_html = load_template(INDEX_TEMPLATE).render(
+        title='Mathematical Economics',
+        tagline='Sections generated from the in-repo book.',
+        cards='\n'.join(cards),
+        asset_base=ASSET_BASE,
+        **asset_slots)
+    write_if_changed(SITE / 'index.html', (minify_html(index_html) if minify else index_html).encode('utf-8'))
+
+def text_outputs(pages):
+    # Generated pages a static server may serve precompressed
+    yield from pages.rglob('*.html')
+    yield from pages.rglob('*.json')
+
+def site_text_outputs():
+    # The rest of the generated text: landing page, worker, stylesheets, scripts, nav and search metadata
+    yield SITE / 'index.html'
+    yield SERVICE_WORKER
+    for d in (SITE / 'assets', SITE / 'assets' / 'css', SITE / 'assets' / 'js', PARTIALS, NAV):
+        yield from (p for p in d.glob('*') if p.suffix in ('.html', '.css', '.js', '.json') and p.name not in BUILD_RECORDS)
+    yield SEARCH / 'index.json'
+
+def gzip_siblings(pages):
+    # Existing .gz siblings of pages
+    yield from pages.rglob('*.gz')
+
+def site_gzip_siblings():
+    # The rest; search shards are gzipped by design and have no source file
+    yield from (p for p in (SITE / 'index.html.gz', SITE / 'sw.js.gz') if p.exists())
+    for d in (SITE / 'assets', SITE / 'assets' / 'css', SITE / 'assets' / 'js', PARTIALS, NAV):
+        yield from d.glob('*.gz')
+    yield from (SEARCH / 'index.json.gz',) if (SEARCH / 'index.json.gz').exists() else ()
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _file_digest(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def build_inputs(assets, minify, mathml):
+    # Anything that changes how every page renders invalidates the whole cache
+    builder = [pathlib.Path(__file__)] + sorted(SITEGEN.glob('*.py'))
+    return {
+        'assets': assets.digest(),
+        'minify': minify,
+        'mathml': mathml,
+        'template': _digest(b''.join(p.read_bytes() for p in sorted(TEMPLATES.rglob('*.html')))),
+        'builder': _digest(b''.join(p.read_bytes() for p in builder)),
+    }
+
+def load_cache(inputs):
+    try:
+        st = CACHE.stat()
+        cache = _warm.get('cache', {}).get((st.st_size, st.st_mtime_ns))
+        if cache is None:
+            cache = json.loads(CACHE.read_text(encoding='utf-8'))
+    except Exception:
+        return None
+    if cache.get('version') != CACHE_VERSION or cache.get('inputs') != inputs:
+        return None
+    return cache
+
+def prune_outputs(cache, live_notes, live_dirs, stage):
+    # Remove pages and directory indexes whose source disappeared since the last build (from the staged tree)
+    live_outputs = {entry['out'] for entry in live_notes.values()}
+    stale = [entry['out'] for key, entry in cache['notes'].items() if key not in live_notes and entry['out'] not in live_outputs]
+    def index_out(key):
+        parts = [slugify(p) for p in pathlib.PurePosixPath(key).parts]
+        return PAGES.joinpath(*parts, 'index.html').relative_to(SITE).as_posix()
+    live_indexes = {index_out(key) for key in live_dirs}
+    for key in cache['dirs']:
+        if key not in live_dirs and index_out(key) not in live_indexes:
+            # The listing's continuation pages (index.2.html, ...) go with it
+            stale += [index_out(key)] + [p.relative_to(SITE).as_posix() for p in stage.glob((SITE / index_out(key)).parent, 'index.*.html')]
+    pruned = 0
+    for out in stale:
+        path = SITE / out
+        if stage.remove(path):
+            print(f'Pruned {path}')
+            pruned += 1
+        # With its sidecar and their .gz siblings; directories left empty go when the stage is published
+        for p in (path, sidecar_path(path)):
+            stage.remove(p.with_name(p.name + '.gz'))
+        stage.remove(sidecar_path(path))
+    return pruned
+
+def write_offline(manifest, sidebar_data, assets, note_media, written, known_hashes, enabled=True):
+    # Precache manifest + service worker from the published site; written: root-relative paths of
+    # the files this build wrote or removed (the rest keep their known hashes). Returns the file
+    # hashes to keep in the cache.
+    if not enabled:
+        remove(PRECACHE)
+        remove(PRECACHE.with_name(PRECACHE.name + '.gz'))
+        write_service_worker(SERVICE_WORKER, SW_TEMPLATE, ASSET_BASE, '', enabled=False)
+        return {}
+    shell = (['index.html', 'assets/site.json', PARTIALS.joinpath('sidebar.html').relative_to(SITE).as_posix()]
+             + [NAV.joinpath(f'{s["slug"]}.json').relative_to(SITE).as_posix() for s in sidebar_data]
+             + [f'assets/{dest}' for dest in sorted(set(assets.mapping.values()))])
+    pages = [p['path'].lstrip('/') for sect in manifest for p in sect['pages']]
+    sidecars = { page: page[:-len('.html')] + '.math.json' for page in pages }
+    # Media blobs are named by their content hash already; other files are hashed when they change
+    known = file_hashes(SITE, shell + pages + list(sidecars.values()), known_hashes, written)
+    hashes = { rel: entry[2] for rel, entry in known.items() }
+    deps = {}
+    for page in pages:
+        blobs = [f'assets/media/{blob}' for blob in note_media.get(page, ())]
+        hashes.update((blob, blob.rsplit('/', 1)[1].split('.')[0]) for blob in blobs)
+        deps[page] = ([sidecars[page]] if sidecars[page] in hashes else []) + blobs
+    precache = precache_manifest(ASSET_BASE, shell, pages, deps, hashes, remote_urls(TEMPLATE, KATEX_PARTIAL))
+    write_precache(PRECACHE, precache)
+    write_service_worker(SERVICE_WORKER, SW_TEMPLATE, ASSET_BASE, f'{ASSET_BASE}/assets/precache.json', precache['version'])
+    return known
+
+def build(clean=False, workers=1, inline_nav=False, gzip_outputs=False, fingerprint_assets=True, index_page_size=INDEX_PAGE_SIZE, minify=True, memo_mb=0, vault=None, offline=True, mathml=False):
+    if not BOOK.exists():
+        print('Book directory not found:', BOOK)
+        return 1
+    timer = PhaseTimer()
+    # Outputs written or removed from here on make up this build's delta
+    WRITTEN.take()
+    # Bundle the stylesheets (pages inline the critical rules and load the rest async), then
+    # fingerprint stylesheets and scripts: every page links to the hashed names
+    critical = None
+    if minify:
+        critical = bundle_css(ROOT / 'assets' / 'css' / 'style.css', CSS_BUNDLE, CRITICAL_CSS)
+    else:
+        remove(CSS_BUNDLE)
+        remove(CRITICAL_CSS)
+    assets = fingerprint(ROOT / 'assets', map_path=ASSET_MAP) if fingerprint_assets else load_asset_map(ROOT / 'assets')
+    asset_slots = assets.slots(ASSET_BASE)
+    asset_slots['styles'] = style_links(asset_slots, critical)
+    # With mathml, formulas are converted to MathML at build time (with math.js's macros) and pages
+    # whose formulas all converted leave the KaTeX slot empty
+    katex = load_template(KATEX_PARTIAL).render(**asset_slots)
+    render_config = dataclasses.replace(RENDER, slots={ **asset_slots, 'backlinks': '', 'katex': katex }, minify_html=minify,
+                                        memo_bytes=memo_mb << 20, math_macros=load_macros(MATH_JS) if mathml else None)
+    timer.lap('assets')
+    inputs = build_inputs(assets, minify, mathml)
+    cache = None if clean else load_cache(inputs)
+    # Pages are written to a staging tree and published at the end, so the live site is never
+    # half-written; without a usable cache it holds the whole new pages/ (a full build)
+    stage = Stage(PAGES, fresh=cache is None)
+    if cache is None:
+        cache = { 'notes': {}, 'dirs': {}, 'nav': None, 'media': {} }
+    media = get_store(MEDIA_ROOT)
+    media.reset(cache['media'])
+    timer.lap('cache')
+    # One walk of the vault (or the caller's up-to-date tree); everything below reads directories,
+    # notes and their stat data from it
+    scanned = []
+    for sect_label, sect_dir, files in build_manifest(vault or scan_vault(BOOK)):
+        records = []
+        for note in files:
+            md_path, rel = note.path, note.rel
+            # Build slugged output path mirroring directories; stem for filename
+            out_dirs = [slugify(p) for p in rel.parts[:-1]]
+            name_slug = slugify(md_path.stem)
+            out_html = PAGES.joinpath(*(out_dirs + [name_slug + '.html']))
+            # Same size and mtime as last build: trust the cached hash (and aliases and link targets)
+            # instead of re-reading the note
+            prev = cache['notes'].get(rel.as_posix())
+            if prev and prev.get('stat') == [note.size, note.mtime_ns]:
+                digest, aliases, targets = prev['hash'], prev['aliases'], prev['links']
+            else:
+                digest = _file_digest(md_path)
+                if prev and prev['hash'] == digest:
+                    aliases, targets = prev['aliases'], prev['links']
+                else:
+                    aliases, targets = note_links(read_lines(md_path, 'replace'))
+            # Title from filename (preserve case) with numeric prefix if present
+            title, label = note_title(md_path.stem)
+            url_path = f"/pages/{'/'.join(out_dirs + [name_slug + '.html'])}"
+            records.append((rel, (md_path, out_html, title, label, url_path, rel.as_posix(), digest, [note.size, note.mtime_ns], aliases, targets)))
+        scanned.append((sect_label, sect_dir, records))
+    timer.lap('scan')
+
+    # A note that fails to render and has no earlier page is left out of the page set (manifest,
+    # nav, indexes, wikilinks, search) and the rest is planned again, so no page links to it; what
+    # the first pass rendered is reused by the second
+    excluded, carried = set(), {}
+    rendered_keys, reused_keys, failed_keys = set(), set(), set()
+    note_times = []
+    while True:
+        manifest, sidebar_data, dir_indexes, notes = page_set(scanned, excluded)
+        nav = _digest(json.dumps([manifest, sidebar_data]).encode('utf-8'))
+        # Inlined navigation makes every page depend on the whole page set
+        page_nav = nav if inline_nav else None
+        nav_slots = make_inline_nav(manifest, sidebar_data) if inline_nav else lambda url_path: NO_NAV
+        # Wikilinks resolve against a name -> URL index of the whole vault; a page is re-rendered when
+        # what its links resolve to or its backlinks change
+        links = link_index([(key, aliases, url_path) for _, _, _, _, url_path, key, _, _, aliases, _ in notes])
+        render_config = dataclasses.replace(render_config, links=links)
+        graph_notes = [(url_path, title, targets) for _, _, title, _, url_path, _, _, _, _, targets in notes]
+        resolved, backlinks, edges, unresolved = link_graph(graph_notes, links)
+
+        live_notes, jobs, pending = {}, [], []
+        for (md_path, out_html, title, label, url_path, key, digest, stat, aliases, targets), found in zip(notes, resolved):
+            if key in failed_keys:
+                # Failed in the first pass but kept: its previous page stays
+                live_notes[key] = carried[key]
+                continue
+            sources = backlinks.get(url_path, [])
+            linkage = _digest(json.dumps([found, sources]).encode('utf-8'))
+            entry = { 'hash': digest, 'stat': stat, 'out': out_html.relative_to(SITE).as_posix(), 'media': {}, 'nav': page_nav,
+                      'aliases': aliases, 'links': targets, 'linkage': linkage }
+            prev = carried.get(key, cache['notes'].get(key))
+            if (prev and prev['hash'] == digest and prev.get('nav') == page_nav and prev.get('linkage') == linkage
+                    and stage.exists(out_html) and media_unchanged(media, prev['media'])):
+                live_notes[key] = { **prev, 'stat': stat }
+                if key not in carried:
+                    reused_keys.add(key)
+            else:
+                jobs.append((md_path, stage.path(out_html), title, label, { **nav_slots(url_path), 'backlinks': backlinks_html(ASSET_BASE, sources) }))
+                pending.append((key, entry, cache['notes'].get(key)))
+        timer.lap('plan')
+
+        # Render after the walk so results are collected in a deterministic order
+        dropped = set()
+        for _, out_dir, *_ in dir_indexes:
+            stage.path(out_dir).mkdir(parents=True, exist_ok=True)
+        for job, (key, entry, prev), (error, refs, media_updates, terms, elapsed) in zip(jobs, pending, render_many(jobs, render_config, workers)):
+            media.entries.update(media_updates)
+            note_times.append((key, *elapsed))
+            if error:
+                print(f'Failed {job[0]}: {error}')
+                failed_keys.add(key)
+                # Keep the previous output (if any) and retry on the next build
+                if prev and stage.exists(SITE / prev['out']):
+                    live_notes[key] = prev
+                else:
+                    dropped.add(key)
+                continue
+            if render_config.protect_math and not sidecar_path(job[1]).exists():
+                # The page lost its formulas: the live sidecar goes too
+                stage.remove(sidecar_path(SITE / entry['out']))
+            entry['media'] = refs
+            entry['terms'] = terms
+            live_notes[key] = entry
+            rendered_keys.add(key)
+            print(f'Rendered {job[0]} -> {SITE / entry["out"]}')
+        timer.lap('render')
+        if not dropped:
+            break
+        print(f'Left {len(dropped)} page(s) that failed to render out of the site.')
+        excluded |= dropped
+        carried = live_notes
+    rendered, failed = len(rendered_keys), len(failed_keys)
+    reused = len(reused_keys - rendered_keys)
+    if unresolved:
+        print(f'{unresolved} wikilink(s) match no note (rendered unlinked).')
+
+    live_dirs = {}
+    for rel_dir, out_dir, title, child_dirs, dir_pages in dir_indexes:
+        # Only rewrite the index when the directory's membership (or inlined nav) changed
+        membership = _digest(json.dumps([[c.name for c in child_dirs], dir_pages or [], page_nav, index_page_size]).encode('utf-8'))
+        live_dirs[rel_dir.as_posix()] = membership
+        if cache['dirs'].get(rel_dir.as_posix()) == membership and stage.exists(out_dir / 'index.html'):
+            continue
+        entries = []
+        for c in child_dirs:
+            child_out = '/'.join([slugify(p) for p in c.rel.parts])
+            entries.append(('Subsections', f'<li><a href="{ASSET_BASE}/pages/{child_out}/index.html">{html.escape(c.name)}</a></li>'))
+        # Pages in this dir (from pages_by_dir)
+        entries += [('Pages', f'<li><a href="{ASSET_BASE}{p["path"]}">{html.escape(p["title"])}</a></li>') for p in dir_pages or []]
+        # Long listings are split across index.html, index.2.html, ... so each stays small
+        chunks = [entries[i:i + index_page_size] for i in range(0, len(entries), index_page_size)] or [[]]
+        for n, chunk in enumerate(chunks, 1):
+            body_parts = []
+            for heading in ('Subsections', 'Pages'):
+                items = [item for kind, item in chunk if kind == heading]
+                if items:
+                    body_parts.append(f'<h2>{heading}</h2>\n<ul>\n' + '\n'.join(items) + '\n</ul>')
+            sec_body = '\n<hr>\n'.join(body_parts) if body_parts else '<p>Coming soon.</p>'
+            if len(chunks) > 1:
+                sec_body += '\n' + _index_pager(out_dir, n, len(chunks))
+            index_html = out_dir / index_page_name(n)
+            index_path = '/' + index_html.relative_to(SITE).as_posix()
+            index_slots = nav_slots(index_path)
+            if mathml and not DELIM_RE.search(sec_body):
+                # A listing has no formulas (unless a title carries one)
+                index_slots = { **index_slots, 'katex': '' }
+            write_if_changed(stage.path(index_html), render_page(render_config, title, sec_body, index_slots).encode('utf-8'))
+        # Drop continuation pages the listing no longer needs
+        for extra in stage.glob(out_dir, 'index.*.html'):
+            num = extra.name[len('index.'):-len('.html')]
+            if num.isdigit() and int(num) > len(chunks):
+                stage.remove(extra)
+
+    timer.lap('index_pages')
+
+    pruned = prune_outputs(cache, live_notes, live_dirs, stage)
+    live_media = {src: blob for note in live_notes.values() for src, blob in note['media'].items()}
+    pruned += media.prune(set(live_media.values()))
+    timer.lap('prune')
+    # Manifest, sidebar and landing page only change when the page set does
+    nav_outputs = [SITE / 'assets' / 'site.json', PARTIALS / 'sidebar.html', SITE / 'index.html'] + [NAV / f'{s["slug"]}.json' for s in sidebar_data]
+    nav_changed = nav != cache['nav'] or not all(p.exists() for p in nav_outputs)
+
+    compressed = 0
+    if gzip_outputs or cache.get('gzip'):
+        # Page siblings are staged with the pages: drop those of pruned pages (or all of them once
+        # --gzip is dropped), then refresh
+        if not gzip_outputs:
+            for gz in PAGES.rglob('*.gz'):
+                stage.remove(gz)
+        prune_gzip(list(gzip_siblings(stage.root)), everything=not gzip_outputs)
+        if gzip_outputs:
+            compressed = precompress([p for p in text_outputs(stage.root) if p.exists()])
+            if not cache.get('gzip') and not stage.fresh:
+                # Just turned on: pages this build left alone get their siblings too (staged like the rest)
+                live = [p for p in itertools.chain(PAGES.rglob('*.html'), PAGES.rglob('*.json'))
+                        if stage.exists(p) and not stage.exists(p.with_name(p.name + '.gz'))]
+                compressed += precompress(live, gz_path=lambda p: stage.path(p.with_name(p.name + '.gz')))
+        timer.lap('gzip')
+    stage.publish()
+    timer.lap('publish')
+
+    # The search index, link graph and navigation list pages, so they go out after the pages do.
+    # Search index from every live note's terms (kept in the cache for reused notes)
+    if rendered or pruned or nav_changed or not (SEARCH / 'index.json').exists():
+        search_docs, search_terms = [], []
+        for md_path, out_html, title, label, url_path, key, *_ in notes:
+            if key in live_notes:
+                search_docs.append([title, url_path])
+                search_terms.append(live_notes[key].get('terms', {}))
+        write_search_index(SEARCH, search_docs, search_terms)
+    timer.lap('search')
+    if rendered or pruned or nav_changed or not LINK_GRAPH.exists():
+        write_link_graph(LINK_GRAPH, graph_notes, edges)
+    timer.lap('links')
 
     # Write a small manifest for client-side use if needed
-    (ROOT / 'assets').mkdir(exist_ok=True)
-    (ROOT / 'assets' / 'site.json').write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    (SITE / 'assets').mkdir(exist_ok=True)
+    if nav_changed:
+        write_if_changed(SITE / 'assets' / 'site.json', json.dumps(manifest, indent=2).encode('utf-8'))
+        write_sidebar(manifest, sidebar_data, minify)
+        write_index(manifest, asset_slots, minify)
+    timer.lap('nav')
+    if gzip_outputs or cache.get('gzip'):
+        prune_gzip(list(site_gzip_siblings()), everything=not gzip_outputs)
+        if gzip_outputs:
+            compressed += precompress([p for p in site_text_outputs() if p.exists()])
+            print(f'Compressed {compressed} file(s).')
+        timer.lap('gzip')
+    # Service worker and its precache manifest, hashed from the published pages and assets
+    written = {path.relative_to(SITE).as_posix() for path in WRITTEN.paths if SITE in path.parents}
+    note_media = {entry['out']: sorted(set(entry['media'].values())) for entry in live_notes.values()}
+    output_hashes = write_offline(manifest, sidebar_data, assets, note_media, written, cache.get('hashes'), offline)
+    if gzip_outputs:
+        precompress([p for p in (PRECACHE, SERVICE_WORKER) if p.exists()])
+    # Added, changed and removed site files, for targeted cache purges
+    changes = written_delta(WRITTEN.take(), SITE, SITE_OUTPUTS, SITE_RECORDS)
+    DELTA.write_text(json.dumps(changes, indent=2), encoding='utf-8')
+    timer.lap('offline')
 
     # Build info for traceability
     build_info = {
@@ -266,90 +628,207 @@ def main():
         'counts': {
             'sections': len(manifest),
             'pages': sum(len(s['pages']) for s in manifest),
+            'rendered': rendered,
+            'reused': reused,
+            'pruned': pruned,
+            'failed': failed,
+            'media': len(set(live_media.values())),
+            'added': len(changes['added']),
+            'changed': len(changes['changed']),
+            'removed': len(changes['removed']),
+            'links': len(edges),
+            'unresolved_links': unresolved,
         },
+        # Block memo use during this build (serial rendering only; worker processes keep their own)
+        'block_memo': BLOCK_MEMO.take_stats(),
+        'timings': timer.report(note_times),
+    }
+    (SITE / 'assets' / 'build-info.json').write_text(json.dumps(build_info, indent=2), encoding='utf-8')
+    new_cache = {
+        'version': CACHE_VERSION,
+        'inputs': inputs,
+        'notes': live_notes,
+        'dirs': live_dirs,
+        'nav': nav,
+        'gzip': gzip_outputs,
+        # False for --watch builds (which also skip fingerprints and minification)
+        'offline': offline,
+        'media': {src: media.entries[src] for src in sorted(live_media) if src in media.entries},
+        # Content hashes of the precached files, reused while their size and mtime are unchanged
+        'hashes': output_hashes,
     }
-    (ROOT / 'assets' / 'build-info.json').write_text(json.dumps(build_info, indent=2), encoding='utf-8')
+    CACHE.write_text(json.dumps(new_cache, indent=2), encoding='utf-8')
+    st = CACHE.stat()
+    _warm['cache'] = { (st.st_size, st.st_mtime_ns): new_cache }
+    _warm['preview'] = (render_config, { url_path: backlinks_html(ASSET_BASE, sources) for url_path, sources in backlinks.items() })
+    print(f'Done. Rendered {rendered} page(s), reused {reused}' + ('; updated index + sidebar.' if nav_changed else '; index + sidebar unchanged.'))
+    if failed:
+        print(f'{failed} page(s) failed to render.')
+        return 1
+    return 0
 
-    # Generate sidebar from manifest
-    PARTIALS.mkdir(parents=True, exist_ok=True)
-    sidebar = ['<div class="card">', '  <nav>', f'    <a href="{ASSET_BASE}/index.html" data-match="/index.html">Home</a>', '    <hr style="border:none;border-top:1px solid var(--border);margin:8px 0;">', '    <strong style="display:block;padding:4px 10px;color:var(--muted)">Sections</strong>']
-    for sect in sidebar_data:
-        # Section header links to section index
-        first = f"/pages/{sect['slug']}/index.html"
-        sidebar.append(f'    <a href="{ASSET_BASE}{first}" data-match="/pages/{sect["slug"]}/">{html.escape(sect["label"])}</a>')
-        # List any pages directly under the section root
-        if sect.get('root_pages'):
-            sidebar.append('    <ul style="margin:6px 0 10px 16px; padding:0; list-style: none;">')
-            for p in sect['root_pages']:
-                sidebar.append(f'      <li><a href="{ASSET_BASE}{p["path"]}">{html.escape(p["title"])}</a></li>')
-            sidebar.append('    </ul>')
-        # List subsections and their pages
-        if sect.get('children'):
-            sidebar.append('    <ul style="margin:6px 0 10px 16px; padding:0; list-style: none;">')
-            for child in sect['children']:
-                child_href = f'/pages/{sect["slug"]}/{child["slug"]}/index.html'
-                sidebar.append(f'      <li><a href="{ASSET_BASE}{child_href}">{html.escape(child["label"])}</a>')
-                if child.get('pages'):
-                    sidebar.append('        <ul style="margin:4px 0 6px 14px; padding:0; list-style: none;">')
-                    for p in child['pages']:
-                        sidebar.append(f'          <li><a href="{ASSET_BASE}{p["path"]}">{html.escape(p["title"])}</a></li>')
-                    sidebar.append('        </ul>')
-                sidebar.append('      </li>')
-            sidebar.append('    </ul>')
-    sidebar += ['  </nav>', '</div>']
-    (PARTIALS / 'sidebar.html').write_text('\n'.join(sidebar), encoding='utf-8')
+def sync_static(paths) -> None:
+    # Mirrors added, edited or deleted stylesheets, scripts and images into the development site
+    for path in map(pathlib.Path, paths):
+        dest = SITE / path.relative_to(ROOT)
+        if path.is_file():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, dest)
+        else:
+            dest.unlink(missing_ok=True)
 
-    # Generate index.html dynamically with section cards
-    cards = []
-    for sect in manifest:
-        link = f'{ASSET_BASE}{sect["pages"][0]["path"]}' if sect['pages'] else f'{ASSET_BASE}/pages/{sect["slug"]}/index.html'
-        title = html.escape(sect['label'])
-        cards.append(f'''    <div class="card">
-      <h3>{title}</h3>
-      <div class="buttons">
-        <a href="{link}" class="button">Open Section</a>
-      </div>
-    </div>''')
-    index_html = f'''<!DOCTYPE html>
-<html lang="en">
-<head>
-  <script>
-    (function(){{
-      try {{ var m = localStorage.getItem('theme'); if (m === 'light' || m === 'dark') document.documentElement.setAttribute('data-theme', m); }} catch (e) {{}}
-    }})();
-  </script>
-  <meta charset="UTF-8" />
-  <meta name="viewport" content="width=device-width, initial-scale=1.0" />
-  <title>Mathematical Economics</title>
-  <link rel="stylesheet" href="{ASSET_BASE}/assets/css/style.css?v=20250930" />
-  <script defer src="{ASSET_BASE}/assets/js/site-nav.js?v=20250930"></script>
-</head>
-<body>
-  <button id="navToggle" class="hamburger" aria-label="Toggle navigation" aria-expanded="false">≡</button>
-  <button id="themeToggle" class="theme-toggle" aria-label="Toggle theme" title="Toggle light/dark">◎</button>
-  <div class="font-slider" aria-label="Font size">
-    <input id="fontSize" type="range" min="90" max="220" step="5" />
-  </div>
-  <div id="backdrop" class="backdrop" hidden></div>
-  <div class="layout">
-    <aside id="sidebar" class="sidebar"></aside>
-    <main class="content">
-  <div class="container">
-    <h1>Mathematical Economics</h1>
-    <p class="tagline">Sections generated from the in-repo book.</p>
-
-{chr(10).join(cards)}
-
-  </div>
-    </main>
-  </div>
-</body>
-</html>
-'''
-    (ROOT / 'index.html').write_text(index_html, encoding='utf-8')
-
-    print('Done. Built site from book and updated index + sidebar.')
+def watch(clean=False, workers=1, inline_nav=False, port=8000, interval=0.1, index_page_size=INDEX_PAGE_SIZE, memo_mb=MEMO_MB, mathml=False):
+    from sitegen.devserver import ReloadHub, serve, watch as poll
+    # Everything goes to DEV_SITE (with its own build cache): the committed pages/, assets/ and
+    # sw.js stay as the last production build left them, whatever happens to this process
+    use_site(DEV_SITE)
+    static = [ROOT / 'assets' / d for d in STATIC_DIRS]
+    for d in static:
+        shutil.rmtree(SITE / d.relative_to(ROOT), ignore_errors=True)
+    sync_static(p for d in static for p in d.rglob('*') if p.is_file())
+    # Pages link the plain (unbundled) stylesheet and script names here, so editing them needs no
+    # rebuild; the service worker retires itself so the dev server is never answered from a cache
+    flags = dict(workers=workers, inline_nav=inline_nav, fingerprint_assets=False, index_page_size=index_page_size, minify=False, memo_mb=memo_mb, offline=False, mathml=mathml)
+    vault = scan_vault(BOOK)
+    build(clean, vault=vault, **flags)
+    hub = ReloadHub()
+    server = serve(SITE, ASSET_BASE, hub, port=port)
+    print(f'Serving http://127.0.0.1:{server.server_address[1]}{ASSET_BASE}/ from {SITE} (Ctrl-C to stop)')
+    book, templates = str(BOOK) + os.sep, str(TEMPLATES) + os.sep
+
+    def on_change(changed):
+        # Only the changed vault paths are re-listed; notes and templates need a rebuild, stylesheets,
+        # scripts and images only a copy and a reload
+        notes = [p for p in changed if p.startswith(book)]
+        sync_static(p for p in changed if not p.startswith((book, templates)))
+        if notes or any(p.startswith(templates) for p in changed):
+            try:
+                refresh_vault(vault, notes)
+                build(vault=vault, **flags)
+            except Exception as e:
+                print(f'Build failed: {e}')
+        hub.notify()
+
+    try:
+        poll([BOOK, TEMPLATES] + static, on_change, interval=interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+    return 0
+
+def preview(path, text=None) -> str:
+    # One note's page, rendered in memory with the last build's assets, links and backlinks;
+    # text (an unsaved editor buffer) replaces the file's contents. Nothing is written.
+    path = (BOOK / path).resolve()
+    if BOOK.resolve() not in path.parents or path.suffix != '.md':
+        raise ValueError(f'not a note in the vault: {path}')
+    if 'preview' not in _warm:
+        raise RuntimeError('nothing built yet in this process')
+    config, backlinks = _warm['preview']
+    title, label = note_title(path.stem)
+    rel = path.relative_to(BOOK.resolve())
+    url_path = '/pages/' + '/'.join([slugify(p) for p in rel.parts[:-1]] + [slugify(path.stem) + '.html'])
+    if text is None:
+        lines = iter_note_lines(path, title, label, config.drop_heading)
+    else:
+        lines = note_body_lines(text.splitlines(), title, label, config.drop_heading)
+    MATH_SPANS.take()
+    slots = { **NO_NAV, 'backlinks': backlinks.get(url_path, '') }
+    try:
+        content = '\n'.join(iter_md_html(lines, rel.parent, config))
+        if config.math_macros is not None and not MATH_SPANS.needs_client():
+            slots['katex'] = ''
+    finally:
+        MATH_SPANS.take()
+        get_store(MEDIA_ROOT).take_refs()
+    return render_page(config, title, content, slots)
+
+def daemon(socket_path=DAEMON_SOCKET, workers=1, inline_nav=False, index_page_size=INDEX_PAGE_SIZE, memo_mb=MEMO_MB, mathml=False):
+    # Keeps the vault tree, parsed templates, build cache and block memo warm between requests
+    from sitegen.daemon import serve
+    state = { 'vault': None, 'builds': 0, 'busy': None, 'last': None, 'started': time.time() }
+
+    def rebuild(changed_paths=None):
+        # changed_paths: vault paths (absolute or relative to the vault) added, edited or deleted
+        # since the last call; without them the vault is walked again
+        state['busy'] = 'rebuild'
+        start = time.perf_counter()
+        try:
+            if state['vault'] is None or changed_paths is None:
+                state['vault'] = scan_vault(BOOK)
+            else:
+                refresh_vault(state['vault'], [BOOK / p for p in changed_paths])
+            status = build(workers=workers, inline_nav=inline_nav, index_page_size=index_page_size, memo_mb=memo_mb, vault=state['vault'], mathml=mathml)
+        finally:
+            state['busy'] = None
+        info = json.loads((SITE / 'assets' / 'build-info.json').read_text(encoding='utf-8'))
+        state['builds'] += 1
+        state['last'] = { 'status': status, 'seconds': round(time.perf_counter() - start, 3), 'counts': info['counts'], 'block_memo': info['block_memo'] }
+        return state['last']
+
+    def render(path, text=None):
+        state['busy'] = 'render'
+        try:
+            return { 'html': preview(path, text) }
+        finally:
+            state['busy'] = None
+
+    def status():
+        return {
+            'pid': os.getpid(),
+            'uptime': round(time.time() - state['started'], 1),
+            'busy': state['busy'],
+            'builds': state['builds'],
+            'last_build': state['last'],
+            'notes': sum(1 for _ in state['vault'].iter_notes()) if state['vault'] else None,
+            'block_memo': { 'entries': len(BLOCK_MEMO.entries), 'bytes': BLOCK_MEMO.size, 'budget': BLOCK_MEMO.budget },
+        }
+
+    rebuild()
+    print(f'Build daemon listening on {socket_path} (Ctrl-C to stop)')
+    try:
+        serve(socket_path, { 'rebuild': rebuild, 'render': render }, { 'status': status })
+    except KeyboardInterrupt:
+        pass
     return 0
 
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Render the in-repo book into pages/.')
+    ap.add_argument('--clean', action='store_true', help='Ignore the build cache and re-render every page')
+    ap.add_argument('--jobs', '-j', type=int, default=1, help='Render notes in N worker processes (0 = one per CPU)')
+    ap.add_argument('--inline-nav', action='store_true', help='Render the sidebar and prev/next links into every page instead of loading them in the browser')
+    ap.add_argument('--gzip', action='store_true', help='Write .gz siblings of generated HTML, CSS, JS and JSON')
+    ap.add_argument('--no-minify', dest='minify', action='store_false',
+                    help='Link the plain stylesheets and keep HTML whitespace instead of bundling, inlining critical CSS and minifying')
+    ap.add_argument('--index-page-size', type=int, default=INDEX_PAGE_SIZE, metavar='N',
+                    help=f'Entries per directory index page before it continues on index.2.html, ... (default: {INDEX_PAGE_SIZE})')
+    ap.add_argument('--profile', nargs='?', const=str(ROOT / 'build.pstats'), metavar='PATH',
+                    help='Run the build under cProfile and dump stats to PATH (default: build.pstats); use with --jobs 1')
+    ap.add_argument('--watch', action='store_true', help='Rebuild on vault changes and serve the site with live reload')
+    ap.add_argument('--port', type=int, default=8000, help='Port for --watch (default: 8000)')
+    ap.add_argument('--daemon', nargs='?', const=str(DAEMON_SOCKET), metavar='SOCKET',
+                    help='Keep running and serve render/rebuild/status requests on a Unix socket (default: .build.sock)')
+    ap.add_argument('--memo-mb', type=int, default=MEMO_MB, metavar='MB',
+                    help=f'Memory budget of the rendered-block memo kept between --watch/--daemon rebuilds, 0 to disable (default: {MEMO_MB})')
+    ap.add_argument('--mathml', action='store_true',
+                    help='Convert formulas to MathML at build time; pages whose formulas all convert load no KaTeX')
+    args = ap.parse_args(argv)
+    if args.index_page_size < 1:
+        ap.error('--index-page-size must be at least 1')
+    if args.memo_mb < 0:
+        ap.error('--memo-mb must not be negative')
+    if args.daemon:
+        return daemon(pathlib.Path(args.daemon), args.jobs, args.inline_nav, args.index_page_size, args.memo_mb, args.mathml)
+    if args.watch:
+        return watch(args.clean, args.jobs, args.inline_nav, args.port, index_page_size=args.index_page_size, memo_mb=args.memo_mb, mathml=args.mathml)
+    if args.profile:
+        profiler = cProfile.Profile()
+        status = profiler.runcall(build, args.clean, args.jobs, args.inline_nav, args.gzip, index_page_size=args.index_page_size, minify=args.minify, mathml=args.mathml)
+        profiler.dump_stats(args.profile)
+        print(f'Profile written to {args.profile} (python3 -m pstats {args.profile})')
+        return status
+    return build(args.clean, args.jobs, args.inline_nav, args.gzip, index_page_size=args.index_page_size, minify=args.minify, mathml=args.mathml)
+
 if __name__ == '__main__':
     raise SystemExit(main())